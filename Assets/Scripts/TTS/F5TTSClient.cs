@@ -104,6 +104,21 @@ public class F5TTSClient : MonoBehaviour
     public void StopTTS()
     {
         Debug.Log("Arrêt manuel du TTS demandé.");
+
+        // Demande au serveur d'arrêter la génération en cours (barge-in), sans attendre la fin du stream
+        try
+        {
+            if (stream != null && client != null && client.Connected && streamThread != null && streamThread.IsAlive)
+            {
+                byte[] cancelBytes = Encoding.UTF8.GetBytes("CANCEL");
+                stream.Write(cancelBytes, 0, cancelBytes.Length);
+            }
+        }
+        catch (Exception e)
+        {
+            Debug.LogWarning("⚠️ Impossible d'envoyer CANCEL au serveur TTS: " + e.Message);
+        }
+
         stopRequested = true; // Signale au thread réseau de s'arrêter
 
         if (streamThread != null && streamThread.IsAlive)
@@ -12,6 +12,9 @@ import numpy as np
 import sounddevice as sd
 from tqdm import tqdm
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastAPI"))
+import tts_receive  # noqa: E402
+
 # ====== CONFIGURATION ======
 DEFAULT_SERVER_IP = "127.0.0.1"
 DEFAULT_SERVER_PORT = 9998
@@ -35,8 +38,6 @@ total_sentence_count = 0
 active_sockets = [] 
 active_sockets_lock = threading.Lock()
 
-FLOAT_SIZE = np.dtype(np.float32).itemsize
-
 overlap_samples = int(SAMPLE_RATE * OVERLAP_MS / 1000)
 fade_out_curve = np.linspace(1.0, 0.0, overlap_samples, dtype=np.float32)
 fade_in_curve = np.linspace(0.0, 1.0, overlap_samples, dtype=np.float32)
@@ -58,8 +59,7 @@ def fetch_sentence_audio_data(sentence: str, pbar: tqdm, index: int, server_ip:
     # ... (fetch_sentence_audio_data remains largely the same as the previous version)
     # Key change: No pbar.close() here. Let cleanup_resources handle it.
     # Ensure pbar description and color reflect final state.
-    global raw_audio_queue, active_sockets, active_sockets_lock, FLOAT_SIZE
-    audio_data_bytes = bytearray()
+    global raw_audio_queue, active_sockets, active_sockets_lock
     client_socket = None
     operation_successful = False 
     final_desc_set = False
@@ -86,53 +86,31 @@ def fetch_sentence_audio_data(sentence: str, pbar: tqdm, index: int, server_ip:
         pbar.set_description(f"Chunk {index+1:02d} (Receiving 0KB)")
         pbar.refresh()
 
-        end_marker_received = False
-        while not stop_processing_event.is_set():
-            try:
-                data = client_socket.recv(8192)
-            except socket.timeout:
-                if stop_processing_event.is_set():
-                    tqdm.write(f"DEBUG: Chunk {index+1:02d} recv timed out during shutdown.")
-                    break
-                tqdm.write(f"WARNING: Chunk {index+1:02d} recv timed out (no data for {SOCKET_TIMEOUT}s). Assuming end of chunk data for this attempt.")
-                break 
-            
-            if b"END" in data:
-                end_idx = data.find(b"END")
-                audio_data_bytes.extend(data[:end_idx])
-                current_received_byte_count += end_idx
-                end_marker_received = True
-                break 
-
-            if not data: 
-                break 
-            
-            audio_data_bytes.extend(data)
-            current_received_byte_count += len(data)
-            pbar.set_description(f"Chunk {index+1:02d} (Receiving {current_received_byte_count/1024:.0f}KB)")
+        def show_progress(received_bytes):
+            pbar.set_description(f"Chunk {index+1:02d} (Receiving {received_bytes/1024:.0f}KB)")
             pbar.refresh()
 
+        # recv_into straight into one NumPy buffer, audio_array is a view of it
+        audio_array, status = tts_receive.receive_audio(client_socket, stop_event=stop_processing_event,
+                                                        on_progress=show_progress)
+        if status == tts_receive.STATUS_TIMEOUT:
+            if stop_processing_event.is_set():
+                tqdm.write(f"DEBUG: Chunk {index+1:02d} recv timed out during shutdown.")
+            else:
+                tqdm.write(f"WARNING: Chunk {index+1:02d} recv timed out (no data for {SOCKET_TIMEOUT}s). Assuming end of chunk data for this attempt.")
+        end_marker_received = status == tts_receive.STATUS_END
+        current_received_byte_count = audio_array.nbytes
+
         if stop_processing_event.is_set():
             raw_audio_queue.put((index, None))
             return 
 
-        audio_array = np.array([], dtype=np.float32)
-        if audio_data_bytes:
-            if len(audio_data_bytes) % FLOAT_SIZE != 0:
-                tqdm.write(f"WARNING: Chunk {index+1:02d} received data length ({len(audio_data_bytes)}) not a multiple of {FLOAT_SIZE}. Truncating.")
-                valid_len = (len(audio_data_bytes) // FLOAT_SIZE) * FLOAT_SIZE
-                if valid_len > 0:
-                    audio_array = np.frombuffer(audio_data_bytes[:valid_len], dtype=np.float32)
-            else:
-                audio_array = np.frombuffer(audio_data_bytes, dtype=np.float32)
-            
-            max_val_str = f"{np.max(audio_array):.3f}" if audio_array.size > 0 else "N/A"
-            min_val_str = f"{np.min(audio_array):.3f}" if audio_array.size > 0 else "N/A"
-            tqdm.write(f"INFO: Chunk {index+1:02d} processed. Bytes: {len(audio_data_bytes)}, Samples: {audio_array.size}, Max: {max_val_str}, Min: {min_val_str}")
+        if audio_array.size > 0:
+            max_val_str = f"{np.max(audio_array):.3f}"
+            min_val_str = f"{np.min(audio_array):.3f}"
+            tqdm.write(f"INFO: Chunk {index+1:02d} processed. Bytes: {audio_array.nbytes}, Samples: {audio_array.size}, Max: {max_val_str}, Min: {min_val_str}")
         
-        if audio_array.size == 0 and current_received_byte_count > 0 and len(audio_data_bytes) < FLOAT_SIZE :
-            tqdm.write(f"WARNING: Chunk {index+1:02d} had {len(audio_data_bytes)} bytes, less than a single float. No audio samples.")
-        elif audio_array.size == 0 and not end_marker_received and current_received_byte_count == 0:
+        if audio_array.size == 0 and not end_marker_received:
              tqdm.write(f"WARNING: No audio data effectively received for chunk {index+1}: \"{sentence[:30]}...\"")
 
         raw_audio_queue.put((index, audio_array if audio_array.size > 0 else None))
@@ -0,0 +1,158 @@
+# batch_render.py
+# Headless pre-rendering of fixed dialogue lines to Unity-ready WAV files.
+#
+# Manifest: JSON list of {"id", "voice", "text"} objects, or a CSV with an id,voice,text header.
+# Voices: optional JSON {"voice_name": {"ref_audio": "...", "ref_text": "..."}}; lines without
+# a voice (or with "default") use --ref_audio/--ref_text.
+# Example: python batch_render.py dialogue.csv --out_dir Assets/Audio/Dialogue --voices voices.json
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+import torch
+import torchaudio
+
+from tts_engines import add_engine_arguments, create_engine
+from socket_server import TTSStreamingProcessor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastAPI"))
+import audio_utils  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+UNITY_SAMPLE_RATE = 44100  # Same output format as convert_to_unity_format: 44.1 kHz, mono, s16
+CHECKPOINT_FILE = "rendered.jsonl"
+DEFAULT_VOICE = "default"
+BATCH_OVERLAP_MS = 50
+
+
+def load_manifest(path):
+    """Returns the manifest lines as a list of {"id", "voice", "text"} dicts."""
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            items = list(csv.DictReader(f))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+
+    lines = []
+    for item in items:
+        if not item.get("id") or not (item.get("text") or "").strip():
+            logger.warning(f"Skipping manifest entry without id or text: {item}")
+            continue
+        lines.append({"id": str(item["id"]), "voice": item.get("voice") or DEFAULT_VOICE, "text": item["text"].strip()})
+    return lines
+
+
+def load_checkpoint(out_dir):
+    """Ids already rendered by a previous run (their WAV must still exist)."""
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    done = set()
+    if not os.path.isfile(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                item_id = json.loads(line)["id"]
+            except (ValueError, KeyError):
+                continue  # Line cut short by an interrupted run
+            if os.path.isfile(wav_path(out_dir, item_id)):
+                done.add(item_id)
+    return done
+
+
+def wav_path(out_dir, item_id):
+    return os.path.join(out_dir, f"{item_id}.wav")
+
+
+def write_unity_wav(path, audio, sampling_rate):
+    """Resamples float32 audio to 44.1 kHz and writes a mono s16 WAV atomically."""
+    if sampling_rate != UNITY_SAMPLE_RATE:
+        audio = torchaudio.functional.resample(torch.from_numpy(audio), sampling_rate, UNITY_SAMPLE_RATE).numpy()
+    int16_samples = (np.clip(audio, -1.0, 1.0) * 32767.0).astype(np.int16)
+    tmp_path = path + ".tmp"
+    with wave.open(tmp_path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(UNITY_SAMPLE_RATE)
+        wf.writeframes(int16_samples.tobytes())
+    os.replace(tmp_path, path)
+
+
+def render_line(processor, text):
+    """Synthesizes one line at the largest batch size the voice allows."""
+    batch_waves = []
+    for text_batch in processor.split_text(text):
+        chunks = list(processor.engine.generate([text_batch], chunk_size=1 << 20))
+        if chunks:
+            batch_waves.append(np.concatenate(chunks))
+    return audio_utils.mix_audio_chunks_with_crossfade(batch_waves, processor.sampling_rate, BATCH_OVERLAP_MS)
+
+
+def render_manifest(processor, lines, voices, out_dir, default_voice):
+    os.makedirs(out_dir, exist_ok=True)
+    done = load_checkpoint(out_dir)
+    todo = [line for line in lines if line["id"] not in done]
+    logger.info(f"{len(lines)} lines in manifest, {len(done)} already rendered, {len(todo)} to go.")
+
+    # Render voice by voice so the reference is loaded once per voice
+    todo.sort(key=lambda line: line["voice"])
+    current_voice = DEFAULT_VOICE
+    audio_seconds = 0.0
+    start = time.perf_counter()
+
+    with open(os.path.join(out_dir, CHECKPOINT_FILE), "a", encoding="utf-8") as checkpoint:
+        for i, line in enumerate(todo):
+            if line["voice"] != current_voice:
+                ref = voices.get(line["voice"])
+                if ref is None:
+                    if line["voice"] != DEFAULT_VOICE:
+                        logger.warning(f"Unknown voice '{line['voice']}', using the default reference.")
+                    ref = default_voice
+                processor.update_reference(ref["ref_audio"], ref.get("ref_text", ""))
+                current_voice = line["voice"]
+
+            audio = render_line(processor, line["text"])
+            if audio is None or audio.size == 0:
+                logger.error(f"No audio generated for '{line['id']}', it will be retried on the next run.")
+                continue
+            write_unity_wav(wav_path(out_dir, line["id"]), audio, processor.sampling_rate)
+            checkpoint.write(json.dumps({"id": line["id"], "seconds": round(audio.size / processor.sampling_rate, 3)}) + "\n")
+            checkpoint.flush()
+
+            audio_seconds += audio.size / processor.sampling_rate
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"[{i + 1}/{len(todo)}] {line['id']}: {audio.size / processor.sampling_rate:.2f}s "
+                f"(throughput {audio_seconds / elapsed:.2f} s audio / s)"
+            )
+
+    elapsed = time.perf_counter() - start
+    if todo:
+        print(f"Rendered {audio_seconds:.1f}s of audio in {elapsed:.1f}s: "
+              f"{audio_seconds / max(elapsed, 1e-9):.2f} seconds of audio per wall-clock second.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render dialogue lines to Unity WAV files.")
+    parser.add_argument("manifest", help="JSON or CSV manifest of id, voice, text")
+    parser.add_argument("--out_dir", default="rendered", help="Output directory for WAVs and the checkpoint")
+    parser.add_argument("--voices", default="", help="JSON file mapping voice names to ref_audio/ref_text")
+    add_engine_arguments(parser)
+    args = parser.parse_args()
+
+    voices = {}
+    if args.voices:
+        with open(args.voices, "r", encoding="utf-8") as f:
+            voices = json.load(f)
+    default_voice = {"ref_audio": args.ref_audio, "ref_text": args.ref_text}
+
+    processor = TTSStreamingProcessor(engine=create_engine(args), ref_audio=args.ref_audio, ref_text=args.ref_text)
+    render_manifest(processor, load_manifest(args.manifest), voices, args.out_dir, default_voice)
@@ -0,0 +1,59 @@
+# bench_engines.py
+# Compares synthesis engines on the same texts: time-to-first-audio and real-time factor.
+# Example: python bench_engines.py --engines torch onnx --onnx_dir ./onnx --device cpu
+import argparse
+import statistics
+import time
+
+from tts_engines import add_engine_arguments, create_engine
+
+BENCH_TEXTS = [
+    "Hello.",
+    "I think the answer is photosynthesis, but I am not completely sure.",
+    "Let's break down the components. First, the light reactions capture energy from the sun. "
+    "Then the Calvin cycle uses that energy to turn carbon dioxide into sugar, which the plant stores.",
+]
+
+
+def bench_engine(engine, texts, runs, chunk_size):
+    """Runs every text `runs` times and returns per-run (ttfa, wall, audio_seconds) tuples."""
+    max_chars = int(len(engine.ref_text.encode("utf-8")) / engine.ref_duration * (25 - engine.ref_duration))
+    results = []
+    for _ in range(runs):
+        for text in texts:
+            start = time.perf_counter()
+            first_audio = None
+            num_samples = 0
+            for audio_chunk in engine.generate(engine.chunk_text(text, max_chars=max_chars), chunk_size=chunk_size):
+                if first_audio is None and len(audio_chunk) > 0:
+                    first_audio = time.perf_counter() - start
+                num_samples += len(audio_chunk)
+            wall = time.perf_counter() - start
+            results.append((first_audio or wall, wall, num_samples / engine.sampling_rate))
+    return results
+
+
+def print_report(name, results):
+    ttfa = [r[0] for r in results]
+    rtf = [r[1] / r[2] for r in results if r[2] > 0]
+    print(
+        f"{name:>6} | runs={len(results):3d} | "
+        f"TTFA median={statistics.median(ttfa) * 1000:8.1f} ms max={max(ttfa) * 1000:8.1f} ms | "
+        f"RTF median={statistics.median(rtf):.3f} max={max(rtf):.3f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark TTS engines (RTF and time-to-first-audio).")
+    parser.add_argument("--engines", nargs="+", default=["torch", "onnx"], choices=["torch", "onnx", "stub"])
+    parser.add_argument("--runs", type=int, default=3, help="Timed repetitions of the text set per engine")
+    parser.add_argument("--chunk_size", type=int, default=2048)
+    add_engine_arguments(parser)
+    args = parser.parse_args()
+
+    for engine_name in args.engines:
+        args.engine = engine_name
+        engine = create_engine(args)
+        engine.update_reference(args.ref_audio, args.ref_text)
+        engine.warm_up()
+        print_report(engine_name, bench_engine(engine, BENCH_TEXTS, args.runs, args.chunk_size))
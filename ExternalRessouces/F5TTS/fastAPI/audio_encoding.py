@@ -0,0 +1,189 @@
+# audio_encoding.py
+# Encoders for the audio returned by the gateway: s16 WAV, float32 WAV, raw PCM and FLAC.
+# Headers are written directly and samples are converted block by block into one preallocated
+# buffer, which is returned as a memoryview: a response costs a single copy of the audio.
+import importlib.util
+import io
+import struct
+from typing import Dict, Optional
+
+import numpy as np
+
+BLOCK_SAMPLES = 65536  # Samples clipped and scaled at a time, keeps the scratch buffer small
+
+
+class UnsupportedFormatError(ValueError):
+    """Raised when a requested audio format is unknown or cannot be produced here."""
+    pass
+
+
+class AudioFormat:
+    def __init__(self, name, media_type, description):
+        self.name = name
+        self.media_type = media_type
+        self.description = description
+
+
+FORMATS: Dict[str, AudioFormat] = {
+    "wav": AudioFormat("wav", "audio/wav", "16-bit PCM WAV"),
+    "wav_f32": AudioFormat("wav_f32", "audio/wav", "32-bit float WAV"),
+    "pcm_s16le": AudioFormat("pcm_s16le", "audio/pcm", "Raw 16-bit little-endian samples, no header"),
+    "pcm_f32le": AudioFormat("pcm_f32le", "audio/pcm", "Raw 32-bit float little-endian samples, no header"),
+    "flac": AudioFormat("flac", "audio/flac", "16-bit FLAC (needs the soundfile package)"),
+}
+DEFAULT_FORMAT = "wav"
+
+# Accept header media types -> format
+ACCEPT_TYPES = {
+    "audio/wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-wav": "wav",
+    "audio/vnd.wave": "wav",
+    "audio/flac": "flac",
+    "audio/x-flac": "flac",
+    "audio/pcm": "pcm_s16le",
+}
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+
+
+def _wav_header(num_samples: int, sample_rate: int, channels: int, bits: int, format_tag: int) -> bytes:
+    """RIFF header; float WAV carries the extended fmt chunk and the fact chunk it requires."""
+    block_align = channels * bits // 8
+    data_size = num_samples * bits // 8
+    if format_tag == WAVE_FORMAT_PCM:
+        fmt = struct.pack("<4sIHHIIHH", b"fmt ", 16, format_tag, channels, sample_rate,
+                          sample_rate * block_align, block_align, bits)
+        extra = b""
+    else:
+        fmt = struct.pack("<4sIHHIIHHH", b"fmt ", 18, format_tag, channels, sample_rate,
+                          sample_rate * block_align, block_align, bits, 0)
+        extra = struct.pack("<4sII", b"fact", 4, num_samples // channels)
+    riff_size = 4 + len(fmt) + len(extra) + 8 + data_size
+    return struct.pack("<4sI4s", b"RIFF", riff_size, b"WAVE") + fmt + extra + struct.pack("<4sI", b"data", data_size)
+
+
+def _write_s16(audio: np.ndarray, out: np.ndarray):
+    """Clips to [-1, 1], scales and casts `audio` into the int16 array `out`, one block at a time."""
+    scratch = np.empty(min(BLOCK_SAMPLES, audio.size), dtype=np.result_type(audio.dtype, np.float32))
+    for start in range(0, audio.size, BLOCK_SAMPLES):
+        block = audio[start : start + BLOCK_SAMPLES]
+        work = scratch[: block.size]
+        np.clip(block, -1.0, 1.0, out=work)
+        work *= 32767.0
+        out[start : start + block.size] = work  # float -> int16 truncates, like astype
+
+
+def encode_wav_s16(audio: np.ndarray, sample_rate: int, channels: int = 1) -> memoryview:
+    audio = audio.reshape(-1)
+    header = _wav_header(audio.size, sample_rate, channels, 16, WAVE_FORMAT_PCM)
+    buffer = bytearray(len(header) + audio.size * 2)
+    buffer[: len(header)] = header
+    _write_s16(audio, np.frombuffer(buffer, dtype="<i2", offset=len(header)))
+    return memoryview(buffer)
+
+
+def encode_wav_f32(audio: np.ndarray, sample_rate: int, channels: int = 1) -> memoryview:
+    audio = audio.reshape(-1)
+    header = _wav_header(audio.size, sample_rate, channels, 32, WAVE_FORMAT_IEEE_FLOAT)
+    buffer = bytearray(len(header) + audio.size * 4)
+    buffer[: len(header)] = header
+    np.frombuffer(buffer, dtype="<f4", offset=len(header))[:] = audio
+    return memoryview(buffer)
+
+
+def encode_pcm_s16le(audio: np.ndarray, sample_rate: int, channels: int = 1) -> memoryview:
+    audio = audio.reshape(-1)
+    buffer = bytearray(audio.size * 2)
+    _write_s16(audio, np.frombuffer(buffer, dtype="<i2"))
+    return memoryview(buffer)
+
+
+def encode_pcm_f32le(audio: np.ndarray, sample_rate: int, channels: int = 1) -> memoryview:
+    # No copy when the audio already is contiguous little-endian float32
+    return memoryview(np.ascontiguousarray(audio.reshape(-1), dtype="<f4")).cast("B")
+
+
+def encode_flac(audio: np.ndarray, sample_rate: int, channels: int = 1) -> memoryview:
+    try:
+        import soundfile
+    except ImportError:
+        raise UnsupportedFormatError("FLAC output needs the soundfile package (pip install soundfile)")
+    # Same int16 samples as the WAV output; soundfile would scale and round floats differently
+    samples = np.empty(audio.size, dtype=np.int16)
+    _write_s16(audio.reshape(-1), samples)
+    buffer = io.BytesIO()
+    soundfile.write(buffer, samples.reshape(-1, channels) if channels > 1 else samples, sample_rate,
+                    format="FLAC", subtype="PCM_16")
+    return buffer.getbuffer()
+
+
+ENCODERS = {
+    "wav": encode_wav_s16,
+    "wav_f32": encode_wav_f32,
+    "pcm_s16le": encode_pcm_s16le,
+    "pcm_f32le": encode_pcm_f32le,
+    "flac": encode_flac,
+}
+
+
+def encode(audio: np.ndarray, sample_rate: int, audio_format: str = DEFAULT_FORMAT, channels: int = 1) -> memoryview:
+    """Encodes float32 samples in [-1, 1] to `audio_format`."""
+    if audio_format not in ENCODERS:
+        raise UnsupportedFormatError(f"Unknown audio format '{audio_format}', expected one of {list(FORMATS)}")
+    return ENCODERS[audio_format](audio, sample_rate, channels)
+
+
+def response_headers(audio_format: str, sample_rate: int, channels: int = 1) -> Dict[str, str]:
+    """Headers describing the samples, needed by clients of the headerless PCM formats."""
+    return {"X-Audio-Format": audio_format, "X-Sample-Rate": str(sample_rate), "X-Channels": str(channels)}
+
+
+def is_available(audio_format: str) -> bool:
+    """False for formats whose optional dependency is not installed."""
+    if audio_format == "flac":
+        return importlib.util.find_spec("soundfile") is not None
+    return audio_format in FORMATS
+
+
+def negotiate_format(accept: Optional[str] = None, requested: Optional[str] = None) -> str:
+    """
+    Picks the output format: an explicit `requested` name (query parameter) wins, then the
+    Accept header by q-value. An Accept header naming no audio type (e.g. application/json from
+    a generic HTTP client) gets the default format. Raises UnsupportedFormatError when the audio
+    types it names cannot be produced.
+    """
+    if requested:
+        if requested not in FORMATS:
+            raise UnsupportedFormatError(f"Unknown audio format '{requested}', expected one of {list(FORMATS)}")
+        if not is_available(requested):
+            raise UnsupportedFormatError(f"Audio format '{requested}' is not available: {FORMATS[requested].description}")
+        return requested
+    if not accept:
+        return DEFAULT_FORMAT
+
+    candidates = []
+    names_audio = False
+    for position, item in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        names_audio = names_audio or media_type.lower().startswith("audio/")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, media_type.lower()))
+
+    for _, _, media_type in sorted(candidates):
+        if media_type in ACCEPT_TYPES and is_available(ACCEPT_TYPES[media_type]):
+            return ACCEPT_TYPES[media_type]
+        if media_type in ("*/*", "audio/*"):
+            return DEFAULT_FORMAT
+    if not names_audio:
+        return DEFAULT_FORMAT
+    raise UnsupportedFormatError(f"None of the accepted types ({accept}) can be produced")
@@ -1,9 +1,126 @@
 # audio_utils.py
 import numpy as np
-import wave
-import io
 from typing import List, Optional
 
+import audio_encoding
+
+# Silence trimming: a frame is silent when its mean power is under the threshold
+SILENCE_THRESHOLD_DB = -45.0    # dBFS; F5's breaths and room noise stay around -60, speech well above -40
+SILENCE_FRAME_MS = 10           # Resolution of the trim
+START_SILENCE_MS = 30           # Kept before the first sentence: just enough not to clip its onset
+
+def _loud_frames(audio: np.ndarray, frame: int, threshold_db: float) -> np.ndarray:
+    """Indices of the frames of `frame` samples (the last one may be shorter) above the threshold."""
+    full = audio.size // frame
+    frames = audio[: full * frame].reshape(full, frame)
+    power = np.einsum("ij,ij->i", frames, frames) / frame
+    if audio.size > full * frame:
+        rest = audio[full * frame :]
+        power = np.append(power, np.dot(rest, rest) / rest.size)
+    return np.flatnonzero(power > 10 ** (threshold_db / 10))
+
+def trim_silence(
+    audio: np.ndarray,
+    sample_rate: int,
+    keep_leading_ms: float = 0,
+    keep_trailing_ms: float = 0,
+    threshold_db: float = SILENCE_THRESHOLD_DB,
+    frame_ms: float = SILENCE_FRAME_MS
+) -> np.ndarray:
+    """
+    Cuts the silence at both ends of a chunk down to the given lengths (what silence there is,
+    shorter pauses are left alone). Returns a view of `audio`, empty if it is all silence.
+    """
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    loud = _loud_frames(audio, frame, threshold_db)
+    if not loud.size:
+        return audio[:0]
+    start = max(0, loud[0] * frame - int(sample_rate * keep_leading_ms / 1000))
+    end = min(audio.size, (loud[-1] + 1) * frame + int(sample_rate * keep_trailing_ms / 1000))
+    return audio[start:end]
+
+def sentence_padding_ms(overlap_ms: float, min_pause_ms: float) -> float:
+    """
+    Silence to keep at each side of a sentence boundary so that after the crossfade the pause is
+    `min_pause_ms` and the fade only covers silence: (overlap + pause) / 2, at least the overlap.
+    """
+    return max(overlap_ms, (overlap_ms + min_pause_ms) / 2)
+
+def trim_sentence_silence(
+    audio_chunks: List[Optional[np.ndarray]],
+    sample_rate: int,
+    overlap_ms: int = 150,
+    min_pause_ms: float = 200,
+    start_ms: float = START_SILENCE_MS,
+    threshold_db: float = SILENCE_THRESHOLD_DB
+) -> List[Optional[np.ndarray]]:
+    """
+    Trims the sentences of a reply before mix_audio_chunks_with_crossfade: the reply starts after
+    `start_ms` of silence and sentences are at least `min_pause_ms` apart, not the ~0.5 s F5 leaves.
+    None or empty chunks are passed through; an all-silent chunk becomes empty.
+    """
+    padding_ms = sentence_padding_ms(overlap_ms, min_pause_ms)
+    leading_ms = start_ms
+    trimmed = []
+    for chunk in audio_chunks:
+        if chunk is None or chunk.size == 0:
+            trimmed.append(chunk)
+            continue
+        trimmed.append(trim_silence(chunk, sample_rate, leading_ms, padding_ms, threshold_db))
+        leading_ms = padding_ms
+    return trimmed
+
+class SilenceTrimmer:
+    """
+    trim_silence for a sentence that arrives in blocks: push() returns the samples that can be
+    played, finish() what is left at its end. Leading silence is dropped as it comes (only the last
+    `keep_leading_ms` are held); silence after speech is held until more speech follows it or the
+    sentence ends, where only `keep_trailing_ms` of it is kept. Gives exactly what trim_silence
+    gives for the whole sentence.
+    """
+
+    def __init__(self, sample_rate: int, keep_leading_ms: float = 0, keep_trailing_ms: float = 0,
+                 threshold_db: float = SILENCE_THRESHOLD_DB, frame_ms: float = SILENCE_FRAME_MS):
+        self.frame = max(1, int(sample_rate * frame_ms / 1000))
+        self.keep_leading = int(sample_rate * keep_leading_ms / 1000)
+        self.keep_trailing = int(sample_rate * keep_trailing_ms / 1000)
+        self.threshold_db = threshold_db
+        self.held = np.empty(0, dtype=np.float32)  # Silence not played yet (frame aligned)
+        self.pending = np.empty(0, dtype=np.float32)  # Start of a frame, until it is complete
+        self.started = False  # Speech has been heard
+
+    def push(self, samples: np.ndarray) -> np.ndarray:
+        """Samples in, samples ready to play out (copies, `samples` can be reused)."""
+        data = np.concatenate((self.pending, samples))
+        complete = data.size - data.size % self.frame
+        self.pending = data[complete:]
+        return self._take(data[:complete])
+
+    def _take(self, data: np.ndarray) -> np.ndarray:
+        loud = _loud_frames(data, self.frame, self.threshold_db) if data.size else data[:0]
+        if not loud.size:
+            self.held = np.concatenate((self.held, data))
+            if not self.started:
+                self.held = self.held[self.held.size - min(self.held.size, self.keep_leading) :]
+            return data[:0]
+        first, end = loud[0] * self.frame, min(data.size, (loud[-1] + 1) * self.frame)
+        if self.started:
+            out = np.concatenate((self.held, data[:end]))
+        else:
+            lead = np.concatenate((self.held, data[:first]))
+            out = np.concatenate((lead[lead.size - min(lead.size, self.keep_leading) :], data[first:end]))
+            self.started = True
+        self.held = data[end:]
+        return out
+
+    def finish(self) -> np.ndarray:
+        """End of the sentence: the last samples with `keep_trailing_ms` of the silence after them."""
+        out = self._take(self.pending)
+        if self.started:
+            out = np.concatenate((out, self.held[: self.keep_trailing]))
+        self.held, self.pending, self.started = self.held[:0], self.pending[:0], False
+        return out
+
 def mix_audio_chunks_with_crossfade(
     audio_chunks: List[Optional[np.ndarray]], 
     sample_rate: int, 
@@ -53,33 +170,12 @@ def convert_float32_to_wav_bytes(audio_data: np.ndarray, sample_rate: int, chann
     """
     Converts a NumPy array of float32 audio samples to WAV file bytes.
     Assumes audio_data is in the range [-1.0, 1.0].
+    The gateway uses audio_encoding directly to avoid the final copy into bytes.
     """
     if audio_data is None or audio_data.size == 0:
         # Create a very short silent WAV if no audio data
-        sample_width = 2 # 16-bit
-        num_frames = 10 # Arbitrary small number for a silent frame
-        silence = np.zeros(num_frames, dtype=np.int16)
-    else:
-        # Normalize and convert float32 to int16
-        # Ensure data is clipped to [-1, 1] to prevent overflow when converting to int16
-        audio_data_clipped = np.clip(audio_data, -1.0, 1.0)
-        int16_samples = (audio_data_clipped * 32767.0).astype(np.int16)
-        sample_width = 2 # 16-bit
-        num_frames = int16_samples.shape[0]
-        sound_data = int16_samples.tobytes()
-
-    wav_buffer = io.BytesIO()
-    with wave.open(wav_buffer, 'wb') as wf:
-        wf.setnchannels(channels)
-        wf.setsampwidth(sample_width) # 2 bytes for int16
-        wf.setframerate(sample_rate)
-        if audio_data is not None and audio_data.size > 0:
-            wf.writeframes(sound_data)
-        else:
-            wf.writeframes(silence.tobytes())
-            
-    wav_bytes = wav_buffer.getvalue()
-    return wav_bytes
+        audio_data = np.zeros(10, dtype=np.float32) # Arbitrary small number for a silent frame
+    return bytes(audio_encoding.encode_wav_s16(audio_data, sample_rate, channels))
 
 # Optional MP3 conversion (requires pydub and ffmpeg/libmp3lame)
 # from pydub import AudioSegment
@@ -0,0 +1,355 @@
+# bench_audio_paths.py
+# Microbenchmarks for the audio hot paths, from one sentence up to one hour of audio:
+#   - audio_utils.mix_audio_chunks_with_crossfade
+#   - audio_utils.convert_float32_to_wav_bytes and the gateway's audio_encoding.encode_wav_s16
+#   - the receive/decode loop of tts_socket_client.send_text_and_receive_audio_chunk, over TCP,
+#     a Unix domain socket and the shared-memory ring
+#   - the receive/decode loop of api_client_buffered.fetch_sentence_audio_data
+#   - tts_receive.receive_stream, the fixed-buffer streaming receive (socket_client.py reads the same way through asyncio)
+# Each case is timed (median of --runs) and its peak traced memory is measured in a separate run.
+# The CPU time of the calling thread is reported per second of audio (the local server's threads
+# are not counted), the figure that matters for a client decoding a stream in real time.
+# Results are compared with bench_baselines.json; a case slower or larger than its baseline by
+# more than the tolerance fails, and the script exits with status 1.
+#
+#   python bench_audio_paths.py                      # compare with the stored baselines
+#   python bench_audio_paths.py --max_seconds 60     # only the cases up to one minute of audio
+#   python bench_audio_paths.py --update             # re-record the baselines on this machine
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(TESTS_DIR))                   # fastAPI/
+sys.path.append(os.path.dirname(os.path.dirname(TESTS_DIR)))  # F5TTS/
+
+import audio_encoding  # noqa: E402
+import audio_utils  # noqa: E402
+import tts_receive  # noqa: E402
+import tts_socket_client  # noqa: E402
+from tts_shm_ring import ShmRing  # noqa: E402
+
+SAMPLE_RATE = 24000
+OVERLAP_MS = 150
+SENTENCE_SECONDS = 4.0  # Typical length of one synthesized sentence
+BASELINE_FILE = os.path.join(TESTS_DIR, "bench_baselines.json")
+# Absolute slack added to the thresholds so sub-millisecond cases do not fail on timer noise
+TIME_SLACK_S = 0.001
+MEMORY_SLACK_BYTES = 64 * 1024
+
+# Audio durations covered by every benchmark, in seconds
+DURATIONS = {
+    "sentence": 4,
+    "paragraph": 30,
+    "minute": 60,
+    "10min": 600,
+    "hour": 3600,
+}
+
+
+def make_audio(num_samples, seed=0):
+    """
+    Speech-like float32 signal. The lowest byte of every sample is cleared so the byte stream
+    can never contain the END marker, which the clients look for in the raw data.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(num_samples, dtype=np.float32) / SAMPLE_RATE
+    audio = 0.3 * np.sin(2 * np.pi * 220.0 * t) + 0.05 * rng.standard_normal(num_samples).astype(np.float32)
+    audio = audio.astype(np.float32)
+    audio.view(np.uint32)[:] &= np.uint32(0xFFFFFF00)
+    return audio
+
+
+def make_sentence_chunks(seconds):
+    """The per-sentence chunks a gateway receives for `seconds` of audio."""
+    chunk_samples = int(SENTENCE_SECONDS * SAMPLE_RATE)
+    total = int(seconds * SAMPLE_RATE)
+    audio = make_audio(total)
+    return [audio[i : i + chunk_samples].copy() for i in range(0, total, chunk_samples)]
+
+
+class PayloadServer:
+    """
+    Local server that answers every request with `payload` in 2048-sample chunks followed by END,
+    like socket_server.py. Listens on TCP loopback or on a Unix socket; a client that attaches a
+    shared-memory ring receives (position, length) records instead of the samples.
+    """
+
+    def __init__(self, payload, unix_socket=None, chunk_bytes=2048 * 4):
+        self.payload = memoryview(payload)
+        self.chunk_bytes = chunk_bytes
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.remove(unix_socket)
+            self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.listener.bind(unix_socket)
+        else:
+            self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.listener.bind(("127.0.0.1", 0))
+            self.port = self.listener.getsockname()[1]
+        self.listener.listen()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._answer, args=(conn,), daemon=True).start()
+
+    def _answer(self, conn):
+        ring = None
+        if conn.family == socket.AF_INET:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # As socket_server.py does
+        with conn:
+            try:
+                while True:
+                    message = conn.recv(4096)
+                    if not message:
+                        break
+                    if tts_socket_client.SHM_ATTACH_KEY.encode() in message:
+                        ring = ShmRing.attach(json.loads(message)[tts_socket_client.SHM_ATTACH_KEY])
+                        conn.sendall(tts_socket_client.SHM_ATTACH_OK)
+                        continue
+                    for start in range(0, len(self.payload), self.chunk_bytes):
+                        chunk = self.payload[start : start + self.chunk_bytes]
+                        if ring is None:
+                            conn.sendall(chunk)
+                        else:
+                            conn.sendall(tts_socket_client.SHM_RECORD.pack(ring.write(chunk), len(chunk)))
+                    if ring is None:
+                        conn.sendall(b"END")
+                    else:
+                        conn.sendall(tts_socket_client.SHM_RECORD.pack(ring.write_position, 0))
+            except OSError:
+                pass
+            finally:
+                if ring is not None:
+                    ring.close()
+
+    def close(self):
+        self.listener.close()
+
+
+# ====== Cases ======
+# Each builder takes a duration in seconds and returns (run, cleanup). Setup happens in the
+# builder so only `run` is timed and traced.
+
+def case_mix(seconds):
+    chunks = make_sentence_chunks(seconds)
+
+    def run():
+        mixed = audio_utils.mix_audio_chunks_with_crossfade(chunks, SAMPLE_RATE, OVERLAP_MS)
+        assert mixed is not None and mixed.size > 0
+    return run, None
+
+
+def case_wav(seconds):
+    audio = make_audio(int(seconds * SAMPLE_RATE))
+
+    def run():
+        wav_bytes = audio_utils.convert_float32_to_wav_bytes(audio, SAMPLE_RATE)
+        assert len(wav_bytes) == 44 + audio.size * 2
+    return run, None
+
+
+def case_wav_buffer(seconds):
+    audio = make_audio(int(seconds * SAMPLE_RATE))
+
+    def run():
+        body = audio_encoding.encode_wav_s16(audio, SAMPLE_RATE)
+        assert len(body) == 44 + audio.size * 2
+    return run, None
+
+
+def client_decode_case(unix=False, shm=False):
+    """Builder for tts_socket_client's receive path over TCP, a Unix socket and/or shared memory."""
+
+    def case(seconds):
+        audio = make_audio(int(seconds * SAMPLE_RATE))
+        unix_socket = os.path.join(tempfile.gettempdir(), f"bench_tts_{os.getpid()}.sock") if unix else None
+        server = PayloadServer(audio.tobytes(), unix_socket=unix_socket)
+        tts_socket = tts_socket_client.connect_to_tts_server("127.0.0.1", getattr(server, "port", 0), unix_socket)
+        tts_socket.settimeout(60.0)
+        ring = tts_socket_client.attach_shm_ring(tts_socket) if shm else None
+
+        def run():
+            received = tts_socket_client.send_text_and_receive_audio_chunk("Benchmark sentence.", tts_socket, shm_ring=ring)
+            assert received is not None and received.size == audio.size, "Decoded sample count mismatch"
+
+        def cleanup():
+            tts_socket.close()
+            server.close()
+            if ring is not None:
+                ring.close()
+            if unix_socket and os.path.exists(unix_socket):
+                os.remove(unix_socket)
+        return run, cleanup
+    return case
+
+
+def case_stream_client_decode(seconds):
+    audio = make_audio(int(seconds * SAMPLE_RATE))
+    server = PayloadServer(audio.tobytes())
+    tts_socket = socket.create_connection(("127.0.0.1", server.port), timeout=60.0)
+
+    def run():
+        received = [0]
+
+        def consume(block):
+            received[0] += block.size
+        tts_socket.sendall(b"Benchmark sentence.")
+        status = tts_receive.receive_stream(tts_socket, consume)
+        assert status == tts_receive.STATUS_END and received[0] == audio.size, "Decoded sample count mismatch"
+
+    def cleanup():
+        tts_socket.close()
+        server.close()
+    return run, cleanup
+
+
+def case_buffered_client_decode(seconds):
+    import api_client_buffered  # Needs sounddevice and tqdm, like the client itself
+    from tqdm import tqdm
+
+    audio = make_audio(int(seconds * SAMPLE_RATE))
+    server = PayloadServer(audio.tobytes())
+    pbar = tqdm(total=1, disable=True)
+
+    def run():
+        api_client_buffered.fetch_sentence_audio_data("Benchmark sentence.", pbar, 0, "127.0.0.1", server.port)
+        _, received = api_client_buffered.raw_audio_queue.get_nowait()
+        assert received is not None and received.size == audio.size, "Decoded sample count mismatch"
+
+    def cleanup():
+        pbar.close()
+        server.close()
+    return run, cleanup
+
+
+BENCHMARKS = {
+    "mix_crossfade": case_mix,
+    "wav_encode": case_wav,
+    "wav_encode_buffer": case_wav_buffer,
+    "socket_client_decode": client_decode_case(),
+    "unix_client_decode": client_decode_case(unix=True),
+    "shm_client_decode": client_decode_case(shm=True),
+    "unix_shm_client_decode": client_decode_case(unix=True, shm=True),
+    "stream_client_decode": case_stream_client_decode,
+    "buffered_client_decode": case_buffered_client_decode,
+}
+
+
+# ====== Runner ======
+
+def measure(builder, seconds, runs):
+    """Returns (median seconds, median CPU seconds of this thread, peak traced bytes) for one case."""
+    run, cleanup = builder(seconds)
+    try:
+        run()  # Warm-up, also checks the result
+        timings, cpu_timings = [], []
+        for _ in range(runs):
+            start, cpu_start = time.perf_counter(), time.thread_time()
+            run()
+            timings.append(time.perf_counter() - start)
+            cpu_timings.append(time.thread_time() - cpu_start)
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return statistics.median(timings), statistics.median(cpu_timings), peak
+    finally:
+        if cleanup is not None:
+            cleanup()
+
+
+def runs_for(seconds, runs):
+    return runs if seconds <= 60 else max(1, runs // 5)
+
+
+def machine_info():
+    return {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+            "processor": platform.processor(), "cpus": os.cpu_count()}
+
+
+def load_baselines(path):
+    if not os.path.isfile(path):
+        return {"machine": None, "cases": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(result, baseline, time_tolerance, memory_tolerance):
+    """Returns a list of regression messages for one case (empty when it passes)."""
+    failures = []
+    if result["seconds"] > baseline["seconds"] * time_tolerance + TIME_SLACK_S:
+        failures.append(f"time {result['seconds'] * 1000:.1f} ms > {baseline['seconds'] * 1000:.1f} ms x {time_tolerance}")
+    if result["peak_bytes"] > baseline["peak_bytes"] * memory_tolerance + MEMORY_SLACK_BYTES:
+        failures.append(f"peak {result['peak_bytes'] / 1e6:.1f} MB > {baseline['peak_bytes'] / 1e6:.1f} MB x {memory_tolerance}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for audio_utils and the client decode paths.")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--max_seconds", type=float, default=3600, help="Skip cases longer than this much audio")
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per case (fewer for cases over a minute)")
+    parser.add_argument("--time_tolerance", type=float, default=1.5, help="Fail when slower than baseline x this")
+    parser.add_argument("--memory_tolerance", type=float, default=1.2, help="Fail when peak memory exceeds baseline x this")
+    parser.add_argument("--baselines", default=BASELINE_FILE)
+    parser.add_argument("--update", action="store_true", help="Store the results as the new baselines")
+    args = parser.parse_args()
+
+    stored = load_baselines(args.baselines)
+    if stored["machine"] and stored["machine"] != machine_info() and not args.update:
+        print(f"WARN - Baselines were recorded on {stored['machine']}, timings may not be comparable.")
+
+    results = {}
+    regressions = []
+    for benchmark in args.benchmarks:
+        for label, seconds in DURATIONS.items():
+            if seconds > args.max_seconds:
+                continue
+            name = f"{benchmark}[{label}]"
+            try:
+                median, cpu, peak = measure(BENCHMARKS[benchmark], seconds, runs_for(seconds, args.runs))
+            except ImportError as e:
+                print(f"{name:<36} SKIPPED (missing dependency: {e.name})")
+                break
+            result = {"seconds": median, "cpu_seconds": cpu, "peak_bytes": peak}
+            results[name] = result
+            baseline = stored["cases"].get(name)
+            if baseline is None:
+                status = "NO BASELINE"
+            else:
+                failures = compare(result, baseline, args.time_tolerance, args.memory_tolerance)
+                status = "FAIL: " + "; ".join(failures) if failures else f"ok ({median / baseline['seconds']:.2f}x)"
+                if failures:
+                    regressions.append(name)
+            cpu_per_audio = cpu / seconds * 1000
+            print(f"{name:<36} {median * 1000:10.2f} ms  cpu {cpu_per_audio:6.3f} ms/s  peak {peak / 1e6:8.1f} MB  {status}")
+
+    if args.update:
+        stored["machine"] = machine_info()
+        stored["cases"].update(results)
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+        print(f"Baselines written to {args.baselines}")
+    elif regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+    else:
+        print("\nNo regression.")
@@ -0,0 +1,64 @@
+# test_audio_encoding_manually.py
+import io
+import wave
+import numpy as np
+import audio_encoding
+
+SAMPLE_RATE = 24000
+
+t = np.linspace(0, 1.0, SAMPLE_RATE, endpoint=False)
+audio = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+audio[:10] = [1.5, -1.5, 1.0, -1.0, 0.0, 0.25, -0.25, 0.999, -0.999, 0.5]  # Clipping and edge values
+
+# Test 1: s16 WAV reads back with the wave module, samples match the legacy conversion
+print("--- Test 1: s16 WAV ---")
+body = audio_encoding.encode_wav_s16(audio, SAMPLE_RATE)
+assert isinstance(body, memoryview), "Encoders should return the buffer itself"
+with wave.open(io.BytesIO(body), "rb") as wf:
+    assert wf.getframerate() == SAMPLE_RATE and wf.getsampwidth() == 2 and wf.getnchannels() == 1
+    frames = np.frombuffer(wf.readframes(wf.getnframes()), dtype="<i2")
+expected = (np.clip(audio, -1.0, 1.0) * 32767.0).astype(np.int16)
+assert np.array_equal(frames, expected), "s16 samples differ from clip * 32767 -> int16"
+print("s16 WAV test passed.")
+
+# Test 2: float WAV keeps the samples and has a 58-byte header (extended fmt + fact chunk)
+print("\n--- Test 2: float32 WAV ---")
+body = audio_encoding.encode_wav_f32(audio, SAMPLE_RATE)
+assert bytes(body[:4]) == b"RIFF" and bytes(body[38:42]) == b"fact" and bytes(body[50:54]) == b"data"
+assert np.array_equal(np.frombuffer(body, dtype="<f4", offset=58), audio), "float32 samples changed"
+print("float32 WAV test passed.")
+
+# Test 3: raw PCM has no header
+print("\n--- Test 3: Raw PCM ---")
+assert np.array_equal(np.frombuffer(audio_encoding.encode_pcm_s16le(audio, SAMPLE_RATE), dtype="<i2"), expected)
+assert len(audio_encoding.encode_pcm_f32le(audio, SAMPLE_RATE)) == audio.size * 4
+print("Raw PCM test passed.")
+
+# Test 4: FLAC, only when soundfile is installed
+print("\n--- Test 4: FLAC ---")
+if audio_encoding.is_available("flac"):
+    import soundfile
+    decoded, rate = soundfile.read(io.BytesIO(audio_encoding.encode_flac(audio, SAMPLE_RATE)), dtype="int16")
+    assert rate == SAMPLE_RATE and np.array_equal(decoded, expected), "FLAC samples differ from s16 WAV"
+    print("FLAC test passed.")
+else:
+    print("soundfile not installed, FLAC test skipped.")
+
+# Test 5: Format negotiation
+print("\n--- Test 5: Negotiation ---")
+assert audio_encoding.negotiate_format(None) == "wav"
+assert audio_encoding.negotiate_format("text/html, */*;q=0.1") == "wav"
+assert audio_encoding.negotiate_format("audio/pcm") == "pcm_s16le"
+assert audio_encoding.negotiate_format("audio/wav", requested="pcm_f32le") == "pcm_f32le", "?format= should win"
+assert audio_encoding.negotiate_format("audio/flac;q=0, audio/x-wav") == "wav", "q=0 should exclude a type"
+for accept in ("application/json", "text/html", "application/json, text/plain;q=0.5"):
+    assert audio_encoding.negotiate_format(accept) == "wav", f"No audio type in '{accept}' should fall back to WAV"
+for accept, requested in (("audio/ogg", None), ("application/json, audio/mpeg", None), (None, "mp3")):
+    try:
+        audio_encoding.negotiate_format(accept, requested)
+        assert False, f"Expected UnsupportedFormatError for {accept or requested}"
+    except audio_encoding.UnsupportedFormatError as e:
+        print(f"Rejected as expected: {e}")
+print("Negotiation test passed.")
+
+print("\nAudio encoding manual tests complete.")
@@ -111,4 +111,47 @@ else:
     print("ERROR: Mixing short chunks resulted in None.")
 
 
+# Test 7: Silence trimming, whole chunks and streamed
+print("\n--- Test 7: Silence Trimming ---")
+rng = np.random.default_rng(0)
+
+def sentence(leading_s, trailing_s, pause_s=0.0):
+    """Two tones split by a pause, with room noise (~-80 dBFS) before and after."""
+    noise = lambda seconds: rng.normal(0, 1e-4, int(SAMPLE_RATE * seconds))
+    tone = 0.3 * np.sin(2 * np.pi * 220 * np.arange(int(SAMPLE_RATE * 0.5)) / SAMPLE_RATE)
+    return np.concatenate([noise(leading_s), tone, noise(pause_s), tone, noise(trailing_s)]).astype(np.float32)
+
+speech = sentence(0.4, 0.6, pause_s=0.3)
+trimmed = audio_utils.trim_silence(speech, SAMPLE_RATE, keep_leading_ms=30, keep_trailing_ms=100)
+print(f"{speech.size / SAMPLE_RATE:.2f}s trimmed to {trimmed.size / SAMPLE_RATE:.2f}s")
+assert abs(trimmed.size / SAMPLE_RATE - (0.03 + 1.3 + 0.1)) < 0.011, "Unexpected trimmed length"
+assert np.shares_memory(trimmed, speech), "trim_silence copied the chunk"
+assert audio_utils.trim_silence(sentence(0.2, 0.0)[:4800], SAMPLE_RATE).size == 0, "Silence not trimmed to nothing"
+kept = audio_utils.trim_silence(speech, SAMPLE_RATE, keep_leading_ms=1000, keep_trailing_ms=1000)
+assert kept.size == speech.size, "Pause shorter than the kept length was cut"
+for block_size in (1, 333, 2400, speech.size):
+    trimmer = audio_utils.SilenceTrimmer(SAMPLE_RATE, keep_leading_ms=30, keep_trailing_ms=100)
+    streamed = [trimmer.push(speech[start : start + block_size]) for start in range(0, speech.size, block_size)]
+    streamed = np.concatenate(streamed + [trimmer.finish()])
+    assert np.array_equal(streamed, trimmed), f"Streamed trim differs with blocks of {block_size}"
+print("Silence trimming tests passed.")
+
+# Test 8: Sentences trimmed before the crossfade keep the minimum pause
+print("\n--- Test 8: Pauses Between Sentences ---")
+sentences = [sentence(0.5, 0.5), None, sentence(0.4, 0.7)]
+trimmed_sentences = audio_utils.trim_sentence_silence(sentences, SAMPLE_RATE, OVERLAP_MS, min_pause_ms=200)
+mixed = audio_utils.mix_audio_chunks_with_crossfade(trimmed_sentences, SAMPLE_RATE, OVERLAP_MS)
+untrimmed = audio_utils.mix_audio_chunks_with_crossfade(sentences, SAMPLE_RATE, OVERLAP_MS)
+loud = np.flatnonzero(np.abs(mixed) > 0.01) / SAMPLE_RATE
+gaps = np.diff(loud)
+print(f"{untrimmed.size / SAMPLE_RATE:.2f}s untrimmed, {mixed.size / SAMPLE_RATE:.2f}s trimmed, "
+      f"speech starts at {loud[0]:.3f}s, longest pause {gaps.max():.3f}s")
+assert loud[0] < 0.04, "Leading silence not trimmed"
+assert 0.19 < gaps.max() < 0.22, "Pause between sentences not kept at the minimum"
+wav_bytes_trimmed = audio_utils.convert_float32_to_wav_bytes(mixed, SAMPLE_RATE)
+with open("trimmed_sentences.wav", "wb") as f:
+    f.write(wav_bytes_trimmed)
+print("Pause tests passed. Saved trimmed_sentences.wav.")
+
+
 print("\nAudio utils manual checks complete.")
\ No newline at end of file
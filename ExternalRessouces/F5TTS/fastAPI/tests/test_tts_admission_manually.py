@@ -0,0 +1,94 @@
+# test_tts_admission_manually.py
+import asyncio
+from tts_admission import AdmissionController, AdmissionRejected
+
+BUDGETS = {"interactive": 1.0, "prefetch": 3.0, "batch": 4.0}
+
+
+async def main():
+    # Test 1: Admitted at once below the cap
+    print("--- Test 1: Free Slots ---")
+    admission = AdmissionController(2, BUDGETS, max_queued_per_client=2, initial_service_seconds=0.4)
+    await admission.acquire("interactive", "a")
+    await admission.acquire("batch", "b")
+    assert admission.running == 2 and admission.queue_depth() == 0
+    print(f"Free slot test passed: {admission.stats()}")
+
+    # Test 2: Waiters get the slot interactive first, then in arrival order
+    print("\n--- Test 2: Priority Order ---")
+    order = []
+
+    async def wait_for_slot(name, priority, client_id):
+        await admission.acquire(priority, client_id)
+        order.append(name)
+
+    tasks = [asyncio.ensure_future(wait_for_slot(name, priority, name))
+             for name, priority in [("batch", "batch"), ("prefetch", "prefetch"), ("interactive", "interactive")]]
+    await asyncio.sleep(0.01)
+    assert admission.queue_depth() == 3
+    for _ in range(3):
+        admission.release(0.4)
+        await asyncio.sleep(0.01)
+    assert order == ["interactive", "prefetch", "batch"], f"Unexpected order {order}"
+    assert admission.running == 2 and admission.queue_depth() == 0
+    await asyncio.gather(*tasks)
+    print(f"Priority order test passed: {order}")
+
+    # Test 3: Refused at once past the budget, with a Retry-After
+    print("\n--- Test 3: Queue Budget ---")
+    admission.service_seconds = 1.0  # Two slots busy: each waiter adds 0.5s
+    waiters = [asyncio.ensure_future(admission.acquire("interactive", f"c{i}")) for i in range(2)]
+    await asyncio.sleep(0.01)
+    try:
+        await admission.acquire("interactive", "late")
+        raise AssertionError("Request over the budget was admitted")
+    except AdmissionRejected as e:
+        print(f"Rejected: {e.status_code}, Retry-After {e.retry_after}: {e}")
+        assert e.status_code == 503 and e.retry_after >= 1
+    batch = asyncio.ensure_future(admission.acquire("batch", "d"))  # Same queue, larger budget: waits
+    await asyncio.sleep(0.01)
+    assert admission.queue_depth() == 3 and not batch.done()
+    print("Queue budget test passed.")
+
+    # Test 4: One client cannot fill the queue
+    print("\n--- Test 4: Per-Client Limit ---")
+    waiters.append(asyncio.ensure_future(admission.acquire("batch", "greedy")))
+    waiters.append(asyncio.ensure_future(admission.acquire("batch", "greedy")))
+    await asyncio.sleep(0.01)
+    try:
+        await admission.acquire("batch", "greedy")
+        raise AssertionError("Third queued request of one client was admitted")
+    except AdmissionRejected as e:
+        print(f"Rejected: {e.status_code}, Retry-After {e.retry_after}: {e}")
+        assert e.status_code == 429
+    print("Per-client limit test passed.")
+
+    # Test 5: A waiter that gives up does not keep a slot
+    print("\n--- Test 5: Cancelled Waiter ---")
+    waiters[0].cancel()
+    await asyncio.sleep(0.01)
+    admission.release()
+    await asyncio.sleep(0.01)
+    assert waiters[1].done() and admission.running == 2, "Slot went to the cancelled waiter"
+    print("Cancelled waiter test passed.")
+
+    # Test 6: Refused when no slot frees within the budget
+    print("\n--- Test 6: Wait Timeout ---")
+    try:
+        await waiters[2]  # Queued batch request, behind the others: nothing is released for 4s
+        raise AssertionError("Waiter admitted without a free slot")
+    except AdmissionRejected as e:
+        print(f"Rejected: {e.status_code}, Retry-After {e.retry_after}: {e}")
+        assert e.status_code == 503
+    for waiter in [batch, waiters[3]]:
+        waiter.cancel()
+    await asyncio.sleep(0.01)
+    assert admission.queue_depth() == 0 and not admission.queued_by_client, "Waiters left behind"
+    for _ in range(2):
+        admission.release()
+    assert admission.running == 0, f"Slots leaked: {admission.running} running"
+    print("Wait timeout test passed.")
+
+
+asyncio.run(main())
+print("\nAdmission control manual tests complete.")
@@ -0,0 +1,67 @@
+# test_tts_cancel_manually.py
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))  # F5TTS/
+import socket_server  # noqa: E402
+from tts_engines import StubEngine  # noqa: E402
+from tts_protocol import CANCEL_MESSAGE, END_MESSAGE  # noqa: E402
+
+SAMPLING_RATE = 24000
+LONG_TEXT = " ".join(f"This is sentence number {i} of a long narration." for i in range(15))  # About 45 s of audio
+FOLLOW_UP = "Short follow up."
+
+
+def read_until_end(client, timeout=10):
+    """Audio bytes of one stream, read until END like the client library does."""
+    client.settimeout(timeout)
+    received = bytearray()
+    while not received.endswith(END_MESSAGE):
+        data = client.recv(65536)
+        assert data, "Connection closed before END"
+        received.extend(data)
+    return bytes(received[:-len(END_MESSAGE)])
+
+
+def run_session(send_queue):
+    processor = socket_server.TTSStreamingProcessor(StubEngine(SAMPLING_RATE, rtf=0.5), "", "", send_queue=send_queue)
+    processor.file_writer_lock.acquire()  # No output.wav from the test
+    server, client = socket.socketpair()
+    handler = threading.Thread(target=socket_server.handle_client, args=(server, ("127.0.0.1", 50000), processor), daemon=True)
+    handler.start()
+
+    client.sendall(LONG_TEXT.encode("utf-8"))
+    client.settimeout(10)
+    first_audio = client.recv(65536)
+    assert first_audio and not first_audio.endswith(END_MESSAGE), "No audio before the cancel"
+    start = time.perf_counter()
+    client.sendall(CANCEL_MESSAGE)
+    cancelled_audio = first_audio + read_until_end(client)
+    end_after = time.perf_counter() - start
+    print(f"END {end_after:.3f}s after CANCEL, {len(cancelled_audio) / 4 / SAMPLING_RATE:.2f}s of audio received")
+    assert end_after < 1.0, "END did not follow the CANCEL promptly"
+    assert len(cancelled_audio) / 4 / SAMPLING_RATE < 20, "Cancelled stream was generated to the end"
+
+    client.sendall(FOLLOW_UP.encode("utf-8"))
+    follow_up_audio = read_until_end(client)
+    print(f"Follow-up request: {len(follow_up_audio) / 4 / SAMPLING_RATE:.2f}s of audio")
+    assert follow_up_audio == StubEngine(SAMPLING_RATE).synthesize_batch(FOLLOW_UP).tobytes(), "Follow-up request on the same connection failed"
+    client.close()
+    handler.join(5)
+    assert not handler.is_alive(), "Connection handler did not end with the client"
+
+
+# Test 1: CANCEL mid-stream, audio sent inline
+print("--- Test 1: Cancel, Inline Sending ---")
+run_session(send_queue=None)
+print("Inline cancel test passed.")
+
+# Test 2: CANCEL mid-stream with the send queue: audio already queued is dropped, END follows
+print("\n--- Test 2: Cancel, Send Queue ---")
+run_session(send_queue={"sampling_rate": SAMPLING_RATE, "max_buffered_seconds": 10.0, "policy": "pause", "stall_timeout": 5.0})
+print("Send queue cancel test passed.")
+
+print("\nCancellation manual tests complete.")
@@ -0,0 +1,59 @@
+# test_tts_capture_manually.py
+import os
+import tempfile
+import threading
+import tts_capture
+
+directory = tempfile.mkdtemp()
+
+# Test 1: Requests recorded from several threads read back in order, plain and gzipped
+print("--- Test 1: Capture and Read Back ---")
+client_ids = {}
+for name in ("traffic.jsonl", "traffic.jsonl.gz"):
+    path = os.path.join(directory, name)
+    capture = tts_capture.TrafficCapture(path, "socket_server", voice="ref.wav")
+    threads = [threading.Thread(target=lambda i=i: [capture.record(f"Text {i}-{j}.", "interactive", client_id=f"10.0.0.{i}")
+                                                    for j in range(50)]) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    capture.record("Faster.", "batch", {"speed": 1.5, "nfe_step": 16})
+    capture.close()
+    capture.record("After close.", "interactive")  # Ignored
+    header, requests = tts_capture.read_capture(path)
+    requests = list(requests)
+    print(f"{name}: {os.path.getsize(path)} bytes for {len(requests)} requests, header {header}")
+    assert header["source"] == "socket_server" and header["voice"] == "ref.wav"
+    assert len(requests) == 201 and requests[-1]["options"] == {"speed": 1.5, "nfe_step": 16}
+    assert all(a["t"] <= b["t"] for a, b in zip(requests, requests[1:])), "Arrival times out of order"
+    assert "10.0.0" not in open(path, "rb").read().decode("latin-1"), "Client address written to the capture"
+    client_ids[name] = {request["client"] for request in requests if "client" in request}
+    assert len(client_ids[name]) == 4, "One client id per client expected within a capture"
+    assert tts_capture.hash_client("10.0.0.0", header["salt"]) in client_ids[name]
+assert not client_ids["traffic.jsonl"] & client_ids["traffic.jsonl.gz"], "Client ids of two captures match"
+print("Capture tests passed.")
+
+# Test 2: Worker files merged on one timeline
+print("\n--- Test 2: Merged Captures ---")
+paths = [tts_capture.worker_path(os.path.join(directory, "pool.jsonl"), i) for i in range(2)]
+for index, path in enumerate(paths):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f'{{"capture":1,"source":"socket_server","voice":null,"started":{100.0 + index}}}\n')
+        f.write(f'{{"t":0.5,"text":"Worker {index} first.","priority":"interactive"}}\n')
+        f.write(f'{{"t":1.2,"text":"Worker {index} second.","priority":"batch"}}\n')
+headers, traffic = tts_capture.load_traffic(paths)
+print([(request["t"], request["text"]) for request in traffic])
+assert [request["text"] for request in traffic] == ["Worker 0 first.", "Worker 0 second.", "Worker 1 first.", "Worker 1 second."]
+assert [round(request["t"], 3) for request in traffic] == [0.0, 0.7, 1.0, 1.7]
+print("Merge tests passed.")
+
+# Test 3: A capture cut off mid-line (server killed) keeps its complete lines
+print("\n--- Test 3: Cut Capture ---")
+with open(paths[0], "a", encoding="utf-8") as f:
+    f.write('{"t":2.0,"text":"Cut')
+_, requests = tts_capture.read_capture(paths[0])
+assert len(list(requests)) == 2, "Complete lines lost or cut line read"
+print("Cut capture test passed.")
+
+print("\nTraffic capture manual tests complete.")
@@ -0,0 +1,77 @@
+# test_tts_coalescing_manually.py
+import asyncio
+import threading
+
+import numpy as np
+
+import tts_admission
+import tts_api_server
+
+BUDGETS = {"interactive": 10.0, "prefetch": 10.0, "batch": 10.0}
+backend_calls = []
+gates = {}  # text -> threading.Event the fake backend waits on before answering
+
+
+def fake_synthesize_and_mix(text, priority, client_id, request_id, options):
+    """Stands in for the backend round trip: counts the calls and holds each one until its gate opens."""
+    backend_calls.append(text)
+    gate = gates.get(text)
+    if gate is not None:
+        gate.wait(5)
+    return np.full(100, len(backend_calls), dtype=np.float32)
+
+
+tts_api_server.synthesize_and_mix = fake_synthesize_and_mix
+tts_api_server.ADMISSION = tts_admission.AdmissionController(1, BUDGETS)  # One synthesis at a time
+
+
+def synthesize(text, client_id):
+    return asyncio.ensure_future(tts_api_server.synthesize_coalesced(text, "interactive", client_id, client_id, {}))
+
+
+async def main():
+    # Test 1: Two identical requests at the same time make one backend call
+    print("--- Test 1: Concurrent Identical Requests ---")
+    coalesced = tts_api_server.COALESCED.value()
+    gates["Hello there."] = threading.Event()
+    first, second = synthesize("Hello there.", "a"), synthesize("Hello there.", "b")
+    await asyncio.sleep(0.1)
+    assert len(tts_api_server.IN_FLIGHT_SYNTHESES) == 1, "The second request did not join the first"
+    gates["Hello there."].set()
+    first_audio, second_audio = await asyncio.gather(first, second)
+    print(f"Backend calls: {backend_calls}")
+    assert backend_calls == ["Hello there."], "Identical requests both reached the backend"
+    assert first_audio is second_audio and tts_api_server.COALESCED.value() == coalesced + 1
+    assert not tts_api_server.IN_FLIGHT_SYNTHESES and tts_api_server.ADMISSION.running == 0, "Synthesis or slot left behind"
+    print("Concurrent identical requests test passed.")
+
+    # Test 2: A request admitted after an identical one completed is answered from the cache
+    print("\n--- Test 2: Cache Filled During the Admission Wait ---")
+    backend_calls.clear()
+    tts_api_server.TTS_CACHE.clear()
+    coalesced = tts_api_server.COALESCED.value()
+    gates["Other text."] = threading.Event()
+    gates["Good morning."] = threading.Event()
+    other = synthesize("Other text.", "c")  # Holds the only slot
+    await asyncio.sleep(0.1)
+    early = synthesize("Good morning.", "d")  # Waits for the slot, then starts the synthesis
+    await asyncio.sleep(0.05)
+    late = synthesize("Good morning.", "e")  # Also waits: nothing identical is in flight yet
+    await asyncio.sleep(0.05)
+    assert tts_api_server.ADMISSION.queue_depth() == 2, "Both requests should wait for admission"
+    gates["Other text."].set()
+    await other
+    await asyncio.sleep(0.1)
+    assert backend_calls == ["Other text.", "Good morning."] and not late.done(), "The late request should still wait for the slot"
+    gates["Good morning."].set()
+    early_audio, late_audio = await asyncio.gather(early, late)
+    print(f"Backend calls: {backend_calls}")
+    assert backend_calls == ["Other text.", "Good morning."], "The late request asked the backend again"
+    assert late_audio is early_audio and tts_api_server.COALESCED.value() == coalesced + 1
+    assert tts_api_server.ADMISSION.running == 0 and tts_api_server.ADMISSION.queue_depth() == 0, "Admission slot leaked"
+    print("Cache after admission test passed.")
+
+    print("\nCoalescing manual tests complete.")
+
+
+asyncio.run(main())
@@ -0,0 +1,66 @@
+# test_tts_jitter_buffer_manually.py
+import numpy as np
+from tts_jitter_buffer import JitterBuffer
+
+SAMPLE_RATE = 1000  # Round numbers: 1 sample = 1 ms
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+clock = FakeClock()
+buffer = JitterBuffer(SAMPLE_RATE, target_seconds=0.2, min_target_seconds=0.1, max_target_seconds=0.5,
+                      relax_seconds=10.0, clock=clock)
+audio = np.arange(1, 2001, dtype=np.float32)
+
+# Test 1: Pre-roll until the target depth, then the samples in order
+print("--- Test 1: Pre-roll ---")
+buffer.write(audio[:150])
+assert not buffer.read(50).any(), "Playback started below the target depth"
+buffer.write(audio[150:400])
+clock.now = 0.3
+played = [buffer.read(100) for _ in range(3)]
+assert np.array_equal(np.concatenate(played), audio[:300]), "Samples out of order"
+assert buffer.stats()["time_to_first_audio"] == 0.3 and buffer.stats()["underruns"] == 0
+print(f"Pre-roll test passed ({buffer.depth_seconds:.2f}s buffered).")
+
+# Test 2: Underrun, padded with silence, then a deeper target
+print("\n--- Test 2: Underrun ---")
+block = buffer.read(150)
+assert np.array_equal(block[:100], audio[300:400]) and not block[100:].any(), "Underrun not padded with silence"
+stats = buffer.stats()
+assert stats["underruns"] == 1 and abs(stats["target_seconds"] - 0.3) < 1e-9, f"Unexpected stats {stats}"
+buffer.write(audio[400:650])
+assert not buffer.read(50).any(), "Playback restarted below the new target"
+buffer.write(audio[650:800])
+assert np.array_equal(buffer.read(100), audio[400:500]), "Audio lost across the underrun"
+print(f"Underrun test passed (target now {stats['target_seconds']:.2f}s).")
+
+# Test 3: The target relaxes after clean playback, within its bounds
+print("\n--- Test 3: Relax ---")
+clock.now += 10.0
+buffer.read(10)
+assert abs(buffer.target_seconds - 0.24) < 1e-9, f"Target did not relax: {buffer.target_seconds}"
+for _ in range(20):
+    clock.now += 10.0
+    buffer.read(1)
+assert buffer.target_seconds == 0.1, "Target went below its minimum"
+print("Relax test passed.")
+
+# Test 4: The end plays out what is left, a new stream keeps the learned target
+print("\n--- Test 4: End of stream ---")
+remaining = buffer.depth
+buffer.end()
+out = np.concatenate([buffer.read(64) for _ in range(remaining // 64 + 1)])
+assert buffer.finished and np.count_nonzero(out) == remaining, "Buffered audio not played out at the end"
+assert buffer.stats()["underruns"] == 1, "The end counted as an underrun"
+buffer.reset()
+assert buffer.target_seconds == 0.1 and buffer.stats()["underruns"] == 0 and buffer.stats()["total_underruns"] == 1
+print("End of stream test passed.")
+
+print("\nJitter buffer manual tests complete.")
@@ -0,0 +1,96 @@
+# test_tts_llm_bridge_manually.py
+import json
+import time
+import urllib.error
+import urllib.request
+import numpy as np
+import audio_utils
+import tts_llm_bridge
+
+BRIDGE_URL = "http://127.0.0.1:8001"  # uvicorn tts_llm_bridge:app --port 8001, with mock_llm_server.py and the backend
+SAMPLE_RATE = 24000
+
+# Test 1: Sentences cut from a token stream
+print("--- Test 1: Sentence Cutting ---")
+cutter = tts_llm_bridge.SentenceCutter(max_chars=60)
+sentences = []
+for token in ["Hel", "lo there! ", "How **are** you", "? It is 3.5 degrees.", " Ok\n", "A" + " long clause," * 8, " end"]:
+    sentences += cutter.feed(token)
+    print(f"After {token!r}: {sentences}")
+sentences += cutter.flush()
+assert sentences[:4] == ["Hello there!", "How are you?", "It is 3.5 degrees.", "Ok"], f"Unexpected cut: {sentences}"
+assert all(len(sentence) <= 60 for sentence in sentences) and sentences[-1].endswith("end"), "Run-on sentence not cut"
+print("Sentence cutting tests passed.")
+
+# Test 2: Streamed crossfade gives what the gateway's mixer gives for whole sentences
+print("\n--- Test 2: Streamed Crossfade ---")
+rng = np.random.default_rng(0)
+overlap = int(SAMPLE_RATE * tts_llm_bridge.BRIDGE_OVERLAP_MS / 1000)
+for sizes in [(24000, 1000, 30000, 5000, 100), (100, overlap, overlap + 1, 0, 20000)]:
+    chunks = [rng.standard_normal(size).astype(np.float32) for size in sizes]
+    mixer = tts_llm_bridge.CrossfadeStream(overlap)
+    streamed = []
+    for chunk in chunks:
+        for start in range(0, chunk.size, 1500):  # Blocks of any size, as the socket delivers them
+            streamed.append(mixer.push(chunk[start : start + 1500]))
+        streamed.append(mixer.end_sentence())
+    streamed.append(mixer.finish())
+    streamed = np.concatenate(streamed)
+    expected = audio_utils.mix_audio_chunks_with_crossfade(chunks, SAMPLE_RATE, tts_llm_bridge.BRIDGE_OVERLAP_MS)
+    assert streamed.size == expected.size and np.allclose(streamed, expected, atol=1e-6), f"Mix differs for {sizes}"
+print("Streamed crossfade tests passed.")
+
+# Test 2b: Trimmed while streaming, the sentences sound as the gateway trims and mixes them
+print("\n--- Test 2b: Streamed Silence Trimming ---")
+tone = 0.3 * np.sin(np.arange(SAMPLE_RATE) * 0.1)
+chunks = [np.concatenate([rng.normal(0, 1e-4, lead), tone[:size], rng.normal(0, 1e-4, trail)]).astype(np.float32)
+          for lead, size, trail in [(9000, 20000, 14000), (12000, 15000, 3000), (0, 24000, 20000)]]
+padding_ms = audio_utils.sentence_padding_ms(tts_llm_bridge.BRIDGE_OVERLAP_MS, tts_llm_bridge.BRIDGE_MIN_PAUSE_MS)
+mixer = tts_llm_bridge.CrossfadeStream(overlap)
+streamed = []
+for i, chunk in enumerate(chunks):
+    trimmer = audio_utils.SilenceTrimmer(SAMPLE_RATE, audio_utils.START_SILENCE_MS if i == 0 else padding_ms, padding_ms)
+    for start in range(0, chunk.size, 1500):
+        streamed.append(mixer.push(trimmer.push(chunk[start : start + 1500])))
+    streamed.append(mixer.push(trimmer.finish()))
+    streamed.append(mixer.end_sentence())
+streamed = np.concatenate(streamed + [mixer.finish()])
+expected = audio_utils.mix_audio_chunks_with_crossfade(
+    audio_utils.trim_sentence_silence(chunks, SAMPLE_RATE, tts_llm_bridge.BRIDGE_OVERLAP_MS,
+                                      tts_llm_bridge.BRIDGE_MIN_PAUSE_MS),
+    SAMPLE_RATE, tts_llm_bridge.BRIDGE_OVERLAP_MS)
+print(f"{sum(chunk.size for chunk in chunks) / SAMPLE_RATE:.2f}s of sentences streamed as {streamed.size / SAMPLE_RATE:.2f}s")
+assert streamed.size == expected.size and np.allclose(streamed, expected, atol=1e-6), "Streamed trim differs from the gateway's"
+print("Streamed silence trimming tests passed.")
+
+# Test 3: Spoken reply through the bridge (assuming it runs, with mock_llm_server.py and the backend)
+print("\n--- Test 3: Chat via the Bridge ---")
+body = json.dumps({"messages": [{"role": "user", "content": "What is photosynthesis?"}]}).encode("utf-8")
+request = urllib.request.Request(f"{BRIDGE_URL}/chat/", data=body, headers={"Content-Type": "application/json"})
+try:
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=60) as response:
+        first_audio = None
+        audio = bytearray()
+        while True:
+            data = response.read1(65536)
+            if not data:
+                break
+            if first_audio is None:
+                first_audio = time.perf_counter() - start
+            audio += data
+        request_id = response.headers["X-Request-ID"]
+    seconds = len(audio) / 2 / SAMPLE_RATE
+    print(f"First audio after {first_audio:.2f}s, {seconds:.1f}s of audio in {time.perf_counter() - start:.2f}s")
+    with urllib.request.urlopen(f"{BRIDGE_URL}/transcript/{request_id}") as response:
+        transcript = json.load(response)
+    print(f"Transcript: {transcript['text'][:80]}...")
+    assert seconds > 0 and transcript["done"], "No audio or unfinished transcript"
+    with open("llm_bridge_output.wav", "wb") as f:
+        f.write(audio_utils.convert_float32_to_wav_bytes(
+            np.frombuffer(bytes(audio), dtype="<i2").astype(np.float32) / 32767, SAMPLE_RATE))
+    print("Saved llm_bridge_output.wav. Listen to verify.")
+except urllib.error.URLError as e:
+    print(f"ERROR: Bridge not reachable at {BRIDGE_URL} ({e}). Is it running?")
+
+print("\nLLM bridge manual tests complete.")
@@ -0,0 +1,70 @@
+# test_tts_metrics_manually.py
+import urllib.request
+import tts_metrics
+
+registry = tts_metrics.MetricsRegistry()
+
+# Test 1: Counter with labels
+print("--- Test 1: Counter ---")
+errors = registry.counter("test_errors_total", "Errors by kind.", ("kind",))
+errors.inc(kind="protocol")
+errors.inc(2, kind="protocol")
+errors.inc(kind="connection")
+assert errors.value(kind="protocol") == 3, "Counter increment failed"
+assert 'test_errors_total{kind="connection"} 1.0' in registry.render(), "Counter rendering failed"
+print("Counter tests passed.")
+
+# Test 2: Gauge, stored and read at scrape time
+print("\n--- Test 2: Gauge ---")
+in_flight = registry.gauge("test_in_flight", "Requests in flight.")
+in_flight.inc()
+in_flight.inc()
+in_flight.dec()
+assert in_flight.value() == 1, "Gauge inc/dec failed"
+depth = registry.gauge("test_queue_depth", "Queue depth.")
+depth.set_function(lambda: 7)
+assert "test_queue_depth 7.0" in registry.render(), "Gauge function rendering failed"
+print("Gauge tests passed.")
+
+# Test 3: Histogram buckets are cumulative and end with +Inf
+print("\n--- Test 3: Histogram ---")
+latency = registry.histogram("test_latency_seconds", "Latency.", buckets=(0.1, 1.0))
+for value in (0.05, 0.1, 0.5, 3.0):
+    latency.observe(value)
+rendered = registry.render()
+print(rendered)
+assert 'test_latency_seconds_bucket{le="0.1"} 2' in rendered, "0.1 bucket should hold 0.05 and 0.1"
+assert 'test_latency_seconds_bucket{le="1.0"} 3' in rendered, "1.0 bucket should be cumulative"
+assert 'test_latency_seconds_bucket{le="+Inf"} 4' in rendered, "+Inf bucket should hold every observation"
+assert "test_latency_seconds_count 4" in rendered, "Histogram count mismatch"
+print("Histogram tests passed.")
+
+# Test 4: Registering the same name twice returns the existing metric
+print("\n--- Test 4: Re-registration ---")
+assert registry.counter("test_errors_total", "Errors by kind.", ("kind",)) is errors, "Re-registration created a new metric"
+print("Re-registration test passed.")
+
+# Test 5: Side-port HTTP server
+print("\n--- Test 5: Metrics server ---")
+server = tts_metrics.start_metrics_server(0, "127.0.0.1", registry)
+url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+with urllib.request.urlopen(url) as response:
+    body = response.read().decode("utf-8")
+    assert response.headers["Content-Type"] == tts_metrics.CONTENT_TYPE
+assert "test_latency_seconds_count 4" in body, "Metrics server returned unexpected content"
+server.shutdown()
+print("Metrics server test passed.")
+
+# Test 6: Extra routes on the metrics port
+print("\n--- Test 6: Extra routes ---")
+routes = {"/debug/echo": lambda params: ("text/plain", params.get("word", "").encode("utf-8"))}
+server = tts_metrics.start_metrics_server(0, "127.0.0.1", registry, routes=routes)
+base = f"http://127.0.0.1:{server.server_address[1]}"
+with urllib.request.urlopen(base + "/debug/echo?word=hello") as response:
+    assert response.read() == b"hello", "Route did not receive its query parameters"
+with urllib.request.urlopen(base + "/metrics") as response:
+    assert b"test_latency_seconds_count 4" in response.read(), "/metrics should still be served"
+server.shutdown()
+print("Extra routes test passed.")
+
+print("\nMetrics manual tests complete.")
@@ -0,0 +1,70 @@
+# test_tts_phrases_manually.py
+import json
+import os
+import tempfile
+import time
+import numpy as np
+import tts_phrases
+
+SAMPLE_RATE = 24000
+
+# Test 1: Normalization
+print("--- Test 1: Normalization ---")
+assert tts_phrases.normalize_text("  I don’t   KNOW. ") == tts_phrases.normalize_text("i don't know")
+assert tts_phrases.normalize_text("Well done!") != tts_phrases.normalize_text("Well done?"), "! and ? sound different"
+print("Normalization test passed.")
+
+# Test 2: Manifest formats
+print("\n--- Test 2: Manifests ---")
+directory = tempfile.mkdtemp()
+paths = {
+    "txt": os.path.join(directory, "phrases.txt"),
+    "json": os.path.join(directory, "phrases.json"),
+    "csv": os.path.join(directory, "phrases.csv"),
+}
+with open(paths["txt"], "w", encoding="utf-8") as f:
+    f.write("# Greetings\nHello!\n\nI don't know.  # Fallback\n")
+with open(paths["json"], "w", encoding="utf-8") as f:
+    json.dump(["Hello!", {"id": "idk", "voice": "default", "text": "I don't know."}], f)
+with open(paths["csv"], "w", encoding="utf-8") as f:
+    f.write("id,voice,text\ngreet,default,Hello!\nidk,default,I don't know.\n")
+for kind, path in paths.items():
+    assert tts_phrases.load_phrase_manifest(path) == ["Hello!", "I don't know."], f"{kind} manifest parsed wrong"
+print("Manifest tests passed.")
+
+# Test 3: Index build, lookup and memory
+print("\n--- Test 3: Index ---")
+synthesized = []
+
+
+def synthesize(text):
+    synthesized.append(text)
+    if text == "Fail.":
+        raise ConnectionError("backend down")
+    return np.full(len(text) * 100, 0.1, dtype=np.float32)
+
+
+index = tts_phrases.PhraseIndex(paths["txt"], synthesize)
+assert index.reload() == 0
+assert len(index) == 2 and index.get("hello!") is not None and index.get("I DON’T KNOW") is not None
+assert index.get("Hello") is None, "Only exact phrases (after normalization) are served"
+assert index.memory_bytes() == (len("Hello!") + len("I don't know.")) * 100 * 4, "Memory should count the float32 samples"
+print(index.stats())
+print("Index test passed.")
+
+# Test 4: Hot reload synthesizes only new phrases, drops removed ones and retries failures
+print("\n--- Test 4: Reload ---")
+time.sleep(0.01)  # Distinct modification time
+with open(paths["txt"], "w", encoding="utf-8") as f:
+    f.write("Hello!\nCorrect, well done!\nFail.\n")
+synthesized.clear()
+assert index.reload() == 1, "The failing phrase should be reported"
+assert synthesized == ["Correct, well done!", "Fail."], f"Unexpected synthesis calls: {synthesized}"
+assert index.get("I don't know.") is None, "Removed phrase still served"
+assert index.stats()["missing"] == 1
+synthesized.clear()
+index.reload()
+assert synthesized == ["Fail."], "Only the failed phrase should be retried when the manifest is unchanged"
+print("Reload test passed.")
+
+print("\nPhrase index manual tests complete.")
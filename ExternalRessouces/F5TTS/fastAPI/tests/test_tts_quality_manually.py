@@ -0,0 +1,53 @@
+# test_tts_quality_manually.py
+import os
+import sys
+import types
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))  # F5TTS/
+import tts_quality  # noqa: E402
+from socket_server import TTSStreamingProcessor  # noqa: E402
+from tts_engines import StubEngine  # noqa: E402
+from tts_protocol import ProtocolError, parse_request  # noqa: E402
+
+# Test 1: Levels go from full quality to the lowest step count and the longest opening batches
+print("--- Test 1: Guard Levels ---")
+levels = tts_quality.build_levels(32, 16, 2.0)
+print(levels)
+assert levels[0] == (32, 1.0) and levels[-1] == (16, 2.0)
+assert [level.nfe_step for level in levels] == sorted((level.nfe_step for level in levels), reverse=True)
+assert len(tts_quality.build_levels(16, 16, 2.0)) == 2, "Fixed nfe_step left no level for the chunk scale"
+print("Guard levels test passed.")
+
+# Test 2: chunk_scale lengthens the opening batches of a connection, up to max_chars
+print("\n--- Test 2: Opening Batches ---")
+processor = types.SimpleNamespace(engine=StubEngine(), max_chars=120, few_chars=60, min_chars=30)
+text = " ".join(f"Sentence number {i} is here." for i in range(20))
+opening = {scale: TTSStreamingProcessor.split_text(processor, text, True, scale) for scale in (1.0, 2.0, 10.0)}
+for scale, batches in opening.items():
+    print(f"First request, scale {scale}: {[len(batch) for batch in batches]}")
+    assert " ".join(batches) == text, "Text lost or reordered"
+assert len(opening[1.0][0]) <= 30 < len(opening[2.0][0]) <= 60, "Opening batch not lengthened by the scale"
+assert all(len(batch) <= 120 for batch in opening[10.0]), "Batch longer than max_chars"
+print("Opening batches test passed.")
+
+# Test 3: A connection's next requests are cut at max_chars whatever the scale
+print("\n--- Test 3: Next Requests ---")
+later = {scale: TTSStreamingProcessor.split_text(processor, text, False, scale) for scale in (1.0, 2.0)}
+print(f"Second request: {[len(batch) for batch in later[1.0]]}")
+assert later[1.0] == later[2.0], "chunk_scale changed the batches of a second request"
+assert all(len(batch) <= 120 for batch in later[1.0]) and len(later[1.0][0]) > 60
+print("Next requests test passed.")
+
+# Test 4: Text with nothing to say is refused before any batch is cut
+print("\n--- Test 4: Empty Text ---")
+for data in [b'{"text": ""}', b'{"text": "  \\n "}', b"   "]:
+    try:
+        parse_request(data)
+    except ProtocolError as e:
+        print(f"{data!r}: {e}")
+    else:
+        raise AssertionError(f"Empty request {data!r} accepted")
+assert TTSStreamingProcessor.split_text(processor, "", True, 2.0) == [], "Empty text gave a batch"
+print("Empty text test passed.")
+
+print("\nReal-time guard manual tests complete.")
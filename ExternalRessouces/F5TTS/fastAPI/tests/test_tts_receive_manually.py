@@ -0,0 +1,75 @@
+# test_tts_receive_manually.py
+import socket
+import threading
+import time
+import numpy as np
+import tts_receive
+
+SAMPLE_RATE = 24000
+
+
+def make_audio_with_markers(num_samples):
+    """Random samples with the END bytes written inside them, at and across sample boundaries."""
+    audio = np.random.default_rng(0).standard_normal(num_samples).astype(np.float32)
+    raw = audio.view(np.uint8)
+    for offset in (0, 401, 802, 1203, raw.size - 7):
+        raw[offset : offset + 3] = np.frombuffer(b"END", dtype=np.uint8)
+    return audio
+
+
+def send_in_pieces(conn, payload, piece_sizes):
+    """Sends `payload` cut at the given sizes (then the rest), pausing so each piece is read alone."""
+    view = memoryview(payload)
+    for size in piece_sizes:
+        conn.sendall(view[:size])
+        view = view[size:]
+        time.sleep(0.02)
+    conn.sendall(view)
+
+
+audio = make_audio_with_markers(SAMPLE_RATE)
+payload = audio.tobytes() + b"END"
+client, server = socket.socketpair()
+client.settimeout(2.0)
+
+# Test 1: END bytes inside the audio do not end the response
+print("--- Test 1: Whole response ---")
+threading.Thread(target=server.sendall, args=(payload,)).start()
+received, status = tts_receive.receive_audio(client)
+assert status == tts_receive.STATUS_END, f"Unexpected status {status}"
+assert np.array_equal(received, audio), "Audio cut short or corrupted by END bytes in the samples"
+assert received.base is None or received.base.nbytes == audio.nbytes, "Spare capacity kept alive by the result"
+print("Whole response test passed.")
+
+# Test 2: END split across reads, cut samples
+print("\n--- Test 2: Split reads ---")
+threading.Thread(target=send_in_pieces, args=(server, payload, [6, 1, 1000, len(payload) - 1009])).start()
+received, status = tts_receive.receive_audio(client)
+assert status == tts_receive.STATUS_END and np.array_equal(received, audio), "Split END or cut sample mishandled"
+print("Split reads test passed.")
+
+# Test 3: Streaming through a small fixed buffer
+print("\n--- Test 3: Stream ---")
+blocks = []
+threading.Thread(target=send_in_pieces, args=(server, payload, [5, 4096])).start()
+status = tts_receive.receive_stream(client, lambda block: blocks.append(block.copy()), buffer_size=1026)
+assert status == tts_receive.STATUS_END, f"Unexpected status {status}"
+assert max(block.nbytes for block in blocks) <= 1026 and np.array_equal(np.concatenate(blocks), audio), "Streamed audio differs"
+print(f"Stream test passed ({len(blocks)} blocks).")
+
+# Test 4: Empty response, timeout and closed connection
+print("\n--- Test 4: Endings ---")
+server.sendall(b"END")
+received, status = tts_receive.receive_audio(client)
+assert received.size == 0 and status == tts_receive.STATUS_END
+client.settimeout(0.2)
+server.sendall(audio[:10].tobytes())
+received, status = tts_receive.receive_audio(client)
+assert status == tts_receive.STATUS_TIMEOUT and np.array_equal(received, audio[:10]), "Audio before a timeout should be kept"
+server.close()
+received, status = tts_receive.receive_audio(client)
+assert received.size == 0 and status == tts_receive.STATUS_CLOSED
+client.close()
+print("Endings test passed.")
+
+print("\nReceive manual tests complete.")
@@ -0,0 +1,115 @@
+# test_tts_scheduler_manually.py
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))  # F5TTS/
+from tts_engines import CancelToken  # noqa: E402
+from tts_protocol import SynthesisRequest  # noqa: E402
+from tts_scheduler import SynthesisScheduler  # noqa: E402
+
+
+class FakeEngine:
+    """Records which request each text batch was generated for, in engine order."""
+
+    def __init__(self):
+        self.log = []
+        self.hooks = {}  # batch name -> called while that batch holds the engine
+
+    def generate(self, name):
+        self.log.append(name)
+        if name in self.hooks:
+            self.hooks[name]()
+        time.sleep(0.01)
+
+
+def stream(scheduler, engine, request, batches, results):
+    """What the server does for one request: one scheduler turn per text batch."""
+    for batch in batches:
+        if not scheduler.acquire(request):
+            results[request.request_id] = "cancelled"
+            return
+        try:
+            engine.generate(batch)
+        finally:
+            scheduler.release(request)
+    results[request.request_id] = "completed"
+
+
+def make_request(client_id, priority, request_id):
+    request = SynthesisRequest("text", client_id=client_id, priority=priority, request_id=request_id)
+    request.cancel_token = CancelToken()
+    return request
+
+
+def wait_for_depth(scheduler, depth):
+    deadline = time.perf_counter() + 5
+    while scheduler.queue_depth() != depth:
+        assert time.perf_counter() < deadline, f"Queue depth stuck at {scheduler.queue_depth()}, expected {depth}"
+        time.sleep(0.005)
+
+
+def start_queued(scheduler, engine, jobs, results):
+    """Starts the (request, batches) streams one by one, each waiting in the queue before the next starts."""
+    threads = []
+    for depth, (request, batches) in enumerate(jobs, start=1):
+        thread = threading.Thread(target=stream, args=(scheduler, engine, request, batches, results), daemon=True)
+        thread.start()
+        wait_for_depth(scheduler, depth)
+        threads.append(thread)
+    return threads
+
+
+# Test 1: Within a priority class, clients take turns batch by batch
+print("--- Test 1: Round-Robin ---")
+scheduler, engine, results = SynthesisScheduler(poll_interval=0.01), FakeEngine(), {}
+holder = make_request("holder", "batch", "holder")
+assert scheduler.acquire(holder)  # Keeps the engine until every request is queued
+jobs = [(make_request("alice", "batch", "a1"), ["a1.1", "a1.2", "a1.3"]),
+        (make_request("alice", "batch", "a2"), ["a2.1"]),
+        (make_request("bob", "batch", "b1"), ["b1.1", "b1.2"]),
+        (make_request("carol", "batch", "c1"), ["c1.1"])]
+threads = start_queued(scheduler, engine, jobs, results)
+scheduler.release(holder)
+for thread in threads:
+    thread.join(5)
+print(f"Engine order: {engine.log}")
+assert engine.log[:3] == ["a1.1", "b1.1", "c1.1"], "A client's queued requests ran before the other clients"
+assert engine.log.index("b1.2") < engine.log.index("a1.3"), "Bob's second batch waited behind all of Alice's"
+assert sorted(engine.log) == sorted(batch for _, batches in jobs for batch in batches)
+print("Round-robin test passed.")
+
+# Test 2: An interactive request preempts a batch narration between two of its batches
+print("\n--- Test 2: Preemption Between Batches ---")
+scheduler, engine, results = SynthesisScheduler(poll_interval=0.01), FakeEngine(), {}
+narration = make_request("alice", "batch", "narration")
+reply = make_request("bob", "interactive", "reply")
+engine.hooks["n1"] = lambda: start_queued(scheduler, engine, [(reply, ["r1"])], results)  # Arrives during n1
+stream(scheduler, engine, narration, ["n1", "n2", "n3", "n4"], results)
+wait_for_depth(scheduler, 0)
+print(f"Engine order: {engine.log}")
+assert engine.log == ["n1", "r1", "n2", "n3", "n4"], "Interactive request did not take the next turn"
+assert results == {"narration": "completed", "reply": "completed"}
+print("Preemption test passed.")
+
+# Test 3: A request cancelled while queued leaves the queue without taking a turn
+print("\n--- Test 3: Cancel While Queued ---")
+scheduler, engine, results = SynthesisScheduler(poll_interval=0.01), FakeEngine(), {}
+holder = make_request("holder", "interactive", "holder")
+assert scheduler.acquire(holder)
+queued = make_request("alice", "interactive", "queued")
+after = make_request("bob", "interactive", "after")
+threads = start_queued(scheduler, engine, [(queued, ["q1"]), (after, ["x1"])], results)
+start = time.perf_counter()
+queued.cancel_token.cancel()
+threads[0].join(5)
+print(f"Cancelled request left the queue after {time.perf_counter() - start:.3f}s, queue depth {scheduler.queue_depth()}")
+assert results.get("queued") == "cancelled" and scheduler.queue_depth() == 1
+scheduler.release(holder)
+threads[1].join(5)
+print(f"Engine order: {engine.log}")
+assert engine.log == ["x1"] and results["after"] == "completed", "Cancelled request still ran"
+print("Cancel while queued test passed.")
+
+print("\nScheduler manual tests complete.")
@@ -0,0 +1,107 @@
+# test_tts_send_queue_manually.py
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))  # F5TTS/
+from socket_server import QueuedSocketSink  # noqa: E402
+from tts_engines import CancelToken  # noqa: E402
+from tts_protocol import END_MESSAGE  # noqa: E402
+
+SAMPLING_RATE = 1000  # 1 s of audio is 4000 bytes: a small queue fills quickly
+CHUNKS = [np.arange(i * 1000, (i + 1) * 1000, dtype=np.float32) for i in range(200)]  # 800 KB, more than the socket buffers
+
+
+def stalled_client():
+    """(server side, client side) of a connection whose client does not read yet, with small socket buffers."""
+    server, client = socket.socketpair()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 16 * 1024)
+    client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 16 * 1024)
+    return server, client
+
+
+def read_stream(client, received):
+    """Reads until END, like the client library: the audio bytes go into `received`."""
+    while not received.endswith(END_MESSAGE):
+        data = client.recv(65536)
+        if not data:
+            break
+        received.extend(data)
+
+
+def produce(sink, token, done):
+    for chunk in CHUNKS:
+        if token.cancelled:
+            break
+        sink.send_audio(chunk, token)
+    done.set()
+
+
+# Test 1: pause holds the request until the client reads, then everything arrives
+print("--- Test 1: Pause ---")
+server, client = stalled_client()
+sink = QueuedSocketSink(server, SAMPLING_RATE, max_buffered_seconds=1.0, policy="pause")
+token, done = CancelToken(), threading.Event()
+threading.Thread(target=produce, args=(sink, token, done), daemon=True).start()
+assert not done.wait(1.0), "Generation did not wait for a client that does not read"
+print(f"Generation paused with {sink.buffered} bytes queued")
+assert sink.buffered <= sink.max_bytes
+received = bytearray()
+reader = threading.Thread(target=read_stream, args=(client, received), daemon=True)
+reader.start()
+assert done.wait(10), "Generation did not resume once the client read"
+sink.send_end(token)
+reader.join(10)
+sink.close()
+assert bytes(received[:-len(END_MESSAGE)]) == np.concatenate(CHUNKS).tobytes(), "Paused stream incomplete"
+print(f"Received {len(received)} bytes then END.")
+server.close()
+client.close()
+print("Pause test passed.")
+
+# Test 2: drop lets the generator go after stall_timeout and marks the client slow
+print("\n--- Test 2: Drop ---")
+server, client = stalled_client()
+sink = QueuedSocketSink(server, SAMPLING_RATE, max_buffered_seconds=1.0, policy="drop", stall_timeout=0.5)
+token, done = CancelToken(), threading.Event()
+start = time.perf_counter()
+threading.Thread(target=produce, args=(sink, token, done), daemon=True).start()
+assert done.wait(5), "Generator still held by a stalled client"
+released = time.perf_counter() - start
+print(f"Generator released after {released:.2f}s, reason {token.reason}")
+assert token.reason == "slow_client" and 0.5 <= released < 2.0
+sink.close()
+sink.sender.join(5)
+assert not sink.sender.is_alive(), "Sender thread still blocked on the dropped client"
+server.close()
+client.close()
+print("Drop test passed.")
+
+# Test 3: spill never holds the generator and the client still gets the whole stream, then END
+print("\n--- Test 3: Spill ---")
+server, client = stalled_client()
+sink = QueuedSocketSink(server, SAMPLING_RATE, max_buffered_seconds=1.0, policy="spill")
+token, done = CancelToken(), threading.Event()
+start = time.perf_counter()
+produce(sink, token, done)
+generated = time.perf_counter() - start
+print(f"Generated in {generated:.2f}s, {sink.spill_write - sink.spill_read} bytes spilled")
+assert generated < 1.0 and sink.spill_write > sink.spill_read, "Overflow not spilled"
+received = bytearray()
+reader = threading.Thread(target=read_stream, args=(client, received), daemon=True)
+reader.start()
+sink.send_end(token)
+reader.join(10)
+sink.close()
+assert bytes(received[:-len(END_MESSAGE)]) == np.concatenate(CHUNKS).tobytes(), "Spilled stream incomplete or reordered"
+assert received.endswith(END_MESSAGE) and sink.spill is None, "END missing or spill file left open"
+print(f"Received {len(received)} bytes then END.")
+server.close()
+client.close()
+print("Spill test passed.")
+
+print("\nSend queue manual tests complete.")
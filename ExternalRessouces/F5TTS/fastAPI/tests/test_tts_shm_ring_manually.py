@@ -0,0 +1,78 @@
+# test_tts_shm_ring_manually.py
+import os
+import socket
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))  # F5TTS/
+import socket_server  # noqa: E402
+from tts_protocol import SHM_ATTACH_FAILED, SHM_ATTACH_OK  # noqa: E402
+from tts_shm_ring import ShmRing, is_ring_name  # noqa: E402
+
+
+def tcp_pair():
+    """Connected (server side, client side) TCP sockets on the loopback interface."""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    client = socket.create_connection(listener.getsockname())
+    server, _ = listener.accept()
+    listener.close()
+    return server, client
+
+
+def attach(server, client, addr, name):
+    ring = socket_server.attach_shm_ring(server, addr, name)
+    reply = client.recv(len(SHM_ATTACH_FAILED))
+    return ring, reply
+
+
+# Test 1: Ring names
+print("--- Test 1: Ring Names ---")
+ring = ShmRing.create(64 * 1024)
+print(f"Created {ring.name}")
+assert is_ring_name(ring.name), "ShmRing.create made a name the server would refuse"
+for name in ["psm_3f2a9c1b", "tts_ring_", "tts_ring_0123456789abcdef/../x", "/tts_ring_0123456789abcdef", None, 42]:
+    assert not is_ring_name(name), f"Foreign name {name!r} accepted"
+payload = np.arange(1000, dtype=np.float32)
+position = ring.write(payload.tobytes())
+out = bytearray()
+ring.read_into(position, payload.nbytes, out)
+assert np.array_equal(np.frombuffer(bytes(out), dtype=np.float32), payload), "Ring round trip failed"
+print("Ring name tests passed.")
+
+# Test 2: Local clients may attach a ring
+print("\n--- Test 2: Local Attach ---")
+for label, (server, client), addr in [("unix", socket.socketpair(), ""), ("loopback", tcp_pair(), ("127.0.0.1", 50000)),
+                                      ("mapped loopback", tcp_pair(), ("::ffff:127.0.0.1", 50000, 0, 0))]:
+    attached, reply = attach(server, client, addr, ring.name)
+    print(f"{label}: {reply!r}")
+    assert reply == SHM_ATTACH_OK and attached is not None, f"Local {label} client refused"
+    attached.close()
+    server.close()
+    client.close()
+print("Local attach tests passed.")
+
+# Test 3: Remote clients and foreign segments are refused, the segment is left untouched
+print("\n--- Test 3: Refused Attach ---")
+foreign = shared_memory.SharedMemory(create=True, size=4096)
+foreign.buf[:4] = b"KEEP"
+cases = [("remote client, ring name", tcp_pair(), ("203.0.113.7", 50000), ring.name),
+         ("remote IPv6 client", tcp_pair(), ("2001:db8::1", 50000, 0, 0), ring.name),
+         ("local client, foreign segment", socket.socketpair(), "", foreign.name),
+         ("loopback client, foreign segment", tcp_pair(), ("127.0.0.1", 50000), foreign.name)]
+for label, (server, client), addr, name in cases:
+    attached, reply = attach(server, client, addr, name)
+    print(f"{label}: {reply!r}")
+    assert reply == SHM_ATTACH_FAILED and attached is None, f"Attach not refused for {label}"
+    server.close()
+    client.close()
+assert bytes(foreign.buf[:4]) == b"KEEP", "Foreign segment modified"
+foreign.close()
+foreign.unlink()
+ring.close()
+print("Refused attach tests passed.")
+
+print("\nShared-memory ring manual tests complete.")
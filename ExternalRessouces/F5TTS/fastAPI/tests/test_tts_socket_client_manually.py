@@ -5,6 +5,7 @@ import numpy as np
 
 F5TTS_BACKEND_IP = "127.0.0.1"  # Or your F5TTS backend IP
 F5TTS_BACKEND_PORT = 9998       # Or your F5TTS backend port
+F5TTS_BACKEND_HEALTH_URL = "http://127.0.0.1:9101/health"  # socket_server.py --metrics_port
 SAMPLE_RATE = 24000 # Must match what the backend produces for saving correctly
 
 # Test 1: Sentence splitting
@@ -30,6 +31,20 @@ print(f"Sentences from '{text4}': {sentences4}")
 assert sentences4 == [], "Sentence split 4 failed"
 print("Sentence splitting tests passed.")
 
+# Test 1b: Inference options
+print("\n--- Test 1b: Synthesis Options ---")
+options = tts_socket_client.check_synthesis_options({"nfe_step": 16.0, "speed": 1.5, "cfg_strength": None})
+assert options == {"nfe_step": 16, "speed": 1.5} and isinstance(options["nfe_step"], int), f"Options not normalized: {options}"
+for bad in ({"nfe_step": 100}, {"nfe_step": 8.5}, {"speed": 0.1}, {"temperature": 1.0}):
+    try:
+        tts_socket_client.check_synthesis_options(bad)
+        raise AssertionError(f"{bad} should be refused")
+    except ValueError as e:
+        print(f"Refused {bad}: {e}")
+message = tts_socket_client.build_request_message("Hi.", options=options)
+assert b'"nfe_step": 16' in message and b'"speed": 1.5' in message, f"Options missing from {message!r}"
+print("Synthesis options tests passed.")
+
 
 # Test 2: Full synthesis via socket (assuming F5TTS backend is running)
 print("\n--- Test 2: Full Synthesis via Socket ---")
@@ -80,4 +95,21 @@ except tts_socket_client.TTSSocketError:
 except Exception as e:
     print(f"ERROR: Test 3 FAILED - Unexpected error for bad port: {e}")
 
+# Test 4: Health of the backend, read without connecting to the synthesis port
+print("\n--- Test 4: Backend Health ---")
+try:
+    health = tts_socket_client.fetch_backend_health(F5TTS_BACKEND_HEALTH_URL)
+    print(f"Backend health: {health}")
+    assert health["state"] in ("ready", "busy", "warming"), f"Unknown state {health['state']}"
+    if health["state"] != "warming":
+        assert "queue_depth" in health and health["voices"], "Health report without queue depth or voices"
+    print("Test 4 PASSED.")
+except tts_socket_client.TTSSocketError as e:
+    print(f"ERROR: Backend health not readable ({e}). Is the server running with --metrics_port?")
+try:
+    tts_socket_client.fetch_backend_health("http://127.0.0.1:12345/health")  # Bogus port
+    print("ERROR: Expected TTSSocketError for a bad health URL.")
+except tts_socket_client.TTSSocketError:
+    print("Bad health URL correctly raised TTSSocketError.")
+
 print("\nTTS Socket Client manual tests complete.")
\ No newline at end of file
@@ -0,0 +1,129 @@
+# tts_admission.py
+# Admission control of the gateway (tts_api_server.py). At most `max_in_flight` syntheses run on the
+# backend at once; the others wait in the gateway, interactive first. A request whose estimated wait
+# exceeds its priority's queue-time budget is refused at once (503 + Retry-After) rather than left to
+# slow everyone down, as is a client with too many requests already waiting (429). Requests that do
+# not synthesize (cache and phrase hits, requests joining an identical synthesis, /status/) never
+# come here.
+import asyncio
+import collections
+import math
+import time
+from typing import Dict, Optional
+
+import tts_metrics
+from tts_socket_client import PRIORITIES
+
+SERVICE_SMOOTHING = 0.2  # Weight of the newest synthesis in the average synthesis time
+
+QUEUE_DEPTH = tts_metrics.REGISTRY.gauge("tts_gateway_queue_depth", "Requests waiting for a synthesis slot.")
+QUEUE_WAIT_SECONDS = tts_metrics.REGISTRY.histogram(
+    "tts_gateway_queue_wait_seconds", "Time admitted requests waited for a synthesis slot.")
+REJECTED = tts_metrics.REGISTRY.counter(
+    "tts_gateway_rejected_total", "Requests refused by admission control, by reason (budget, timeout, client_limit).",
+    ("reason", "priority"))
+
+
+class AdmissionRejected(Exception):
+    """The request is refused: answer `status_code` with a Retry-After of `retry_after` seconds."""
+
+    def __init__(self, status_code: int, retry_after: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Synthesis slots for one event loop. acquire() returns once a slot is held (or raises
+    AdmissionRejected); release(seconds) gives it back with the synthesis time, which feeds the
+    wait estimate: (requests ahead + 1) x average synthesis time / max_in_flight.
+    """
+
+    def __init__(self, max_in_flight: int, queue_budgets: Dict[str, float], max_queued_per_client: int = 0,
+                 initial_service_seconds: float = 3.0):
+        self.max_in_flight = max_in_flight
+        self.queue_budgets = queue_budgets
+        self.max_queued_per_client = max_queued_per_client
+        self.service_seconds = initial_service_seconds
+        self.running = 0
+        self.waiting = {priority: collections.deque() for priority in PRIORITIES}  # (future, client id)
+        self.queued_by_client: Dict[str, int] = collections.Counter()
+        QUEUE_DEPTH.set_function(self.queue_depth)
+
+    def queue_depth(self) -> int:
+        return sum(len(waiters) for waiters in self.waiting.values())
+
+    def estimated_wait(self, priority: str) -> float:
+        """Seconds a new request of `priority` would wait for a slot."""
+        if self.running < self.max_in_flight and not self.queue_depth():
+            return 0.0
+        ahead = sum(len(self.waiting[p]) for p in PRIORITIES[: PRIORITIES.index(priority) + 1])
+        return (ahead + 1) * self.service_seconds / self.max_in_flight
+
+    def _reject(self, status_code: int, reason: str, priority: str, retry_after: float, message: str):
+        REJECTED.inc(reason=reason, priority=priority)
+        raise AdmissionRejected(status_code, max(1, math.ceil(retry_after)), message)
+
+    async def acquire(self, priority: str, client_id: Optional[str] = None) -> float:
+        """Waits for a slot within the priority's budget. Returns the time it was taken (perf_counter)."""
+        budget = self.queue_budgets.get(priority, self.queue_budgets["interactive"])
+        wait = self.estimated_wait(priority)
+        if wait == 0.0:
+            self.running += 1
+            QUEUE_WAIT_SECONDS.observe(0.0)
+            return time.perf_counter()
+        if self.max_queued_per_client and client_id is not None \
+                and self.queued_by_client[client_id] >= self.max_queued_per_client:
+            self._reject(429, "client_limit", priority, self.service_seconds,
+                         f"{self.queued_by_client[client_id]} requests of this client are already waiting")
+        if wait > budget:
+            self._reject(503, "budget", priority, wait - budget,
+                         f"Estimated wait {wait:.1f}s exceeds the {budget:.0f}s budget of {priority} requests")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, client_id)
+        self.waiting[priority].append(entry)
+        self.queued_by_client[client_id] += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=budget)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                self.release()  # The slot was handed over just as the wait ended: pass it on
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject(503, "timeout", priority, self.service_seconds,
+                         f"No synthesis slot within the {budget:.0f}s budget of {priority} requests")
+        finally:
+            if entry in self.waiting[priority]:
+                self.waiting[priority].remove(entry)
+            self.queued_by_client[client_id] -= 1
+            if not self.queued_by_client[client_id]:
+                del self.queued_by_client[client_id]
+        QUEUE_WAIT_SECONDS.observe(time.perf_counter() - start)
+        return time.perf_counter()
+
+    def release(self, seconds: Optional[float] = None):
+        """Gives a slot back, to the first waiter of the highest priority. `seconds`: how long the synthesis took."""
+        if seconds is not None:
+            self.service_seconds = SERVICE_SMOOTHING * seconds + (1 - SERVICE_SMOOTHING) * self.service_seconds
+        for priority in PRIORITIES:
+            waiters = self.waiting[priority]
+            while waiters:
+                future, _ = waiters.popleft()
+                if not future.done():
+                    future.set_result(None)  # The slot goes to this waiter, running stays the same
+                    return
+        self.running -= 1
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "running": self.running,
+            "max_in_flight": self.max_in_flight,
+            "queued": {priority: len(waiters) for priority, waiters in self.waiting.items()},
+            "average_synthesis_seconds": self.service_seconds,
+            "estimated_wait_seconds": {priority: self.estimated_wait(priority) for priority in PRIORITIES},
+        }
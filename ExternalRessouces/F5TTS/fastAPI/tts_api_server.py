@@ -1,106 +1,376 @@
 # tts_api_server.py
 import fastapi
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse, Response
 import uvicorn
+import asyncio
+import contextlib
 import io
+import time
+import uuid
+import numpy as np
 from typing import Optional, Dict
 
 # Import from our other modules
 import tts_socket_client
 import audio_utils
+import audio_encoding
+import tts_admission
+import tts_capture
+import tts_metrics
+import tts_phrases
 
 # Configuration (can be moved to a config file or env vars later)
 F5TTS_BACKEND_IP = "127.0.0.1"  # IP of your actual F5TTS engine
 F5TTS_BACKEND_PORT = 9998       # Port of your actual F5TTS engine
+F5TTS_BACKEND_UNIX_SOCKET = None  # e.g. "/tmp/f5tts.sock" if the engine runs on this host with --unix_socket
+F5TTS_BACKEND_SHM = False       # Receive the samples through shared memory (engine on this host only)
+F5TTS_BACKEND_HEALTH_URL = f"http://{F5TTS_BACKEND_IP}:9101/health"  # Backend /health (--metrics_port), None = /status/ connects to the synthesis port
+HEALTH_POLL_SECONDS = 2.0       # Interval between /health polls, /status/ answers from the last one
 API_SAMPLE_RATE = 24000         # Sample rate for the output WAV
 API_OVERLAP_MS = 150            # Crossfade duration
+API_MIN_PAUSE_MS = 200          # Pause left between sentences once their edge silence is trimmed (None = keep it all)
+PHRASE_MANIFEST = None          # e.g. "phrases.txt": fixed phrases synthesized at startup and answered from memory
+MAX_IN_FLIGHT_SYNTHESES = 4     # Backend syntheses at once, the others wait in the gateway
+QUEUE_BUDGET_SECONDS = {"interactive": 5.0, "prefetch": 15.0, "batch": 60.0}  # Longest expected wait before 503
+MAX_QUEUED_PER_CLIENT = 4       # Requests one client may have waiting before 429 (0 = no limit)
+CAPTURE_PATH = None             # e.g. "gateway_traffic.jsonl": every /speak/ request logged for load_test.py --replay
 
-app = fastapi.FastAPI()
+# Phrase index, filled from PHRASE_MANIFEST in the background once the gateway starts
+PHRASE_INDEX: Optional[tts_phrases.PhraseIndex] = None
+# Traffic capture, opened on CAPTURE_PATH once the gateway starts
+CAPTURE: Optional[tts_capture.TrafficCapture] = None
+# Last /health report of the backend, with the time it was read (checked_at), see poll_backend_health
+BACKEND_HEALTH: Dict = {"state": "unknown"}
+
+
+def synthesize_phrase(text: str) -> Optional[np.ndarray]:
+    """Audio of one manifest phrase, produced by the backend at batch priority like a /speak/ request."""
+    return synthesize_and_mix(text, "batch", "phrase-index", None, {})
+
+
+async def poll_backend_health():
+    """Reads the backend's /health every HEALTH_POLL_SECONDS into BACKEND_HEALTH, for /status/."""
+    global BACKEND_HEALTH
+    while True:
+        try:
+            report = await run_in_threadpool(tts_socket_client.fetch_backend_health, F5TTS_BACKEND_HEALTH_URL)
+        except tts_socket_client.TTSSocketError as e:
+            report = {"state": "unreachable", "message": str(e)}
+        BACKEND_HEALTH = dict(report, checked_at=time.time())
+        await asyncio.sleep(HEALTH_POLL_SECONDS)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: fastapi.FastAPI):
+    global PHRASE_INDEX, CAPTURE
+    if PHRASE_MANIFEST:
+        # Phrases the backend cannot synthesize yet (not started) are retried on the next manifest check
+        PHRASE_INDEX = tts_phrases.PhraseIndex(PHRASE_MANIFEST, synthesize_phrase)
+        PHRASE_INDEX.start()
+    if CAPTURE_PATH:
+        CAPTURE = tts_capture.TrafficCapture(CAPTURE_PATH, "gateway")
+    health_poller = asyncio.ensure_future(poll_backend_health()) if F5TTS_BACKEND_HEALTH_URL else None
+    yield
+    if health_poller is not None:
+        health_poller.cancel()
+    if PHRASE_INDEX is not None:
+        PHRASE_INDEX.stop()
+    if CAPTURE is not None:
+        CAPTURE.close()
+
+
+app = fastapi.FastAPI(lifespan=lifespan)
 
 # In-memory cache (simple example, consider Redis or other for production)
-# Cache key: text, Cache value: wav_bytes
+# Cache key: synthesis_key (text and inference options), Cache value: mixed float32 audio, encoded per request in the negotiated format
 # This is a very basic cache, not thread-safe for updates without locks if multiple
 # gunicorn/uvicorn workers are used. For single worker, it's fine.
 # For simplicity, we'll avoid complex cache eviction policies here.
-TTS_CACHE: Dict[str, bytes] = {}
+TTS_CACHE: Dict[tuple, np.ndarray] = {}
 CACHE_MAX_SIZE = 100 # Max number of items in cache
 
+# Syntheses in progress: synthesis_key -> task producing the mixed audio, awaited by every identical request
+IN_FLIGHT_SYNTHESES: Dict[tuple, asyncio.Future] = {}
+
+# Synthesis slots; cache hits, phrases and requests joining an identical synthesis do not take one
+ADMISSION = tts_admission.AdmissionController(MAX_IN_FLIGHT_SYNTHESES, QUEUE_BUDGET_SECONDS, MAX_QUEUED_PER_CLIENT)
+
+# Metrics, exposed on /metrics (cache hit ratio = hits / (hits + misses))
+REQUEST_SECONDS = tts_metrics.REGISTRY.histogram(
+    "tts_gateway_request_seconds", "End-to-end /speak/ latency; the whole WAV is returned at once, so this is also time to first audio.")
+STAGE_SECONDS = tts_metrics.REGISTRY.histogram(
+    "tts_gateway_stage_seconds", "Time per gateway stage (backend, mix, encode).", labelnames=("stage",))
+RESPONSES_BY_FORMAT = tts_metrics.REGISTRY.counter(
+    "tts_gateway_responses_by_format_total", "Audio responses by encoded format.", ("format",))
+REAL_TIME_FACTOR = tts_metrics.REGISTRY.histogram(
+    "tts_gateway_real_time_factor", "Synthesis time divided by the duration of the returned audio.", tts_metrics.RTF_BUCKETS)
+IN_FLIGHT = tts_metrics.REGISTRY.gauge("tts_gateway_requests_in_flight", "/speak/ requests waiting on the backend.")
+CACHE_HITS = tts_metrics.REGISTRY.counter("tts_gateway_cache_hits_total", "/speak/ requests served from the cache.")
+CACHE_MISSES = tts_metrics.REGISTRY.counter("tts_gateway_cache_misses_total", "/speak/ requests sent to the backend.")
+COALESCED = tts_metrics.REGISTRY.counter(
+    "tts_gateway_coalesced_total", "Cache misses answered by an identical synthesis, in flight or finished during their admission wait.")
+BACKEND_ERRORS = tts_metrics.REGISTRY.counter(
+    "tts_gateway_backend_errors_total", "Failed /speak/ requests by kind (unavailable, empty, internal).", ("kind",))
+
+
+@app.middleware("http")
+async def add_request_id(request: fastapi.Request, call_next):
+    """
+    Tags each request with an id, taken from the X-Request-ID header or generated.
+    The id is forwarded to the synthesis backend, whose traces and logs carry it.
+    """
+    request.state.request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request.state.request_id
+    return response
+
+
+SILENCE = np.zeros(10, dtype=np.float32)  # Returned when the backend produced no audio
+
+
+def encode_audio_response(audio: np.ndarray, audio_format: str) -> Response:
+    """
+    Encodes audio into a response. The body is the encoder's buffer itself (a memoryview),
+    so the samples are copied once, by the encoder.
+    """
+    body = audio_encoding.encode(audio, API_SAMPLE_RATE, audio_format)
+    RESPONSES_BY_FORMAT.inc(format=audio_format)
+    return Response(
+        content=body,
+        media_type=audio_encoding.FORMATS[audio_format].media_type,
+        headers=audio_encoding.response_headers(audio_format, API_SAMPLE_RATE),
+    )
+
+
+def synthesize_and_mix(text: str, priority: str, client_id: Optional[str], request_id: Optional[str],
+                       options: Dict[str, float]) -> Optional[np.ndarray]:
+    """Blocking: asks the backend for `text` and crossfades its sentences. None if no audio came back."""
+    # 1. Get audio chunks from F5TTS backend via our socket client
+    # This function now returns List[Optional[np.ndarray]]
+    stage_start = time.perf_counter()
+    raw_audio_chunks = tts_socket_client.synthesize_text_via_socket(
+        text, F5TTS_BACKEND_IP, F5TTS_BACKEND_PORT, priority=priority, client_id=client_id,
+        request_id=request_id, unix_socket=F5TTS_BACKEND_UNIX_SOCKET, use_shm=F5TTS_BACKEND_SHM, options=options,
+    )
+    STAGE_SECONDS.observe(time.perf_counter() - stage_start, stage="backend")
+
+    if not raw_audio_chunks: # Either no sentences or all failed
+        BACKEND_ERRORS.inc(kind="empty")
+        print(f"API_SERVER: No valid audio chunks received from TTS backend for: \"{text[:50]}...\"")
+        return None
+
+    # 2. Trim the silence around the sentences, then mix them with crossfade
+    stage_start = time.perf_counter()
+    if API_MIN_PAUSE_MS is not None:
+        raw_audio_chunks = audio_utils.trim_sentence_silence(
+            raw_audio_chunks, API_SAMPLE_RATE, API_OVERLAP_MS, API_MIN_PAUSE_MS)
+    final_audio_np = audio_utils.mix_audio_chunks_with_crossfade(raw_audio_chunks, API_SAMPLE_RATE, API_OVERLAP_MS)
+    STAGE_SECONDS.observe(time.perf_counter() - stage_start, stage="mix")
+
+    if final_audio_np is None or final_audio_np.size == 0:
+        BACKEND_ERRORS.inc(kind="empty")
+        print(f"API_SERVER: Audio mixing resulted in no audio data for: \"{text[:50]}...\"")
+        return None
+    return final_audio_np
+
+
+def synthesis_key(text: str, options: Dict[str, float]) -> tuple:
+    """
+    What makes two requests produce the same audio: the text and the inference options. The
+    format is not part of it: every request encodes the shared float audio itself. There is
+    one voice, the backend's. The priority only changes when the audio comes, not what it is.
+    """
+    return (text, tuple(sorted(options.items())))
+
+
+async def _synthesize_and_cache(text: str, priority: str, client_id: Optional[str], request_id: Optional[str],
+                                options: Dict[str, float]):
+    final_audio_np = await run_in_threadpool(synthesize_and_mix, text, priority, client_id, request_id, options)
+    if final_audio_np is not None:
+        # Update cache (simple eviction if full), before the synthesis leaves IN_FLIGHT_SYNTHESES
+        if len(TTS_CACHE) >= CACHE_MAX_SIZE:
+            TTS_CACHE.pop(next(iter(TTS_CACHE))) # Remove oldest item (dict order Python 3.7+)
+        TTS_CACHE[synthesis_key(text, options)] = final_audio_np
+    return final_audio_np
+
+
+async def synthesize_coalesced(text: str, priority: str, client_id: Optional[str], request_id: Optional[str],
+                               options: Dict[str, float]) -> Optional[np.ndarray]:
+    """
+    Single-flight synthesis: the first request for a key starts it, identical requests arriving
+    before it finishes wait for the same result instead of asking the backend again.
+    The synthesis runs as its own task, so a waiter that disconnects does not cancel it for the others.
+    Starting one takes an admission slot, held until the task ends; raises tts_admission.AdmissionRejected.
+    The cache is checked again once admitted: an identical request may have completed during the wait.
+    """
+    key = synthesis_key(text, options)
+    task = IN_FLIGHT_SYNTHESES.get(key)
+    if task is None:
+        started = await ADMISSION.acquire(priority, client_id)
+        task = IN_FLIGHT_SYNTHESES.get(key)  # An identical request may have started it while this one waited
+        cached_audio = TTS_CACHE.get(key) if task is None else None  # ...or even finished it
+        if cached_audio is not None:
+            ADMISSION.release()
+            COALESCED.inc()
+            print(f"API_SERVER: [{request_id}] answered from the cache filled while it waited for admission.")
+            return cached_audio
+        if task is None:
+            task = asyncio.ensure_future(_synthesize_and_cache(text, priority, client_id, request_id, options))
+            IN_FLIGHT_SYNTHESES[key] = task
+            task.add_done_callback(lambda done: IN_FLIGHT_SYNTHESES.pop(key, None) if IN_FLIGHT_SYNTHESES.get(key) is done else None)
+            task.add_done_callback(lambda done: ADMISSION.release(time.perf_counter() - started))
+            return await asyncio.shield(task)
+        ADMISSION.release()
+    COALESCED.inc()
+    print(f"API_SERVER: [{request_id}] joins the synthesis already in flight for: \"{text[:50]}...\"")
+    return await asyncio.shield(task)
+
 
 @app.post("/speak/", response_class=Response)
-async def speak_text(text_request: str = fastapi.Body(..., embed=True, description="Text to synthesize.")):
+async def speak_text(
+    request: fastapi.Request,
+    text_request: str = fastapi.Body(..., embed=True, description="Text to synthesize."),
+    priority: str = fastapi.Body("interactive", embed=True, description="interactive, prefetch or batch."),
+    nfe_step: Optional[int] = fastapi.Body(
+        None, embed=True, description="ODE steps (4-64, backend default 32): fewer is faster, e.g. 8-16 for short replies."),
+    cfg_strength: Optional[float] = fastapi.Body(None, embed=True, description="Classifier-free guidance (0-5, default 2)."),
+    sway_sampling_coef: Optional[float] = fastapi.Body(None, embed=True, description="Step schedule (-1 to 1, default -1)."),
+    speed: Optional[float] = fastapi.Body(None, embed=True, description="Speaking rate (0.5-2, default 1)."),
+    audio_format: Optional[str] = fastapi.Query(
+        None, alias="format", description="wav, wav_f32, pcm_s16le, pcm_f32le or flac; overrides the Accept header."),
+):
     """
     Receives text, synthesizes it to audio using the F5TTS backend,
-    and returns the audio as WAV bytes.
+    and returns the audio as WAV bytes (or the format asked by ?format= or the Accept header).
+    Interactive requests are served before prefetch and batch work on the backend.
+    The inference options left out keep the backend's defaults; an engine that cannot change one ignores it.
     """
     if not text_request or not text_request.strip():
         return Response(content=b"Error: No text provided.", status_code=400, media_type="text/plain")
+    if priority not in tts_socket_client.PRIORITIES:
+        return Response(content=f"Error: Unknown priority '{priority}'.".encode(), status_code=400, media_type="text/plain")
+    try:
+        options = tts_socket_client.check_synthesis_options(
+            {"nfe_step": nfe_step, "cfg_strength": cfg_strength, "sway_sampling_coef": sway_sampling_coef, "speed": speed})
+    except ValueError as e:
+        return Response(content=f"Error: {e}".encode(), status_code=400, media_type="text/plain")
+    try:
+        audio_format = audio_encoding.negotiate_format(request.headers.get("accept"), audio_format)
+    except audio_encoding.UnsupportedFormatError as e:
+        return Response(content=f"Error: {e}".encode(), status_code=406, media_type="text/plain")
+
+    request_start = time.perf_counter()
+    if CAPTURE is not None:
+        CAPTURE.record(text_request, priority, options, request.client.host if request.client else None)
 
-    # Check cache first
-    if text_request in TTS_CACHE:
+    # Preloaded phrases first (rendered with the default options), then the cache
+    phrase_audio = PHRASE_INDEX.get(text_request) if PHRASE_INDEX is not None and not options else None
+    if phrase_audio is not None:
+        try:
+            response = encode_audio_response(phrase_audio, audio_format)
+        except audio_encoding.UnsupportedFormatError as e:
+            return Response(content=f"Error: {e}".encode(), status_code=406, media_type="text/plain")
+        REQUEST_SECONDS.observe(time.perf_counter() - request_start)
+        return response
+
+    cached_audio = TTS_CACHE.get(synthesis_key(text_request, options))
+    if cached_audio is not None:
         print("API_SERVER: Cache hit!")
-        wav_bytes = TTS_CACHE[text_request]
-        return Response(content=wav_bytes, media_type="audio/wav")
+        CACHE_HITS.inc()
+        try:
+            response = encode_audio_response(cached_audio, audio_format)
+        except audio_encoding.UnsupportedFormatError as e:
+            return Response(content=f"Error: {e}".encode(), status_code=406, media_type="text/plain")
+        REQUEST_SECONDS.observe(time.perf_counter() - request_start)
+        return response
     
-    print(f"API_SERVER: Cache miss. Synthesizing text: \"{text_request[:50]}...\"")
+    request_id = request.state.request_id
+    print(f"API_SERVER: Cache miss [{request_id}]. Synthesizing text: \"{text_request[:50]}...\"")
+    CACHE_MISSES.inc()
 
+    IN_FLIGHT.inc()
     try:
-        # 1. Get audio chunks from F5TTS backend via our socket client
-        # This function now returns List[Optional[np.ndarray]]
-        raw_audio_chunks = tts_socket_client.synthesize_text_via_socket(
-            text_request, F5TTS_BACKEND_IP, F5TTS_BACKEND_PORT
-        )
+        # 1-2. Backend synthesis and crossfade, shared with identical requests already in flight
+        client_id = request.client.host if request.client else None
+        final_audio_np = await synthesize_coalesced(text_request, priority, client_id, request_id, options)
+        if final_audio_np is None:
+            return encode_audio_response(SILENCE, audio_format) # Or 503 if backend error
 
-        if not raw_audio_chunks: # Either no sentences or all failed
-            print(f"API_SERVER: No valid audio chunks received from TTS backend for: \"{text_request[:50]}...\"")
-            # Return a short silent WAV or an error
-            silent_wav = audio_utils.convert_float32_to_wav_bytes(None, API_SAMPLE_RATE)
-            return Response(content=silent_wav, media_type="audio/wav", status_code=200) # Or 503 if backend error
+        # 3. Encode the final NumPy audio in the negotiated format
+        stage_start = time.perf_counter()
+        response = encode_audio_response(final_audio_np, audio_format)
+        STAGE_SECONDS.observe(time.perf_counter() - stage_start, stage="encode")
 
-        # 2. Mix audio chunks with crossfade
-        final_audio_np = audio_utils.mix_audio_chunks_with_crossfade(
-            raw_audio_chunks, API_SAMPLE_RATE, API_OVERLAP_MS
-        )
+        print(f"API_SERVER: Successfully synthesized audio. Sending {len(response.body)} bytes of {audio_format}.")
+        elapsed = time.perf_counter() - request_start
+        REQUEST_SECONDS.observe(elapsed)
+        REAL_TIME_FACTOR.observe(elapsed * API_SAMPLE_RATE / final_audio_np.size)
+        return response
 
-        if final_audio_np is None or final_audio_np.size == 0:
-            print(f"API_SERVER: Audio mixing resulted in no audio data for: \"{text_request[:50]}...\"")
-            silent_wav = audio_utils.convert_float32_to_wav_bytes(None, API_SAMPLE_RATE)
-            return Response(content=silent_wav, media_type="audio/wav", status_code=200)
+    except audio_encoding.UnsupportedFormatError as e:
+        return Response(content=f"Error: {e}".encode(), status_code=406, media_type="text/plain")
 
-        # 3. Convert final NumPy audio to WAV bytes
-        wav_bytes = audio_utils.convert_float32_to_wav_bytes(final_audio_np, API_SAMPLE_RATE)
-
-        # Update cache (simple eviction if full)
-        if len(TTS_CACHE) >= CACHE_MAX_SIZE:
-            TTS_CACHE.pop(next(iter(TTS_CACHE))) # Remove oldest item (dict order Python 3.7+)
-        TTS_CACHE[text_request] = wav_bytes
-        
-        print(f"API_SERVER: Successfully synthesized audio. Sending {len(wav_bytes)} WAV bytes.")
-        # Return as raw bytes with appropriate media type
-        return Response(content=wav_bytes, media_type="audio/wav")
+    except tts_admission.AdmissionRejected as e:
+        print(f"API_SERVER: [{request_id}] rejected ({e.status_code}): {e}")
+        return Response(content=f"Error: {e}".encode(), status_code=e.status_code, media_type="text/plain",
+                        headers={"Retry-After": str(e.retry_after)})
 
     except tts_socket_client.TTSSocketError as e:
+        BACKEND_ERRORS.inc(kind="unavailable")
         print(f"API_SERVER: ERROR - TTS backend communication error: {e}")
         return Response(content=f"Error: TTS backend service unavailable or failed: {e}", status_code=503, media_type="text/plain")
     except Exception as e:
+        BACKEND_ERRORS.inc(kind="internal")
         print(f"API_SERVER: ERROR - Unexpected error during TTS synthesis: {e}")
         import traceback
         traceback.print_exc() # Log full traceback for unexpected errors
         return Response(content=f"Error: Internal server error during TTS: {e}", status_code=500, media_type="text/plain")
+    finally:
+        IN_FLIGHT.dec()
 
 
 @app.get("/status/")
 async def get_status():
-    """Checks if the F5TTS backend socket server is reachable."""
+    """
+    Checks if the F5TTS backend socket server is reachable. Never throttled by admission control.
+    With F5TTS_BACKEND_HEALTH_URL the answer comes from the last /health poll: no connection to the
+    synthesis port, 503 while the backend warms up. If /health cannot be read (backend without a
+    metrics port) or the poll is more than three intervals old, /status/ connects to the synthesis port.
+    """
+    health = BACKEND_HEALTH
+    fresh = time.time() - health.get("checked_at", 0) <= 3 * HEALTH_POLL_SECONDS
+    if F5TTS_BACKEND_HEALTH_URL and fresh and health["state"] != "unreachable":
+        if health["state"] in ("ready", "busy"):
+            return {"status": "OK", "message": f"TTS Backend is {health['state']}.", "backend": health,
+                    "admission": ADMISSION.stats()}
+        return fastapi.responses.JSONResponse(
+            status_code=503,
+            content={"status": "ERROR", "message": health.get("message") or f"TTS Backend is {health['state']}.",
+                     "backend": health}
+        )
     try:
-        s = tts_socket_client.connect_to_tts_server(F5TTS_BACKEND_IP, F5TTS_BACKEND_PORT)
+        s = tts_socket_client.connect_to_tts_server(F5TTS_BACKEND_IP, F5TTS_BACKEND_PORT, F5TTS_BACKEND_UNIX_SOCKET)
         s.close()
-        return {"status": "OK", "message": "TTS Backend is reachable."}
+        return {"status": "OK", "message": "TTS Backend is reachable.", "admission": ADMISSION.stats()}
     except tts_socket_client.TTSSocketError as e:
         return fastapi.responses.JSONResponse(
             status_code=503,
             content={"status": "ERROR", "message": f"TTS Backend connection failed: {e}"}
         )
 
+@app.get("/phrases/")
+async def get_phrases():
+    """Size and memory use of the phrase index."""
+    if PHRASE_INDEX is None:
+        return {"manifest": None, "entries": 0}
+    return PHRASE_INDEX.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics of the gateway (the synthesis server serves its own on --metrics_port)."""
+    return Response(content=tts_metrics.REGISTRY.render(), media_type=tts_metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
     # For development: uvicorn tts_api_server:app --reload --host 0.0.0.0 --port 8000
     # Change port if needed, e.g. 9999 to match previous discussions for Unity
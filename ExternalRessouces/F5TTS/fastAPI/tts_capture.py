@@ -0,0 +1,119 @@
+# tts_capture.py
+# Opt-in traffic capture, shared by socket_server.py (--capture) and the gateway (CAPTURE_PATH): every
+# request's text, priority, inference options and client is appended to a JSON Lines file (gzipped
+# if the name ends in .gz) with its arrival time, so load_test.py --replay can send the same traffic
+# again, at the same pace or faster. The first line describes the capture:
+#   {"capture": 1, "source": "socket_server", "voice": "ref.wav", "started": 1760000000.0, "salt": "9c0e...41"}
+#   {"t": 0.0, "text": "Hello.", "priority": "interactive", "client": "3f2a9c1b07d4e5a6"}
+#   {"t": 1.734, "text": "Why is the sky blue?", "priority": "interactive", "client": "3f2a9c1b07d4e5a6", "options": {"speed": 1.2}}
+# "t" is seconds since "started" (Unix time). Client ids are HMAC-SHA256 digests keyed with "salt",
+# drawn at random for each capture: replays keep who asked what together, the ids of two captures
+# cannot be matched and no precomputed table turns them back into addresses. Whoever holds the file
+# can still test guessed addresses against it (there are few IPv4 addresses), and the texts are kept
+# as sent, so capture only where that is acceptable and share captures accordingly.
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import tts_metrics
+
+CAPTURE_VERSION = 1
+
+CAPTURED = tts_metrics.REGISTRY.counter("tts_captured_requests_total", "Requests written to the traffic capture.")
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def worker_path(path: str, index: int) -> str:
+    """File of pool worker `index`: traffic.jsonl -> traffic.w0.jsonl (replay merges them)."""
+    stem, ext = os.path.splitext(path[:-3] if path.endswith(".gz") else path)
+    return f"{stem}.w{index}{ext}" + (".gz" if path.endswith(".gz") else "")
+
+
+def hash_client(client_id: Optional[str], salt: str) -> Optional[str]:
+    """Keyed digest of a client id: the same within one capture (one `salt`, hex), unrelated across captures."""
+    if client_id is None:
+        return None
+    return hmac.new(bytes.fromhex(salt), str(client_id).encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+
+class TrafficCapture:
+    """Appends one line per request; record() may be called from any thread."""
+
+    def __init__(self, path: str, source: str, voice: Optional[str] = None):
+        self.path = path
+        self.started = time.time()
+        self.origin = time.monotonic()
+        self.salt = secrets.token_hex(16)  # Key of the client ids, new for every capture
+        self.lock = threading.Lock()
+        self.file = _open(path, "w")
+        self._write({"capture": CAPTURE_VERSION, "source": source, "voice": voice, "started": self.started, "salt": self.salt})
+
+    def _write(self, entry: Dict):
+        self.file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.file.flush()  # A crash keeps everything recorded so far
+
+    def record(self, text: str, priority: str, options: Optional[Dict] = None, client_id: Optional[str] = None):
+        entry = {"t": 0.0, "text": text, "priority": priority}
+        if client_id is not None:
+            entry["client"] = hash_client(client_id, self.salt)
+        if options:
+            entry["options"] = options
+        with self.lock:
+            if self.file is None:
+                return
+            entry["t"] = round(time.monotonic() - self.origin, 3)  # Under the lock: the file is in arrival order
+            self._write(entry)
+        CAPTURED.inc()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def read_capture(path: str) -> Tuple[Dict, Iterator[Dict]]:
+    """The header of a capture file and an iterator over its requests (a cut last line is skipped)."""
+    f = _open(path, "r")
+    header = json.loads(f.readline())
+    if header.get("capture") != CAPTURE_VERSION:
+        f.close()
+        raise ValueError(f"{path} is not a version {CAPTURE_VERSION} traffic capture")
+
+    def requests():
+        with f:
+            try:
+                for line in f:
+                    yield json.loads(line)
+            except (ValueError, EOFError):
+                return  # Written up to a crash (or a kill, which leaves a .gz without its end marker)
+
+    return header, requests()
+
+
+def load_traffic(paths: List[str]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Headers and requests of one or more captures (e.g. the files of all pool workers), merged in
+    arrival order; each request's "t" becomes seconds since the first request of all of them.
+    """
+    headers, merged = [], []
+    for path in paths:
+        header, requests = read_capture(path)
+        headers.append(header)
+        merged.extend(dict(request, t=header["started"] + request["t"]) for request in requests)
+    merged.sort(key=lambda request: request["t"])
+    first = merged[0]["t"] if merged else 0.0
+    for request in merged:
+        request["t"] = round(request["t"] - first, 3)
+    return headers, merged
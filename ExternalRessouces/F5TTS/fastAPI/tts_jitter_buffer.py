@@ -0,0 +1,126 @@
+# tts_jitter_buffer.py
+# Playout buffer between the network and the audio device for the streaming clients (socket_client.py).
+# The server sends a text batch's audio in a burst, then nothing while it generates the next batch;
+# played as it arrives, every late batch is an audible gap. The buffer holds back playback until it
+# has a target depth of audio, and adapts that target: it grows after each underrun and relaxes
+# after a stretch of clean playback, so a steady network gets low latency and a jittery one no gaps.
+import collections
+import threading
+import time
+from typing import Callable, Dict
+
+import numpy as np
+
+UNDERRUN_GROWTH = 1.5  # Target depth multiplier after an underrun
+RELAX_FACTOR = 0.8  # Target depth multiplier after relax_seconds without underrun
+
+
+class JitterBuffer:
+    """
+    Float32 samples written by the receiver and read by the audio callback (another thread).
+    Playback starts, and restarts after an underrun, once `target_seconds` of audio are buffered
+    or the stream has ended. The target stays within [min_target_seconds, max_target_seconds]
+    and is kept across streams (reset()), so a client learns its network over several replies.
+    """
+
+    def __init__(self, sample_rate: int, target_seconds: float = 0.2, min_target_seconds: float = 0.05,
+                 max_target_seconds: float = 2.0, relax_seconds: float = 10.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.sample_rate = sample_rate
+        self.target_seconds = target_seconds
+        self.min_target_seconds = min_target_seconds
+        self.max_target_seconds = max_target_seconds
+        self.relax_seconds = relax_seconds
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.underruns = 0  # Over the buffer's lifetime, like the target
+        self.reset()
+
+    def reset(self):
+        """Prepares for a new stream; the learned target depth and the underrun count are kept."""
+        with self.lock:
+            self.blocks = collections.deque()
+            self.offset = 0  # Samples of blocks[0] already played
+            self.depth = 0  # Samples buffered
+            self.buffering = True
+            self.ended = False
+            self.started_at = None  # Clock time playback first started
+            self.created_at = self.clock()
+            self.last_adjustment = self.created_at
+            self.played = 0
+            self.stream_underruns = 0
+            self.min_depth = None  # Lowest depth seen while playing, in samples
+            self.max_depth = 0
+
+    @property
+    def depth_seconds(self) -> float:
+        return self.depth / self.sample_rate
+
+    @property
+    def finished(self) -> bool:
+        """The stream has ended and every sample has been played."""
+        return self.ended and self.depth == 0
+
+    def write(self, samples: np.ndarray):
+        """Adds received samples (copied, the caller may reuse its buffer)."""
+        if samples.size == 0:
+            return
+        with self.lock:
+            self.blocks.append(samples.copy())
+            self.depth += samples.size
+            self.max_depth = max(self.max_depth, self.depth)
+
+    def end(self):
+        """No more samples will come: what is buffered is played out without waiting for the target."""
+        with self.lock:
+            self.ended = True
+
+    def _set_target(self, seconds: float):
+        self.target_seconds = min(self.max_target_seconds, max(self.min_target_seconds, seconds))
+        self.last_adjustment = self.clock()
+
+    def read(self, frames: int) -> np.ndarray:
+        """`frames` samples for the audio device, silence where none are ready (pre-roll, underrun, end)."""
+        out = np.zeros(frames, dtype=np.float32)
+        with self.lock:
+            if self.buffering:
+                if self.depth < self.target_seconds * self.sample_rate and not self.ended:
+                    return out
+                self.buffering = False
+                if self.started_at is None:
+                    self.started_at = self.clock()
+            self.min_depth = self.depth if self.min_depth is None else min(self.min_depth, self.depth)
+            filled = 0
+            while filled < frames and self.blocks:
+                block = self.blocks[0]
+                take = min(frames - filled, block.size - self.offset)
+                out[filled : filled + take] = block[self.offset : self.offset + take]
+                filled += take
+                self.offset += take
+                if self.offset == block.size:
+                    self.blocks.popleft()
+                    self.offset = 0
+            self.depth -= filled
+            self.played += filled
+            if filled < frames and not self.ended:
+                # Ran dry mid-stream: rebuffer to a deeper target
+                self.underruns += 1
+                self.stream_underruns += 1
+                self.buffering = True
+                self._set_target(self.target_seconds * UNDERRUN_GROWTH)
+            elif self.clock() - self.last_adjustment >= self.relax_seconds:
+                self._set_target(self.target_seconds * RELAX_FACTOR)
+        return out
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            return {
+                "underruns": self.stream_underruns,
+                "total_underruns": self.underruns,
+                "depth_seconds": self.depth / self.sample_rate,
+                "min_depth_seconds": (self.min_depth or 0) / self.sample_rate,
+                "max_depth_seconds": self.max_depth / self.sample_rate,
+                "target_seconds": self.target_seconds,
+                "played_seconds": self.played / self.sample_rate,
+                "time_to_first_audio": (self.started_at - self.created_at) if self.started_at is not None else None,
+            }
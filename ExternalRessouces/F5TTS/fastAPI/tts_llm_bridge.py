@@ -0,0 +1,363 @@
+# tts_llm_bridge.py
+# Streams an Ollama chat reply straight into speech. AgentAPI.cs waits for the whole reply before
+# asking for audio, so the user hears nothing for LLM time + TTS time. The bridge reads Ollama's
+# token stream, cuts each sentence as soon as it is complete, has the synthesis server speak it on
+# one connection while the LLM goes on writing, and returns all of it as one continuous PCM stream:
+# speech starts once the first sentence is written.
+# Run: uvicorn tts_llm_bridge:app --host 0.0.0.0 --port 8001  (mock_llm_server.py stands in for Ollama)
+import fastapi
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, Response
+import uvicorn
+import collections
+import json
+import queue
+import re
+import socket
+import threading
+import time
+import urllib.request
+import uuid
+import numpy as np
+from typing import Dict, Iterator, List, Optional
+
+import audio_encoding
+import audio_utils
+import tts_metrics
+import tts_receive
+import tts_socket_client
+
+# Configuration
+OLLAMA_CHAT_URL = "http://localhost:11434/api/chat"
+OLLAMA_MODEL = "gemma3:4b"      # Used when the request does not name one
+OLLAMA_TIMEOUT = 60.0           # Seconds without a token before the reply is abandoned
+F5TTS_BACKEND_IP = "127.0.0.1"
+F5TTS_BACKEND_PORT = 9998
+F5TTS_BACKEND_UNIX_SOCKET = None  # e.g. "/tmp/f5tts.sock" if the engine runs on this host with --unix_socket
+BRIDGE_SAMPLE_RATE = 24000
+BRIDGE_OVERLAP_MS = 150         # Crossfade between sentences, as the gateway mixes them
+BRIDGE_MIN_PAUSE_MS = 200       # Pause left between sentences once their edge silence is trimmed (None = keep it all)
+STREAM_FORMATS = ("pcm_s16le", "pcm_f32le")  # Headerless, so they can be written before the length is known
+MAX_SENTENCE_CHARS = 300        # A run-on sentence is cut at a comma or space past this
+TRANSCRIPTS_KEPT = 100
+
+# request id -> text of the reply, for the client to show or keep as history once the audio is done
+TRANSCRIPTS: "collections.OrderedDict[str, Dict]" = collections.OrderedDict()
+
+FIRST_SENTENCE_SECONDS = tts_metrics.REGISTRY.histogram(
+    "tts_bridge_first_sentence_seconds", "Time from the chat request to the first complete sentence of the LLM.")
+TIME_TO_FIRST_AUDIO = tts_metrics.REGISTRY.histogram(
+    "tts_bridge_time_to_first_audio_seconds", "Time from the chat request to the first audio bytes returned.")
+SENTENCES = tts_metrics.REGISTRY.counter("tts_bridge_sentences_total", "Sentences sent to the synthesis server.")
+BRIDGE_ERRORS = tts_metrics.REGISTRY.counter(
+    "tts_bridge_errors_total", "Failed chat streams by kind (llm, backend).", ("kind",))
+
+SENTENCE_END = re.compile(r"(?<=[.?!])\s+|\n+")  # split_text_into_sentences' rule, plus line breaks
+MARKDOWN = re.compile(r"[*_#`]+")  # Emphasis and headings the voice should not read out
+
+
+class LLMStreamError(Exception):
+    """The LLM request failed or its stream broke off."""
+    pass
+
+
+class SentenceCutter:
+    """
+    Cuts streamed text into sentences as soon as they are complete: a '.', '?' or '!' followed by
+    whitespace (the rule of tts_socket_client.split_text_into_sentences), or a line break.
+    """
+
+    def __init__(self, max_chars: int = MAX_SENTENCE_CHARS):
+        self.max_chars = max_chars
+        self.pending = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Adds streamed text, returns the sentences it completed."""
+        self.pending += text
+        sentences = []
+        while True:
+            match = SENTENCE_END.search(self.pending)
+            if match is None:
+                break
+            sentences.append(self.pending[: match.start()])
+            self.pending = self.pending[match.end() :]
+        while len(self.pending) > self.max_chars:
+            cut = max(self.pending.rfind(", ", 0, self.max_chars), self.pending.rfind(" ", 0, self.max_chars))
+            if cut <= 0:
+                cut = self.max_chars
+            sentences.append(self.pending[: cut + 1])
+            self.pending = self.pending[cut + 1 :]
+        return [cleaned for cleaned in map(clean_sentence, sentences) if cleaned]
+
+    def flush(self) -> List[str]:
+        """The text left once the stream ended."""
+        rest, self.pending = clean_sentence(self.pending), ""
+        return [rest] if rest else []
+
+
+def clean_sentence(sentence: str) -> str:
+    return " ".join(MARKDOWN.sub("", sentence).split())
+
+
+class CrossfadeStream:
+    """
+    Joins sentences while they stream, the way audio_utils.mix_audio_chunks_with_crossfade joins
+    whole ones: the last `overlap` samples sent so far are held back and crossfaded with the head
+    of the next sentence. A sentence (or a start) too short to overlap is appended as it is.
+    """
+
+    def __init__(self, overlap: int):
+        self.overlap = overlap
+        self.fade_out = np.linspace(1.0, 0.0, overlap, dtype=np.float32)
+        self.fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+        self.held = np.empty(0, dtype=np.float32)  # Last samples of the stream, not sent yet
+        self.head = np.empty(0, dtype=np.float32)  # Start of the sentence, until it covers the overlap
+        self.total = 0  # Samples in the stream so far
+        self.mix_next = False  # The sentence in progress starts with a crossfade
+
+    def _hold_back(self, data: np.ndarray) -> np.ndarray:
+        cut = max(0, data.size - self.overlap)
+        self.held = data[cut:]
+        return data[:cut]
+
+    def push(self, samples: np.ndarray) -> np.ndarray:
+        """Samples of the sentence in progress in, samples ready to send out (copies, `samples` can be reused)."""
+        if self.overlap <= 0:
+            return samples.copy()
+        self.total += samples.size
+        if not self.mix_next:
+            return self._hold_back(np.concatenate((self.held, samples)))
+        self.head = np.concatenate((self.head, samples))
+        if self.head.size <= self.overlap:
+            return self.head[:0]
+        mixed = self.held * self.fade_out + self.head[: self.overlap] * self.fade_in
+        data = np.concatenate((mixed, self.head[self.overlap :]))
+        self.total -= self.overlap
+        self.head, self.mix_next = self.head[:0], False
+        return self._hold_back(data)
+
+    def end_sentence(self) -> np.ndarray:
+        """Marks the end of a sentence. Returns samples that will not be mixed anymore."""
+        out = self.held[:0]
+        if self.mix_next and self.head.size:
+            # Too short to overlap: appended, its end can still be mixed with the next sentence
+            out = self._hold_back(np.concatenate((self.held, self.head)))
+            self.head = self.head[:0]
+        self.mix_next = self.overlap > 0 and self.total > self.overlap
+        return out
+
+    def finish(self) -> np.ndarray:
+        """The samples still held once the last sentence has ended."""
+        out = np.concatenate((self.held, self.head))
+        self.held, self.head, self.total, self.mix_next = self.held[:0], self.head[:0], 0, False
+        return out
+
+
+def stream_llm_text(payload: Dict, stop_event: threading.Event, url: Optional[str] = None) -> Iterator[str]:
+    """
+    Posts a chat request to Ollama with streaming on and yields the text of each chunk of the
+    reply (NDJSON lines; /api/generate's "response" field is read too). Raises urllib.error.URLError
+    or ValueError (an "error" line) on failure.
+    """
+    body = json.dumps(dict(payload, stream=True)).encode("utf-8")
+    request = urllib.request.Request(url or OLLAMA_CHAT_URL, data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=OLLAMA_TIMEOUT) as response:
+        for line in response:
+            if stop_event.is_set():
+                return
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            if "error" in chunk:
+                raise ValueError(f"LLM error: {chunk['error']}")
+            text = (chunk.get("message") or {}).get("content") or chunk.get("response") or ""
+            if text:
+                yield text
+            if chunk.get("done"):
+                return
+
+
+def read_sentences(payload: Dict, sentences: "queue.Queue", stop_event: threading.Event, transcript: Dict):
+    """LLM thread: puts each complete sentence on `sentences`, then None (or the exception that ended it)."""
+    cutter = SentenceCutter()
+    try:
+        for text in stream_llm_text(payload, stop_event):
+            transcript["text"] += text
+            for sentence in cutter.feed(text):
+                sentences.put(sentence)
+        for sentence in cutter.flush():
+            sentences.put(sentence)
+        sentences.put(None)
+    except Exception as e:
+        sentences.put(LLMStreamError(str(e)))
+    finally:
+        transcript["done"] = True
+
+
+def speak_sentences(first: str, sentences: "queue.Queue", tts_socket: socket.socket, audio: "queue.Queue",
+                    stop_event: threading.Event, audio_format: str, priority: str, request_id: str,
+                    options: Dict[str, float]):
+    """
+    Synthesis thread: has the backend speak each sentence on `tts_socket` as it comes, and puts
+    the encoded audio on `audio` as it streams back, then None (or the exception that ended it).
+    """
+    mixer = CrossfadeStream(int(BRIDGE_SAMPLE_RATE * BRIDGE_OVERLAP_MS / 1000))
+    trim = BRIDGE_MIN_PAUSE_MS is not None
+    padding_ms = audio_utils.sentence_padding_ms(BRIDGE_OVERLAP_MS, BRIDGE_MIN_PAUSE_MS) if trim else 0
+    leading_ms = audio_utils.START_SILENCE_MS  # Before the first sentence, then padding_ms
+
+    def put(samples):
+        if samples.size:
+            audio.put(audio_encoding.encode(samples, BRIDGE_SAMPLE_RATE, audio_format).tobytes())
+
+    try:
+        sentence = first
+        while sentence is not None and not stop_event.is_set():
+            if isinstance(sentence, Exception):
+                raise sentence
+            SENTENCES.inc()
+            tts_socket.sendall(tts_socket_client.build_request_message(
+                sentence, priority, request_id=request_id, options=options))
+            trimmer = audio_utils.SilenceTrimmer(BRIDGE_SAMPLE_RATE, leading_ms, padding_ms) if trim else None
+            status = tts_receive.receive_stream(
+                tts_socket, lambda block: put(mixer.push(trimmer.push(block) if trim else block)), stop_event)
+            if status != tts_receive.STATUS_END:
+                if status != tts_receive.STATUS_STOPPED:
+                    raise tts_socket_client.TTSSocketError(f"Backend stream ended early ({status})")
+                break
+            if trim:
+                put(mixer.push(trimmer.finish()))
+                leading_ms = padding_ms
+            put(mixer.end_sentence())
+            sentence = sentences.get()
+        put(mixer.finish())
+        audio.put(None)
+    except Exception as e:
+        audio.put(e)
+    finally:
+        tts_socket.close()
+
+
+app = fastapi.FastAPI()
+
+
+@app.middleware("http")
+async def add_request_id(request: fastapi.Request, call_next):
+    """Tags each request with an id (X-Request-ID), forwarded to the backend and used for /transcript/."""
+    request.state.request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request.state.request_id
+    return response
+
+
+@app.post("/chat/")
+async def chat(
+    request: fastapi.Request,
+    audio_format: str = fastapi.Query("pcm_s16le", alias="format", description="pcm_s16le or pcm_f32le."),
+    priority: str = fastapi.Query("interactive", description="Backend priority: interactive, prefetch or batch."),
+):
+    """
+    Takes an Ollama /api/chat body ({"model", "messages", ...}, optional "tts_options" with the
+    /speak/ inference options) and streams the spoken reply as raw PCM at X-Sample-Rate. The text
+    of the reply is at GET /transcript/{X-Request-ID}. The stream starts with the first sentence:
+    502 if the LLM fails before it, 503 if the synthesis server is unreachable.
+    """
+    request_id = request.state.request_id
+    if audio_format not in STREAM_FORMATS:
+        return Response(content=f"Error: Streamed format must be one of {list(STREAM_FORMATS)}.".encode(),
+                        status_code=400, media_type="text/plain")
+    if priority not in tts_socket_client.PRIORITIES:
+        return Response(content=f"Error: Unknown priority '{priority}'.".encode(), status_code=400, media_type="text/plain")
+    try:
+        payload = await request.json()
+    except ValueError as e:
+        return Response(content=f"Error: Invalid JSON body: {e}".encode(), status_code=400, media_type="text/plain")
+    if not isinstance(payload, dict) or not payload.get("messages"):
+        return Response(content=b"Error: No messages provided.", status_code=400, media_type="text/plain")
+    tts_options = payload.pop("tts_options", None) or {}
+    if not isinstance(tts_options, dict):
+        return Response(content=b"Error: tts_options must be an object.", status_code=400, media_type="text/plain")
+    try:
+        options = tts_socket_client.check_synthesis_options(tts_options)
+    except ValueError as e:
+        return Response(content=f"Error: {e}".encode(), status_code=400, media_type="text/plain")
+    payload.setdefault("model", OLLAMA_MODEL)
+
+    request_start = time.perf_counter()
+    try:
+        tts_socket = await run_in_threadpool(
+            tts_socket_client.connect_to_tts_server, F5TTS_BACKEND_IP, F5TTS_BACKEND_PORT, F5TTS_BACKEND_UNIX_SOCKET)
+    except tts_socket_client.TTSSocketError as e:
+        BRIDGE_ERRORS.inc(kind="backend")
+        return Response(content=f"Error: TTS service unavailable: {e}".encode(), status_code=503, media_type="text/plain")
+
+    transcript = {"text": "", "done": False}
+    TRANSCRIPTS[request_id] = transcript
+    while len(TRANSCRIPTS) > TRANSCRIPTS_KEPT:
+        TRANSCRIPTS.popitem(last=False)
+
+    stop_event = threading.Event()
+    sentences: "queue.Queue" = queue.Queue()
+    threading.Thread(target=read_sentences, args=(payload, sentences, stop_event, transcript),
+                     name=f"llm-{request_id}", daemon=True).start()
+    first = await run_in_threadpool(sentences.get)
+    if not isinstance(first, str):
+        stop_event.set()
+        tts_socket.close()
+        if first is None:
+            return Response(content=b"Error: The LLM returned an empty reply.", status_code=502, media_type="text/plain")
+        BRIDGE_ERRORS.inc(kind="llm")
+        return Response(content=f"Error: LLM request failed: {first}".encode(), status_code=502, media_type="text/plain")
+    FIRST_SENTENCE_SECONDS.observe(time.perf_counter() - request_start)
+
+    audio: "queue.Queue" = queue.Queue()
+    threading.Thread(target=speak_sentences,
+                     args=(first, sentences, tts_socket, audio, stop_event, audio_format, priority, request_id, options),
+                     name=f"speak-{request_id}", daemon=True).start()
+
+    async def body():
+        """Ends when the client goes away: the threads stop and the backend cancels the sentence."""
+        first_audio = True
+        try:
+            while True:
+                item = await run_in_threadpool(audio.get)
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    # Headers are sent already: the stream just ends, the cause is logged and counted
+                    BRIDGE_ERRORS.inc(kind="llm" if isinstance(item, LLMStreamError) else "backend")
+                    print(f"LLM_BRIDGE: Stream [{request_id}] ended early: {item}")
+                    return
+                if await request.is_disconnected():
+                    return  # The server may not notice otherwise: writes to a closed stream are dropped
+                if first_audio:
+                    TIME_TO_FIRST_AUDIO.observe(time.perf_counter() - request_start)
+                    first_audio = False
+                yield item
+        finally:
+            stop_event.set()
+            try:
+                tts_socket.shutdown(socket.SHUT_RDWR)  # Wakes the synthesis thread, the backend cancels
+            except OSError:
+                pass
+
+    return StreamingResponse(body(), media_type=audio_encoding.FORMATS[audio_format].media_type,
+                             headers=audio_encoding.response_headers(audio_format, BRIDGE_SAMPLE_RATE))
+
+
+@app.get("/transcript/{request_id}")
+async def get_transcript(request_id: str):
+    """Text of a recent reply (so far, "done" once the LLM has finished)."""
+    transcript = TRANSCRIPTS.get(request_id)
+    if transcript is None:
+        return fastapi.responses.JSONResponse(status_code=404, content={"message": f"No reply with id {request_id}"})
+    return transcript
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=tts_metrics.REGISTRY.render(), media_type=tts_metrics.CONTENT_TYPE)
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=8001)
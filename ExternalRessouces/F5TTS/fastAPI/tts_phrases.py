@@ -0,0 +1,150 @@
+# tts_phrases.py
+# Preloaded phrase index shared by socket_server.py and the gateway: the fixed phrases listed in a
+# manifest (greetings, "I don't know", quiz feedback...) are synthesized once and kept in memory as
+# float32 audio, keyed by their normalized text. A request for one of them is answered without the model.
+#
+# Manifest: a text file with one phrase per line ('#' starts a comment), a JSON list of strings or of
+# {"text": ...} objects (the batch_render.py format works), or a CSV with a "text" column.
+# The manifest is re-read when it changes; only new phrases are synthesized, removed ones are dropped.
+import csv
+import json
+import logging
+import os
+import threading
+import unicodedata
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import tts_metrics
+
+logger = logging.getLogger(__name__)
+
+PHRASE_ENTRIES = tts_metrics.REGISTRY.gauge("tts_phrase_index_entries", "Phrases synthesized and held in memory.")
+PHRASE_BYTES = tts_metrics.REGISTRY.gauge("tts_phrase_index_bytes", "Memory held by the audio of the phrase index.")
+PHRASE_HITS = tts_metrics.REGISTRY.counter("tts_phrase_index_hits_total", "Requests answered from the phrase index.")
+
+_TYPOGRAPHY = str.maketrans({"‘": "'", "’": "'", "“": '"', "”": '"', "–": "-", "—": "-"})
+
+
+def normalize_text(text: str) -> str:
+    """Index key: Unicode form, case, typographic quotes, runs of whitespace and a final period are ignored."""
+    text = unicodedata.normalize("NFKC", text).translate(_TYPOGRAPHY).casefold()
+    return " ".join(text.split()).rstrip(".").rstrip()
+
+
+def load_phrase_manifest(path: str) -> List[str]:
+    """Returns the phrases of a .txt, .json or .csv manifest, as written."""
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        phrases = [item if isinstance(item, str) else item.get("text", "") for item in items]
+    elif path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            phrases = [row.get("text", "") for row in csv.DictReader(f)]
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            phrases = [line.split("#", 1)[0] for line in f]
+    return [phrase.strip() for phrase in phrases if phrase and phrase.strip()]
+
+
+class PhraseIndex:
+    """
+    Normalized text -> float32 audio of the manifest's phrases.
+
+    `synthesize(text)` produces the audio of one phrase (None or an exception = failed, retried on
+    the next check). start() loads the index in a daemon thread, then checks the manifest every
+    `poll_interval` seconds. Lookups never wait for synthesis: a phrase is served once it is ready.
+    """
+
+    def __init__(self, manifest_path: str, synthesize: Callable[[str], Optional[np.ndarray]], poll_interval=5.0):
+        self.manifest_path = manifest_path
+        self.synthesize = synthesize
+        self.poll_interval = poll_interval
+        self.phrases: Dict[str, str] = {}  # normalized -> text as written in the manifest
+        self.entries: Dict[str, np.ndarray] = {}  # Replaced, never mutated, so lookups need no lock
+        self.manifest_version = None
+        self.reload_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        PHRASE_ENTRIES.set_function(lambda: len(self.entries))
+        PHRASE_BYTES.set_function(self.memory_bytes)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        audio = self.entries.get(normalize_text(text))
+        if audio is not None:
+            PHRASE_HITS.inc()
+        return audio
+
+    def __contains__(self, text: str) -> bool:
+        """Whether `text` would be answered from the index, without counting a hit."""
+        return normalize_text(text) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def memory_bytes(self) -> int:
+        return sum(audio.nbytes for audio in self.entries.values())
+
+    def _read_manifest_if_changed(self) -> bool:
+        stat = os.stat(self.manifest_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version == self.manifest_version:
+            return False
+        phrases = {}
+        for text in load_phrase_manifest(self.manifest_path):
+            phrases.setdefault(normalize_text(text), text)
+        self.phrases = phrases
+        self.entries = {key: audio for key, audio in self.entries.items() if key in phrases}
+        self.manifest_version = version
+        logger.info(f"Phrase manifest {self.manifest_path}: {len(phrases)} phrases")
+        return True
+
+    def reload(self) -> int:
+        """Re-reads the manifest if it changed and synthesizes the phrases still missing. Returns how many failed."""
+        with self.reload_lock:
+            try:
+                self._read_manifest_if_changed()
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not read the phrase manifest {self.manifest_path}: {e}")
+                return 0
+            failed = 0
+            for key, text in list(self.phrases.items()):
+                if key in self.entries:
+                    continue
+                if self.stop_event.is_set():
+                    break
+                try:
+                    audio = self.synthesize(text)
+                except Exception as e:
+                    logger.debug(f"Phrase '{text}' failed: {e}")
+                    audio = None
+                if audio is None or audio.size == 0:
+                    failed += 1
+                    continue
+                entries = dict(self.entries)
+                entries[key] = np.ascontiguousarray(audio, dtype=np.float32)
+                self.entries = entries
+            if failed:
+                logger.warning(f"{failed} phrase(s) could not be synthesized, retrying in {self.poll_interval}s")
+            return failed
+
+    def _watch(self):
+        while not self.stop_event.is_set():
+            self.reload()
+            self.stop_event.wait(self.poll_interval)
+
+    def start(self):
+        threading.Thread(target=self._watch, name="phrase-index", daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self) -> dict:
+        entries = self.entries
+        return {
+            "manifest": self.manifest_path,
+            "phrases": len(self.phrases),
+            "entries": len(entries),
+            "missing": len([key for key in self.phrases if key not in entries]),
+            "bytes": sum(audio.nbytes for audio in entries.values()),
+        }
@@ -0,0 +1,148 @@
+# tts_receive.py
+# Receive side of the synthesis socket (raw float32 samples, then END) shared by the Python clients:
+# tts_socket_client.py, api_client_buffered.py and socket_client.py.
+# Data is read with recv_into straight into NumPy buffers and handed out as float32 views, so the
+# samples are not copied between the kernel and the caller.
+#
+# END detection: the server only sends whole samples, so the audio of a response is a multiple of
+# 4 bytes and END is the only thing that can leave 3 bytes past a sample boundary. Looking for END
+# anywhere in the data (what the clients used to do) cuts the audio short whenever a sample happens
+# to contain those bytes. One case stays ambiguous in this format: a sample whose first 3 bytes
+# spell END, cut by the network, with its last byte not arrived yet when the others are read. It is
+# rare enough to ignore (3 bytes to match, at a sample boundary, while a byte is late); the
+# shared-memory transport frames its records and has no such case.
+import os
+import socket
+import sys
+import threading
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # tts_protocol.py
+from tts_protocol import END_MESSAGE as END_MARKER  # noqa: E402
+
+FLOAT_SIZE = np.dtype(np.float32).itemsize
+RECEIVE_SIZE = 64 * 1024  # Bytes asked for by each recv_into
+STREAM_BUFFER_SIZE = 256 * 1024  # Buffer of receive_stream, the largest block it hands out
+MIN_CAPACITY = 128 * 1024
+GROWTH = 1.25  # Growing is a realloc, mostly in place: small steps keep the peak close to the audio size
+
+# Why receive_audio / receive_stream returned
+STATUS_END = "end"  # END received, the connection can take the next request
+STATUS_CLOSED = "closed"  # The server closed the connection
+STATUS_TIMEOUT = "timeout"  # No data for the socket's timeout
+STATUS_STOPPED = "stopped"  # stop_event was set
+
+_END = np.frombuffer(END_MARKER, dtype=np.uint8)
+
+
+def may_end_with_marker(data: np.ndarray, size: int) -> bool:
+    """
+    True if the `size` bytes received so far in `data` are whole samples followed by END, or a
+    sample cut right after bytes that spell END (tell them apart by whether more data follows).
+    """
+    return size % FLOAT_SIZE == len(END_MARKER) and np.array_equal(data[size - len(END_MARKER) : size], _END)
+
+
+def _ends_with_marker(data: np.ndarray, size: int, sock: socket.socket) -> bool:
+    """True if the `size` bytes received so far in `data` are whole samples followed by END."""
+    if not may_end_with_marker(data, size):
+        return False
+    # A sample cut by the network whose first 3 bytes spell END: its last byte is on its way.
+    # After the real END the server sends nothing until the next request.
+    timeout = sock.gettimeout()
+    sock.settimeout(0)
+    try:
+        return not sock.recv(1, socket.MSG_PEEK)
+    except (BlockingIOError, InterruptedError):
+        return True
+    except OSError:
+        return True  # Reset right after END, the caller finds out on its next request
+    finally:
+        sock.settimeout(timeout)
+
+
+class ResponseBuffer:
+    """
+    Growable buffer that one response is received into. It grows in place (realloc), and the
+    samples it returns are a view of its memory, so a new buffer is needed for each response
+    that is kept.
+    """
+
+    def __init__(self, capacity: int = 0):
+        self.data = np.empty(max(capacity, MIN_CAPACITY), dtype=np.uint8)
+        self.size = 0
+
+    def _reserve(self, num_bytes: int):
+        needed = self.size + num_bytes
+        if needed > len(self.data):
+            # No view of data has been handed out yet, so it can be resized without the reference check
+            self.data.resize(max(needed, int(len(self.data) * GROWTH)), refcheck=False)
+
+    def recv(self, sock: socket.socket, max_bytes: int = RECEIVE_SIZE) -> int:
+        self._reserve(max_bytes)
+        received = sock.recv_into(self.data[self.size : self.size + max_bytes], max_bytes)
+        self.size += received
+        return received
+
+    def take_samples(self) -> np.ndarray:
+        """
+        The whole samples received (END and a cut sample excluded), as a float32 view. The buffer
+        is shrunk to them first (in place), so the caller does not keep the spare capacity alive.
+        """
+        self.data.resize(self.size - self.size % FLOAT_SIZE, refcheck=False)
+        return self.data.view(np.float32)
+
+
+def receive_audio(sock: socket.socket, size_hint: int = 0, stop_event: Optional[threading.Event] = None,
+                  on_progress: Optional[Callable[[int], None]] = None) -> Tuple[np.ndarray, str]:
+    """
+    Receives one response: returns its float32 samples (a view, no copy) and why it ended
+    (STATUS_*). `size_hint` is the expected size in bytes, e.g. the previous response's, to avoid
+    growing the buffer. `on_progress(bytes_received)` is called after each read.
+    """
+    buffer = ResponseBuffer(size_hint + RECEIVE_SIZE)
+    status = STATUS_STOPPED
+    while stop_event is None or not stop_event.is_set():
+        try:
+            received = buffer.recv(sock)
+        except socket.timeout:
+            status = STATUS_TIMEOUT
+            break
+        if not received:
+            status = STATUS_CLOSED
+            break
+        if _ends_with_marker(buffer.data, buffer.size, sock):
+            status = STATUS_END
+            break
+        if on_progress is not None:
+            on_progress(buffer.size)
+    return buffer.take_samples(), status
+
+
+def receive_stream(sock: socket.socket, on_samples: Callable[[np.ndarray], None],
+                   stop_event: Optional[threading.Event] = None, buffer_size: int = STREAM_BUFFER_SIZE) -> str:
+    """
+    Receives one response and hands its samples to `on_samples` as they arrive, through a fixed
+    buffer: each block is a float32 view that is only valid until `on_samples` returns. Returns
+    why the response ended (STATUS_*).
+    """
+    data = np.empty(buffer_size, dtype=np.uint8)
+    size = 0  # Bytes in data: a cut sample (or part of END) left over from the previous read
+    while stop_event is None or not stop_event.is_set():
+        try:
+            received = sock.recv_into(data[size:], len(data) - size)
+        except socket.timeout:
+            return STATUS_TIMEOUT
+        if not received:
+            return STATUS_CLOSED
+        size += received
+        complete = size - size % FLOAT_SIZE
+        if complete:
+            on_samples(data[:complete].view(np.float32))
+            size -= complete
+            data[:size] = data[complete : complete + size]
+        if _ends_with_marker(data, size, sock):
+            return STATUS_END
+    return STATUS_STOPPED
@@ -0,0 +1,121 @@
+# tts_shm_ring.py
+# Shared-memory ring used to pass audio between the synthesis server and a client on the same host.
+# The server writes the float32 samples once into the ring; only small records (position, length)
+# cross the socket (see tts_protocol). The client copies the samples out and publishes how far it has read.
+#
+# Layout: [write position u64][read position u64][padding up to 64 bytes][data ...]
+# Positions count bytes since the ring was created and never wrap; the data offset is position % capacity.
+# Ring names are RING_NAME_PREFIX + 16 random hex digits: the server attaches to nothing else.
+import re
+import secrets
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Optional
+
+import numpy as np
+
+HEADER_SIZE = 64
+DEFAULT_RING_SIZE = 4 * 1024 * 1024  # ~40 s of 24 kHz float32 audio
+RING_NAME_PREFIX = "tts_ring_"
+RING_NAME = re.compile(RING_NAME_PREFIX + "[0-9a-f]{16}")
+
+
+def is_ring_name(name) -> bool:
+    """True if `name` has the form of the rings ShmRing.create makes (not another program's segment)."""
+    return isinstance(name, str) and RING_NAME.fullmatch(name) is not None
+
+
+class ShmRing:
+    """Single-producer, single-consumer byte ring in a named shared memory block."""
+
+    created_here = set()  # Rings created by this process, their tracker registration belongs to the creator
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self.capacity = shm.size - HEADER_SIZE
+        self.positions = np.ndarray((2,), dtype=np.uint64, buffer=shm.buf[:16])  # write, read
+        self.data = shm.buf[HEADER_SIZE:]
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @classmethod
+    def create(cls, size=DEFAULT_RING_SIZE):
+        """Creates a new ring; the creator (the client) unlinks it on close."""
+        while True:
+            try:
+                shm = shared_memory.SharedMemory(RING_NAME_PREFIX + secrets.token_hex(8), create=True, size=HEADER_SIZE + size)
+                break
+            except FileExistsError:
+                continue  # Name already taken, draw another one
+        ring = cls(shm, owner=True)
+        ring.positions[:] = 0
+        cls.created_here.add(ring.name)
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        """Attaches to a ring created by another process."""
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+            if name in cls.created_here:
+                return cls(shm, owner=False)
+            try:
+                # Before 3.13 the resource tracker would unlink the client's block when this process exits
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, "shared_memory")
+            except Exception:
+                pass
+        return cls(shm, owner=False)
+
+    @property
+    def write_position(self):
+        return int(self.positions[0])
+
+    @property
+    def read_position(self):
+        return int(self.positions[1])
+
+    def write(self, payload, is_cancelled: Optional[Callable[[], bool]] = None, poll_interval=0.001) -> Optional[int]:
+        """
+        Producer side: copies `payload` (bytes-like) into the ring, waiting for the reader to free
+        space. Returns the position it was written at, or None if is_cancelled() became True.
+        """
+        view = memoryview(payload).cast("B")
+        length = len(view)
+        if length > self.capacity:
+            raise ValueError(f"Payload of {length} bytes does not fit in a ring of {self.capacity} bytes")
+        position = self.write_position
+        while position + length - self.read_position > self.capacity:
+            if is_cancelled is not None and is_cancelled():
+                return None
+            time.sleep(poll_interval)
+        offset = position % self.capacity
+        first = min(length, self.capacity - offset)
+        self.data[offset : offset + first] = view[:first]
+        if first < length:
+            self.data[: length - first] = view[first:]
+        self.positions[0] = position + length
+        return position
+
+    def read_into(self, position, length, out: bytearray):
+        """Consumer side: appends `length` bytes written at `position` to `out` and frees them."""
+        offset = position % self.capacity
+        first = min(length, self.capacity - offset)
+        out += self.data[offset : offset + first]
+        if first < length:
+            out += self.data[: length - first]
+        self.positions[1] = position + length
+
+    def close(self):
+        # The numpy view and memoryview must be released before the mapping can close
+        del self.positions
+        self.data.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+            ShmRing.created_here.discard(self.shm.name)
@@ -1,14 +1,27 @@
 # tts_socket_client.py
+import os
 import socket
+import sys
 import re
+import json
 import numpy as np
 import time # For potential delays or timeouts not covered by socket.timeout
-from typing import List, Optional
+import urllib.request
+from typing import Dict, List, Optional
+
+import tts_receive
+from tts_shm_ring import ShmRing
+
+# Wire format shared with the backend (tts_protocol.py, next to socket_server.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tts_protocol import (  # noqa: E402
+    CANCEL_MESSAGE, PRIORITIES, SHM_ATTACH_FAILED, SHM_ATTACH_KEY, SHM_ATTACH_OK, SHM_RECORD, SYNTHESIS_OPTIONS,
+    ProtocolError, encode_request, parse_options,
+)
 
 # Configuration for the F5TTS Backend connection
 SOCKET_TIMEOUT = 10.0  # Timeout for individual socket operations with F5TTS backend
-RECEIVE_BUFFER_SIZE = 8192
-FLOAT_SIZE = np.dtype(np.float32).itemsize
+HEALTH_TIMEOUT = 2.0  # Timeout of a /health request to the backend's side port
 
 class TTSSocketError(Exception):
     """Custom exception for TTS socket client errors."""
@@ -22,23 +35,114 @@ def split_text_into_sentences(text: str) -> List[str]:
     sentences = re.split(r'(?<=[.?!])\s+', text.strip())
     return [s for s in sentences if s.strip()] # Filter out empty strings from split
 
-def connect_to_tts_server(ip: str, port: int) -> socket.socket:
-    """Establishes a connection to the TTS backend server."""
+def connect_to_tts_server(ip: str, port: int, unix_socket: Optional[str] = None) -> socket.socket:
+    """
+    Establishes a connection to the TTS backend server.
+    With `unix_socket` (a backend started with --unix_socket on this host) ip and port are not used.
+    """
+    if unix_socket:
+        ip, port = "unix", unix_socket  # For the messages below
     print(f"SOCKET_CLIENT: Attempting to connect to TTS Backend at {ip}:{port}...")
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(SOCKET_TIMEOUT)
-        s.connect((ip, port))
+        if unix_socket:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.settimeout(SOCKET_TIMEOUT)
+            s.connect(unix_socket)
+        else:
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.settimeout(SOCKET_TIMEOUT)
+            s.connect((ip, port))
         print(f"SOCKET_CLIENT: Successfully connected to TTS Backend.")
         return s
     except socket.timeout:
         raise TTSSocketError(f"Connection to TTS Backend {ip}:{port} timed out.")
-    except ConnectionRefusedError:
+    except (ConnectionRefusedError, FileNotFoundError):
         raise TTSSocketError(f"Connection to TTS Backend {ip}:{port} refused.")
     except Exception as e:
         raise TTSSocketError(f"Failed to connect to TTS Backend {ip}:{port}: {e}")
 
-def send_text_and_receive_audio_chunk(sentence: str, tts_socket: socket.socket) -> Optional[np.ndarray]:
+def fetch_backend_health(url: str, timeout: float = HEALTH_TIMEOUT) -> Dict:
+    """
+    Reads the backend's /health (socket_server.py serves it next to /metrics), which costs no
+    connection on the synthesis port: {"state": "ready" | "busy" | "warming", "queue_depth": ...}.
+    """
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return json.loads(response.read())
+    except (OSError, ValueError) as e:  # urllib.error.URLError is an OSError
+        raise TTSSocketError(f"Health check of TTS Backend at {url} failed: {e}")
+
+def recv_exactly(tts_socket: socket.socket, size: int) -> bytes:
+    """Receives exactly `size` bytes, or fewer if the backend closed the connection."""
+    data = bytearray()
+    while len(data) < size:
+        part = tts_socket.recv(size - len(data))
+        if not part:
+            break
+        data.extend(part)
+    return bytes(data)
+
+def attach_shm_ring(tts_socket: socket.socket, size: Optional[int] = None) -> Optional[ShmRing]:
+    """
+    Asks the backend to send this connection's audio through a new shared-memory ring.
+    Returns the ring, or None if the backend cannot open it (another host); the audio then
+    keeps coming through the socket. Close the ring once the connection is closed.
+    """
+    ring = ShmRing.create(size) if size else ShmRing.create()
+    try:
+        tts_socket.sendall(json.dumps({SHM_ATTACH_KEY: ring.name}).encode("utf-8"))
+        reply = recv_exactly(tts_socket, len(SHM_ATTACH_OK))
+        if reply == SHM_ATTACH_OK:
+            print(f"SOCKET_CLIENT: Audio will be received through shared memory ring {ring.name}.")
+            return ring
+        if reply == SHM_ATTACH_FAILED[:len(reply)]:
+            recv_exactly(tts_socket, len(SHM_ATTACH_FAILED) - len(reply))
+            print("SOCKET_CLIENT: WARN - TTS Backend could not open the shared memory ring, using the socket.")
+            ring.close()
+            return None
+        raise TTSSocketError(f"Unexpected reply to the shared memory attach: {reply!r}")
+    except (OSError, TTSSocketError) as e:
+        ring.close()
+        raise TTSSocketError(f"Failed to attach shared memory ring: {e}")
+
+def receive_audio_from_ring(tts_socket: socket.socket, ring: ShmRing, audio_data_bytes: bytearray) -> None:
+    """Reads the (position, length) records of one stream and copies its audio out of the ring."""
+    while True:
+        record = recv_exactly(tts_socket, SHM_RECORD.size)
+        if len(record) < SHM_RECORD.size:
+            break # Connection closed by server
+        position, length = SHM_RECORD.unpack(record)
+        if length == 0:
+            break # End of the stream
+        ring.read_into(position, length, audio_data_bytes)
+
+def check_synthesis_options(options: Dict[str, Optional[float]]) -> Dict[str, float]:
+    """
+    The options that are set (not None), converted and checked against SYNTHESIS_OPTIONS.
+    Raises ValueError for an unknown option or a value the backend would refuse.
+    """
+    unknown = [name for name, value in options.items() if value is not None and name not in SYNTHESIS_OPTIONS]
+    if unknown:
+        raise ValueError(f"Unknown synthesis option '{unknown[0]}'")
+    try:
+        return parse_options(options)
+    except ProtocolError as e:
+        raise ValueError(str(e))
+
+def build_request_message(sentence: str, priority: str = "interactive", client_id: Optional[str] = None,
+                          request_id: Optional[str] = None, options: Optional[Dict[str, float]] = None) -> bytes:
+    """
+    Encodes a sentence for the TTS backend (tts_protocol.encode_request). Plain text is sent when
+    no option is needed, otherwise a JSON request carrying the scheduling priority, the end client's
+    id, the request id that tags the backend's traces and the inference options.
+    """
+    return encode_request(sentence, priority, client_id, request_id, options)
+
+def send_text_and_receive_audio_chunk(sentence: str, tts_socket: socket.socket,
+                                      priority: str = "interactive", client_id: Optional[str] = None,
+                                      request_id: Optional[str] = None,
+                                      shm_ring: Optional[ShmRing] = None,
+                                      options: Optional[Dict[str, float]] = None) -> Optional[np.ndarray]:
     """
     Sends a single sentence to the connected TTS backend and receives the audio chunk.
     Returns a NumPy array of float32 samples, or None on failure/no audio.
@@ -46,39 +150,22 @@ def send_text_and_receive_audio_chunk(sentence: str, tts_socket: socket.socket)
     print(f"SOCKET_CLIENT: Sending sentence to TTS Backend: \"{sentence[:50]}...\"")
     audio_data_bytes = bytearray()
     try:
-        tts_socket.sendall(sentence.encode("utf-8"))
+        tts_socket.sendall(build_request_message(sentence, priority, client_id, request_id, options))
         
         print(f"SOCKET_CLIENT: Receiving audio data for sentence...")
-        while True:
-            try:
-                data = tts_socket.recv(RECEIVE_BUFFER_SIZE)
-            except socket.timeout:
+        if shm_ring is not None:
+            receive_audio_from_ring(tts_socket, shm_ring, audio_data_bytes)
+            audio_array = np.frombuffer(audio_data_bytes, dtype=np.float32)
+        else:
+            # Straight into one NumPy buffer, the array returned is a view of it
+            audio_array, status = tts_receive.receive_audio(tts_socket)
+            if status == tts_receive.STATUS_TIMEOUT:
                 print(f"SOCKET_CLIENT: WARN - Recv timed out waiting for audio data for \"{sentence[:20]}...\". Assuming end of chunk.")
-                break # Assume end of data for this chunk if server just stops sending
-
-            if b"END" in data: # Assuming backend sends an "END" marker
-                end_idx = data.find(b"END")
-                audio_data_bytes.extend(data[:end_idx])
-                # print(f"SOCKET_CLIENT: DEBUG - Received END marker.")
-                break
-            if not data: # Connection closed by server
-                # print(f"SOCKET_CLIENT: DEBUG - Connection closed by TTS backend.")
-                break
-            audio_data_bytes.extend(data)
-        
-        if not audio_data_bytes:
+
+        if audio_array.size == 0:
             print(f"SOCKET_CLIENT: WARN - No audio data bytes received for sentence: \"{sentence[:50]}...\"")
             return None
 
-        if len(audio_data_bytes) % FLOAT_SIZE != 0:
-            original_len = len(audio_data_bytes)
-            valid_len = (len(audio_data_bytes) // FLOAT_SIZE) * FLOAT_SIZE
-            print(f"SOCKET_CLIENT: WARN - Received data length ({original_len}) not multiple of {FLOAT_SIZE}. Truncating to {valid_len}.")
-            if valid_len == 0:
-                return None
-            audio_data_bytes = audio_data_bytes[:valid_len]
-        
-        audio_array = np.frombuffer(audio_data_bytes, dtype=np.float32)
         print(f"SOCKET_CLIENT: Received {audio_array.size} audio samples for sentence.")
         return audio_array
 
@@ -92,12 +179,32 @@ def send_text_and_receive_audio_chunk(sentence: str, tts_socket: socket.socket)
         return None
 
 
-def synthesize_text_via_socket(text: str, tts_backend_ip: str, tts_backend_port: int) -> List[Optional[np.ndarray]]:
+def cancel_synthesis(tts_socket: socket.socket) -> None:
+    """
+    Asks the TTS backend to stop generating the sentence in progress (barge-in).
+    The backend stops at its next chunk boundary and sends END, so the caller
+    should keep reading until END before reusing the connection.
+    """
+    try:
+        tts_socket.sendall(CANCEL_MESSAGE)
+    except OSError as e:
+        raise TTSSocketError(f"Failed to send cancel to TTS Backend: {e}")
+
+
+def synthesize_text_via_socket(text: str, tts_backend_ip: str, tts_backend_port: int,
+                               priority: str = "interactive", client_id: Optional[str] = None,
+                               request_id: Optional[str] = None, unix_socket: Optional[str] = None,
+                               use_shm: bool = False, options: Optional[Dict[str, float]] = None) -> List[Optional[np.ndarray]]:
     """
     Connects to the TTS backend, splits text into sentences, and fetches audio for each.
     Returns a list of NumPy arrays (float32 samples), one for each sentence.
     An item in the list can be None if fetching for that sentence failed.
     Manages a single connection for all sentences in the text.
+    `priority` and `client_id` let the backend schedule this text against other clients.
+    `request_id` is attached to every sentence so the backend's traces can be matched to this call.
+    `unix_socket` and `use_shm` are for a backend on the same host: connect through its Unix domain
+    socket, and receive the samples through a shared-memory ring instead of the socket.
+    `options` are inference options (see SYNTHESIS_OPTIONS, checked with check_synthesis_options) applied to every sentence.
     """
     sentences = split_text_into_sentences(text)
     if not sentences:
@@ -106,14 +213,17 @@ def synthesize_text_via_socket(text: str, tts_backend_ip: str, tts_backend_port:
 
     all_audio_chunks: List[Optional[np.ndarray]] = []
     tts_socket: Optional[socket.socket] = None
+    shm_ring: Optional[ShmRing] = None
 
     try:
-        tts_socket = connect_to_tts_server(tts_backend_ip, tts_backend_port)
+        tts_socket = connect_to_tts_server(tts_backend_ip, tts_backend_port, unix_socket)
+        if use_shm:
+            shm_ring = attach_shm_ring(tts_socket)
         for i, sentence in enumerate(sentences):
             print(f"SOCKET_CLIENT: Processing sentence {i+1}/{len(sentences)}")
             # Optional: Add a small delay if the backend needs it between requests on the same socket
             # time.sleep(0.05) 
-            chunk = send_text_and_receive_audio_chunk(sentence, tts_socket)
+            chunk = send_text_and_receive_audio_chunk(sentence, tts_socket, priority, client_id, request_id, shm_ring, options)
             all_audio_chunks.append(chunk)
         return all_audio_chunks
     except TTSSocketError as e: # Catch connection errors
@@ -130,4 +240,6 @@ def synthesize_text_via_socket(text: str, tts_backend_ip: str, tts_backend_port:
                 tts_socket.shutdown(socket.SHUT_RDWR)
             except OSError:
                 pass # Socket might already be closed
-            tts_socket.close()
\ No newline at end of file
+            tts_socket.close()
+        if shm_ring:
+            shm_ring.close()
\ No newline at end of file
@@ -0,0 +1,440 @@
+# load_test.py
+# Drives socket_server.py (or mock_tts_server.py) or the /speak/ gateway with N concurrent
+# clients and reports time-to-first-audio, end-to-end latency percentiles and throughput.
+# Examples:
+#   python load_test.py socket --port 9998 --clients 8 --requests 200
+#   python load_test.py gateway --url http://127.0.0.1:8000/speak/ --clients 16 --duration 60
+# Soak test of socket_server.py: thousands of requests (some abandoned mid-stream), the server's
+# memory is read from /debug/memory after every segment and must stay flat once warmed up:
+#   python load_test.py soak --requests 5000 --clients 4 --metrics_url http://127.0.0.1:9101
+# Replay of captured traffic (socket_server.py --capture, or CAPTURE_PATH in the gateway) against any
+# server, mock_tts_server.py included, at the captured pace or --speed times faster; then compare runs:
+#   python load_test.py socket --replay traffic.jsonl --speed 4 --out before.json
+#   python load_test.py compare --runs before.json after.json
+import argparse
+import json
+import math
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from tts_protocol import END_MESSAGE, encode_request
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastAPI"))
+import tts_capture  # noqa: E402
+
+SAMPLE_RATE = 24000
+FLOAT_SIZE = 4
+WAV_HEADER_SIZE = 44
+
+WORDS = (
+    "the cell energy light plant water sun sugar carbon teacher student answer question "
+    "because maybe think know really process cycle reaction oxygen leaf green first then"
+).split()
+
+# Text length classes seen in classroom dialogue: short replies, sentences, long explanations
+TEXT_CLASSES = {
+    "short": (2, 6),      # "Yes, I see." / "I don't know."
+    "medium": (8, 25),    # One or two sentences
+    "long": (40, 120),    # Paragraph-long explanation
+}
+DEFAULT_MIX = "short:0.5,medium:0.4,long:0.1"
+
+
+def parse_mix(mix):
+    weights = {}
+    for item in mix.split(","):
+        name, weight = item.split(":")
+        if name not in TEXT_CLASSES:
+            raise ValueError(f"Unknown text class '{name}', expected one of {list(TEXT_CLASSES)}")
+        weights[name] = float(weight)
+    return weights
+
+
+def make_text(rng, text_class):
+    low, high = TEXT_CLASSES[text_class]
+    words = [rng.choice(WORDS) for _ in range(rng.randint(low, high))]
+    sentences, current = [], []
+    for word in words:
+        current.append(word)
+        if len(current) >= rng.randint(6, 14):
+            sentences.append(" ".join(current).capitalize() + ".")
+            current = []
+    if current:
+        sentences.append(" ".join(current).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def text_class_of(text):
+    """The TEXT_CLASSES a captured text falls in, by its number of words."""
+    words = len(text.split())
+    for name in ("short", "medium"):
+        if words <= TEXT_CLASSES[name][1]:
+            return name
+    return "long"
+
+
+def socket_request(host, port, text, priority, timeout, options=None):
+    """Returns (ttfa, latency, audio_seconds) for one request on a fresh connection."""
+    start = time.perf_counter()
+    first_audio = None
+    received = 0
+    tail = b""
+    with socket.create_connection((host, port), timeout=timeout) as s:
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        s.sendall(encode_request(text, priority, options=options))
+        while True:
+            data = s.recv(65536)
+            if not data:
+                break
+            if first_audio is None:
+                first_audio = time.perf_counter() - start
+            received += len(data)
+            tail = (tail + data)[-len(END_MESSAGE):]
+            if tail == END_MESSAGE:
+                received -= len(END_MESSAGE)
+                break
+    latency = time.perf_counter() - start
+    return first_audio or latency, latency, received / FLOAT_SIZE / SAMPLE_RATE
+
+
+def abandoned_socket_request(host, port, text, priority, timeout):
+    """Hangs up after the first audio bytes, like a client that navigated away. Returns (ttfa, latency, 0)."""
+    start = time.perf_counter()
+    with socket.create_connection((host, port), timeout=timeout) as s:
+        s.sendall(encode_request(text, priority))
+        s.recv(65536)
+        first_audio = time.perf_counter() - start
+    return first_audio, time.perf_counter() - start, 0.0
+
+
+def gateway_request(url, text, priority, timeout, options=None):
+    """Returns (ttfa, latency, audio_seconds); ttfa is the time to the first response byte."""
+    body = json.dumps(dict(options or {}, text_request=text, priority=priority)).encode("utf-8")
+    http_request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(http_request, timeout=timeout) as response:
+        first = response.read(1)
+        first_audio = time.perf_counter() - start
+        size = len(first) + len(response.read())
+    latency = time.perf_counter() - start
+    return first_audio, latency, max(0, size - WAV_HEADER_SIZE) / 2 / SAMPLE_RATE
+
+
+class LoadTest:
+    def __init__(self, send, clients, requests, duration, mix, priority, seed, timeout):
+        self.send = send
+        self.clients = clients
+        self.requests = requests
+        self.duration = duration
+        self.mix = mix
+        self.priority = priority
+        self.seed = seed
+        self.timeout = timeout
+        self.results = []  # (text_class, ttfa, latency, audio_seconds)
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.issued = 0
+
+    def _next_slot(self):
+        with self.lock:
+            if self.requests and self.issued >= self.requests:
+                return False
+            self.issued += 1
+            return True
+
+    def _client(self, index, deadline):
+        rng = random.Random(self.seed * 1000 + index)
+        classes, weights = zip(*self.mix.items())
+        while time.perf_counter() < deadline and self._next_slot():
+            text_class = rng.choices(classes, weights)[0]
+            text = make_text(rng, text_class)
+            try:
+                ttfa, latency, audio_seconds = self.send(text, self.priority, self.timeout)
+            except (OSError, urllib.error.URLError) as e:
+                with self.lock:
+                    self.errors += 1
+                print(f"LOAD_TEST: client {index} request failed: {e}")
+                continue
+            with self.lock:
+                self.results.append((text_class, ttfa, latency, audio_seconds))
+
+    def run(self):
+        start = time.perf_counter()
+        deadline = start + self.duration if self.duration else float("inf")
+        threads = [threading.Thread(target=self._client, args=(i, deadline), daemon=True) for i in range(self.clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - start
+
+
+class Replay:
+    """
+    Sends captured requests (tts_capture.load_traffic) at their captured offsets divided by `speed`,
+    each on its own thread: an open loop, like the traffic it reproduces, so a slow server gets the
+    same arrivals as a fast one. Same text, priority and options as captured; results as LoadTest's.
+    """
+
+    def __init__(self, send, traffic, speed, duration, timeout):
+        self.send = send
+        self.traffic = traffic
+        self.speed = speed
+        self.duration = duration
+        self.timeout = timeout
+        self.results = []  # (text_class, ttfa, latency, audio_seconds)
+        self.errors = 0
+        self.max_lag = 0.0  # Longest delay of a request behind its schedule
+        self.lock = threading.Lock()
+
+    def _request(self, request):
+        try:
+            ttfa, latency, audio_seconds = self.send(request["text"], request["priority"], self.timeout,
+                                                     request.get("options"))
+        except (OSError, urllib.error.URLError) as e:
+            with self.lock:
+                self.errors += 1
+            print(f"LOAD_TEST: replayed request at {request['t']:.3f}s failed: {e}")
+            return
+        with self.lock:
+            self.results.append((text_class_of(request["text"]), ttfa, latency, audio_seconds))
+
+    def run(self):
+        start = time.perf_counter()
+        threads = []
+        for request in self.traffic:
+            due = request["t"] / self.speed
+            if self.duration and due > self.duration:
+                break
+            delay = start + due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.max_lag = max(self.max_lag, -delay)
+            thread = threading.Thread(target=self._request, args=(request,), daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+def summarize(results, errors, wall):
+    """Latency percentiles (ms) and throughput of a run, overall and per text class."""
+    def stats(rows):
+        ttfa = [r[1] for r in rows]
+        latency = [r[2] for r in rows]
+        return {
+            "requests": len(rows),
+            "ttfa_ms": {f"p{q}": percentile(ttfa, q) * 1000 for q in (50, 95, 99)},
+            "latency_ms": {f"p{q}": percentile(latency, q) * 1000 for q in (50, 95, 99)},
+        }
+
+    summary = stats(results)
+    summary["errors"] = errors
+    summary["wall_seconds"] = wall
+    summary["requests_per_second"] = len(results) / wall if wall else 0.0
+    summary["audio_seconds_per_second"] = sum(r[3] for r in results) / wall if wall else 0.0
+    summary["by_class"] = {c: stats([r for r in results if r[0] == c]) for c in sorted({r[0] for r in results})}
+    summary["samples"] = [[r[0], round(r[1], 4), round(r[2], 4)] for r in results]  # For compare
+    return summary
+
+
+def ks_statistic(a, b):
+    """Two-sample Kolmogorov-Smirnov statistic: largest gap between the two empirical distributions."""
+    a, b = sorted(a), sorted(b)
+    i = j = 0
+    gap = 0.0
+    while i < len(a) and j < len(b):
+        value = min(a[i], b[j])
+        while i < len(a) and a[i] == value:
+            i += 1
+        while j < len(b) and b[j] == value:
+            j += 1
+        gap = max(gap, abs(i / len(a) - j / len(b)))
+    return gap
+
+
+def compare_runs(base, new):
+    """
+    Per text class and metric: the percentiles of two summaries (--out files), their change, and
+    whether the distributions differ (KS statistic over its 5% critical value).
+    """
+    rows = []
+    for name in ["all"] + sorted(set(base["by_class"]) & set(new["by_class"])):
+        for metric, column in (("ttfa_ms", 1), ("latency_ms", 2)):
+            a = [row[column] for row in base.get("samples", []) if name in ("all", row[0])]
+            b = [row[column] for row in new.get("samples", []) if name in ("all", row[0])]
+            s_a = base if name == "all" else base["by_class"][name]
+            s_b = new if name == "all" else new["by_class"][name]
+            row = {"class": name, "metric": metric, "requests": (s_a["requests"], s_b["requests"])}
+            for q in ("p50", "p95", "p99"):
+                row[q] = (s_a[metric][q], s_b[metric][q])
+            if a and b:
+                row["ks"] = ks_statistic(a, b)
+                row["ks_critical"] = 1.358 * math.sqrt((len(a) + len(b)) / (len(a) * len(b)))
+            rows.append(row)
+    return rows
+
+
+def print_comparison(rows):
+    for row in rows:
+        parts = []
+        for q in ("p50", "p95", "p99"):
+            before, after = row[q]
+            change = (after - before) / before * 100 if before else float("nan")
+            parts.append(f"{q} {before:8.1f} -> {after:8.1f} ({change:+6.1f}%)")
+        ks = ""
+        if "ks" in row:
+            ks = f" | KS {row['ks']:.2f} ({'differs' if row['ks'] > row['ks_critical'] else 'same'} at 5%)"
+        print(f"{row['class']:>8} {row['metric']:>10} | n={row['requests'][0]}/{row['requests'][1]} | "
+              + " | ".join(parts) + ks)
+
+
+def read_server_memory(metrics_url, trim=True):
+    """Resident bytes of the server, after a trim so only memory it still holds is counted."""
+    url = metrics_url.rstrip("/") + "/debug/memory" + ("?trim=1" if trim else "")
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return json.loads(response.read())["resident_bytes"]
+
+
+def run_soak(send, args):
+    """
+    Runs args.requests requests in segments of args.sample_every and samples the server's memory
+    after each one. Returns (summary, memory samples in MB, growth in MB, passed).
+    """
+    mix = parse_mix(args.mix)
+    results, errors, wall = [], 0, 0.0
+    samples = []  # (requests done, resident MB)
+    done = 0
+    while done < args.requests:
+        segment = min(args.sample_every, args.requests - done)
+        load_test = LoadTest(send, args.clients, segment, 0, mix, args.priority, args.seed + done, args.timeout)
+        wall += load_test.run()
+        results.extend(load_test.results)
+        errors += load_test.errors
+        done += segment
+        resident_mb = read_server_memory(args.metrics_url, trim=not args.no_trim) / 1e6
+        samples.append((done, resident_mb))
+        print(f"SOAK: {done:6d} requests | resident {resident_mb:8.1f} MB | errors {errors}")
+    settled = [mb for count, mb in samples if count > args.warmup] or [samples[-1][1]]
+    growth = max(settled) - settled[0]
+    return summarize(results, errors, wall), samples, growth, growth <= args.max_growth_mb
+
+
+def print_summary(summary):
+    def line(name, s):
+        print(f"{name:>8} | n={s['requests']:5d} | "
+              f"TTFA p50={s['ttfa_ms']['p50']:8.1f} p95={s['ttfa_ms']['p95']:8.1f} p99={s['ttfa_ms']['p99']:8.1f} ms | "
+              f"latency p50={s['latency_ms']['p50']:8.1f} p95={s['latency_ms']['p95']:8.1f} p99={s['latency_ms']['p99']:8.1f} ms")
+
+    line("all", summary)
+    for name, s in summary["by_class"].items():
+        line(name, s)
+    print(f"errors={summary['errors']} | {summary['requests_per_second']:.2f} req/s | "
+          f"{summary['audio_seconds_per_second']:.2f} s audio / s over {summary['wall_seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test for the TTS socket server and gateway.")
+    parser.add_argument("target", choices=["socket", "gateway", "soak", "compare"])
+    parser.add_argument("--host", default="127.0.0.1", help="Socket server host")
+    parser.add_argument("--port", type=int, default=9998, help="Socket server port")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/speak/", help="Gateway /speak/ URL")
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=None,
+                        help="Total requests (0 = until --duration; default 100, or the whole capture with --replay)")
+    parser.add_argument("--duration", type=float, default=0, help="Stop after this many seconds (0 = no limit)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Text length mix, e.g. {DEFAULT_MIX}")
+    parser.add_argument("--priority", default="interactive", choices=["interactive", "prefetch", "batch"])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--out", default="", help="Write the summary as JSON to this file")
+    replay = parser.add_argument_group("replay")
+    replay.add_argument("--replay", nargs="+", default=[], metavar="CAPTURE",
+                        help="Send the traffic of these capture files (socket_server.py --capture) instead of generated text")
+    replay.add_argument("--speed", type=float, default=1.0, help="Replay this many times faster than captured")
+    replay.add_argument("--runs", nargs=2, metavar=("BASE", "NEW"), help="compare: two --out files of the same traffic")
+    soak = parser.add_argument_group("soak")
+    soak.add_argument("--metrics_url", default="http://127.0.0.1:9101", help="Metrics endpoint of the server under test")
+    soak.add_argument("--sample_every", type=int, default=250, help="Requests between two memory samples")
+    soak.add_argument("--warmup", type=int, default=500, help="Requests before memory is expected to be flat")
+    soak.add_argument("--max_growth_mb", type=float, default=20.0, help="Allowed resident growth after the warm-up")
+    soak.add_argument("--abandon_fraction", type=float, default=0.1, help="Requests the client hangs up on mid-stream")
+    soak.add_argument("--no_trim", action="store_true", help="Sample memory without asking the server to trim first")
+    args = parser.parse_args()
+    if args.target == "compare":
+        if not args.runs:
+            parser.error("compare needs --runs BASE NEW")
+        runs = []
+        for path in args.runs:
+            with open(path, "r", encoding="utf-8") as f:
+                runs.append(json.load(f))
+        print_comparison(compare_runs(*runs))
+        raise SystemExit(0)
+    if args.replay:
+        if args.target == "soak":
+            parser.error("--replay works with the socket and gateway targets")
+        if args.speed <= 0:
+            parser.error("--speed must be positive")
+    elif args.requests is None:
+        args.requests = 100
+    if not args.requests and not args.duration and not args.replay:
+        parser.error("set --requests or --duration")
+    if args.target == "soak" and not args.requests:
+        parser.error("soak needs --requests")
+
+    if args.target == "soak":
+        def send(text, priority, timeout):
+            if random.random() < args.abandon_fraction:
+                return abandoned_socket_request(args.host, args.port, text, priority, timeout)
+            return socket_request(args.host, args.port, text, priority, timeout)
+
+        summary, samples, growth, passed = run_soak(send, args)
+        print_summary(summary)
+        summary["memory_mb"] = samples
+        summary["memory_growth_mb"] = growth
+        print(f"SOAK: resident growth after {args.warmup} warm-up requests: {growth:.1f} MB "
+              f"(allowed {args.max_growth_mb:.1f} MB) -> {'PASS' if passed else 'FAIL'}")
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+        raise SystemExit(0 if passed else 1)
+
+    if args.target == "socket":
+        def send(text, priority, timeout, options=None):
+            return socket_request(args.host, args.port, text, priority, timeout, options)
+    else:
+        def send(text, priority, timeout, options=None):
+            return gateway_request(args.url, text, priority, timeout, options)
+
+    if args.replay:
+        headers, traffic = tts_capture.load_traffic(args.replay)
+        traffic = traffic[: args.requests] if args.requests else traffic
+        voices = sorted({str(header.get("voice")) for header in headers})
+        print(f"LOAD_TEST: replaying {len(traffic)} requests from {', '.join(h['source'] for h in headers)} "
+              f"(voice {', '.join(voices)}), {traffic[-1]['t'] if traffic else 0:.1f}s captured, at {args.speed:g}x")
+        load_test = Replay(send, traffic, args.speed, args.duration, args.timeout)
+    else:
+        load_test = LoadTest(send, args.clients, args.requests, args.duration, parse_mix(args.mix),
+                             args.priority, args.seed, args.timeout)
+    wall = load_test.run()
+    if args.replay and load_test.max_lag > 0.05:
+        print(f"LOAD_TEST: requests were sent up to {load_test.max_lag * 1000:.0f} ms behind the captured schedule")
+    summary = summarize(load_test.results, load_test.errors, wall)
+    print_summary(summary)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
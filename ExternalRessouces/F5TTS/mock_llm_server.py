@@ -0,0 +1,116 @@
+# mock_llm_server.py
+# Stand-in for Ollama's /api/chat and /api/generate, for testing fastAPI/tts_llm_bridge.py without a model.
+# The reply is streamed word by word as NDJSON lines shaped like Ollama's, after a first-token delay
+# and at a configurable token rate, so the bridge's sentence cutting and latency can be measured.
+# Example: python mock_llm_server.py --port 11434 --first_token_ms 300 --token_ms 40
+import argparse
+import json
+import logging
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPLY = (
+    "That is a good question! Photosynthesis is how plants turn light into chemical energy. "
+    "The leaves take in carbon dioxide, and the roots bring up water. "
+    "Can you tell me which gas the plant gives back to the air?"
+)
+
+
+def reply_tokens(text):
+    """Words with their following whitespace, roughly how an LLM streams its tokens."""
+    return re.findall(r"\S+\s*", text)
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Chunked replies, like Ollama's
+    reply = DEFAULT_REPLY
+    first_token_s = 0.3
+    token_s = 0.04
+    fail = False
+
+    def do_POST(self):
+        if self.path not in ("/api/chat", "/api/generate"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_error(400, "Invalid JSON")
+            return
+        model = payload.get("model", "mock")
+        if self.fail:
+            self._send_json(500, {"error": f"model '{model}' failed to load"})
+            return
+        chat = self.path == "/api/chat"
+
+        def chunk(text, done):
+            message = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"), "done": done}
+            if chat:
+                message["message"] = {"role": "assistant", "content": text}
+            else:
+                message["response"] = text
+            return message
+
+        if not payload.get("stream", True):
+            time.sleep(self.first_token_s + self.token_s * len(reply_tokens(self.reply)))
+            self._send_json(200, chunk(self.reply, True))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            time.sleep(self.first_token_s)
+            for token in reply_tokens(self.reply):
+                self._write_chunk(json.dumps(chunk(token, False)) + "\n")
+                time.sleep(self.token_s)
+            self._write_chunk(json.dumps(chunk("", True)) + "\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info("Client went away during the reply.")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def start_server(host, port):
+    server = ThreadingHTTPServer((host, port), MockLLMHandler)
+    server.daemon_threads = True
+    logger.info(f"Mock LLM server started on {host}:{port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Ollama server streaming a fixed reply.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="Text streamed back to every request")
+    parser.add_argument("--first_token_ms", type=float, default=300, help="Delay before the first token")
+    parser.add_argument("--token_ms", type=float, default=40, help="Delay between tokens")
+    parser.add_argument("--fail", action="store_true", help="Answer every request with an error")
+    args = parser.parse_args()
+
+    MockLLMHandler.reply = args.reply
+    MockLLMHandler.first_token_s = args.first_token_ms / 1000.0
+    MockLLMHandler.token_s = args.token_ms / 1000.0
+    MockLLMHandler.fail = args.fail
+    start_server(args.host, args.port)
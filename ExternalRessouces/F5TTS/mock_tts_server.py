@@ -0,0 +1,180 @@
+# mock_tts_server.py
+# Stand-in for socket_server.py that speaks the same protocol without torch, F5 or a GPU.
+# Audio is a deterministic tone; its pacing follows a configurable real-time factor and
+# chunk cadence, so the gateway and clients can be benchmarked on a CPU-only box.
+# Like the real server it answers GET /health (and /metrics) on --metrics_port for the gateway.
+# Shared-memory attach requests get SHM_FAILED: clients keep receiving the audio on the socket.
+# Example: python mock_tts_server.py --port 9998 --rtf 0.3 --capacity 1 --cadence batch
+import argparse
+import json
+import logging
+import os
+import select
+import socket
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from tts_protocol import (
+    CANCEL_MESSAGE, END_MESSAGE, SHM_ATTACH_FAILED, ProtocolError, is_incomplete_json, parse_request, parse_shm_attach,
+)
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastAPI"))
+import tts_metrics  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MockSynthesizer:
+    """
+    Produces audio the way the real server paces it.
+
+    cadence "batch": each sentence is computed for rtf x its duration, then its chunks are sent
+    back to back (what socket_server.py does). cadence "even": chunks are spread evenly.
+    `capacity` limits how many requests generate at the same time, like a single GPU.
+    """
+
+    def __init__(self, sampling_rate=24000, rtf=0.3, chunk_samples=2048, cadence="batch",
+                 seconds_per_char=0.06, startup_ms=0.0, capacity=1):
+        self.sampling_rate = sampling_rate
+        self.rtf = rtf
+        self.chunk_samples = chunk_samples
+        self.cadence = cadence
+        self.seconds_per_char = seconds_per_char
+        self.startup_s = startup_ms / 1000.0
+        self.capacity = capacity
+        self.engine_slots = threading.Semaphore(capacity)
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def health(self, params):
+        """Same report as socket_server.py's /health: "busy" once every engine slot is taken."""
+        with self.lock:
+            in_flight = self.in_flight
+        report = {"state": "busy" if in_flight >= self.capacity else "ready", "pid": os.getpid(),
+                  "uptime_seconds": round(time.time() - self.started, 1), "in_flight": in_flight,
+                  "queue_depth": max(0, in_flight - self.capacity), "engine": "mock",
+                  "sampling_rate": self.sampling_rate, "voices": [{"ref_audio": "mock", "ref_text": ""}]}
+        return "application/json", json.dumps(report).encode("utf-8")
+
+    def sentence_audio(self, sentence):
+        num_samples = max(1, int(len(sentence) * self.seconds_per_char * self.sampling_rate))
+        frequency = 200.0 + zlib.crc32(sentence.encode("utf-8")) % 400
+        t = np.arange(num_samples, dtype=np.float32) / self.sampling_rate
+        return (0.3 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+    def stream(self, text, is_cancelled):
+        """Yields float32 chunks for `text` until done or is_cancelled() returns True."""
+        sentences = [s for s in text.replace("!", ".").replace("?", ".").split(".") if s.strip()] or [text]
+        time.sleep(self.startup_s)
+        for sentence in sentences:
+            audio = self.sentence_audio(sentence)
+            compute_time = self.rtf * len(audio) / self.sampling_rate
+            chunks = [audio[j : j + self.chunk_samples] for j in range(0, len(audio), self.chunk_samples)]
+            if self.cadence == "batch":
+                with self.engine_slots:
+                    time.sleep(compute_time)
+                for chunk in chunks:
+                    if is_cancelled():
+                        return
+                    yield chunk
+            else:
+                for chunk in chunks:
+                    with self.engine_slots:
+                        time.sleep(compute_time / len(chunks))
+                    if is_cancelled():
+                        return
+                    yield chunk
+
+
+def handle_client(conn, addr, synthesizer):
+    with conn:
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while True:
+            data = conn.recv(1024)
+            while data and is_incomplete_json(data):
+                more = conn.recv(4096)
+                if not more:
+                    break
+                data += more
+            if not data:
+                return
+            if data.strip() == CANCEL_MESSAGE:
+                continue
+            if parse_shm_attach(data) is not None:
+                conn.sendall(SHM_ATTACH_FAILED)  # No shared-memory transport: the client keeps the socket
+                continue
+            try:
+                request = parse_request(data, client_id=addr[0])
+            except ProtocolError as e:
+                logger.error(f"Invalid request from {addr}: {e}")
+                conn.sendall(END_MESSAGE)
+                continue
+
+            state = {"cancelled": False, "closed": False}
+
+            def is_cancelled():
+                readable, _, _ = select.select([conn], [], [], 0)
+                if readable:
+                    incoming = conn.recv(1024)
+                    if not incoming:
+                        state["closed"] = True
+                    state["cancelled"] = state["cancelled"] or not incoming or CANCEL_MESSAGE in incoming
+                return state["cancelled"]
+
+            with synthesizer.lock:
+                synthesizer.in_flight += 1
+            try:
+                for chunk in synthesizer.stream(request.text, is_cancelled):
+                    conn.sendall(chunk.tobytes())
+                if state["closed"]:
+                    return
+                conn.sendall(END_MESSAGE)
+            except OSError:
+                return
+            finally:
+                with synthesizer.lock:
+                    synthesizer.in_flight -= 1
+
+
+def start_server(host, port, synthesizer):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((host, port))
+        s.listen()
+        logger.info(f"Mock TTS server started on {host}:{port}")
+        while True:
+            conn, addr = s.accept()
+            threading.Thread(target=handle_client, args=(conn, addr, synthesizer), daemon=True).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock F5TTS socket server for load tests.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=9998)
+    parser.add_argument("--rtf", type=float, default=0.3, help="Compute seconds per second of audio")
+    parser.add_argument("--chunk_samples", type=int, default=2048, help="Samples per audio chunk sent")
+    parser.add_argument("--cadence", choices=["batch", "even"], default="batch",
+                        help="batch: burst of chunks per sentence; even: chunks spread over the compute time")
+    parser.add_argument("--seconds_per_char", type=float, default=0.06, help="Audio seconds per character of text")
+    parser.add_argument("--startup_ms", type=float, default=0.0, help="Fixed latency before the first sentence")
+    parser.add_argument("--capacity", type=int, default=1, help="Requests generating at the same time")
+    parser.add_argument("--metrics_port", type=int, default=9101, help="Port of /health and /metrics (0 = off)")
+    args = parser.parse_args()
+
+    synthesizer = MockSynthesizer(
+        rtf=args.rtf,
+        chunk_samples=args.chunk_samples,
+        cadence=args.cadence,
+        seconds_per_char=args.seconds_per_char,
+        startup_ms=args.startup_ms,
+        capacity=args.capacity,
+    )
+    if args.metrics_port:
+        tts_metrics.start_metrics_server(args.metrics_port, args.host, routes={"/health": synthesizer.health})
+    start_server(args.host, args.port, synthesizer)
@@ -1,58 +1,141 @@
-import socket
+import os
+import sys
 import asyncio
-import pyaudio
 import numpy as np
+import pyaudio
 import logging
 import time
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastAPI"))
+import tts_receive  # noqa: E402
+from tts_jitter_buffer import JitterBuffer  # noqa: E402
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-
-async def listen_to_F5TTS(text, server_ip="localhost", server_port=9998):
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    await asyncio.get_event_loop().run_in_executor(None, client_socket.connect, (server_ip, int(server_port)))
-
+SAMPLE_RATE = 24000
+CALLBACK_FRAMES = 1024  # Samples per PyAudio callback (~43 ms)
+END_GRACE_SECONDS = 0.02  # Quiet time after bytes spelling END before they are taken as the end marker
+MAX_BUFFERED_SECONDS = 30.0  # Reading from the socket pauses past this much unplayed audio
+REPORT_INTERVAL = 0.1  # Seconds between flow-control checks while playing
+
+
+class AudioStreamProtocol(asyncio.BufferedProtocol):
+    """
+    Receives one response straight into a fixed buffer (recv_into, as tts_receive.receive_stream
+    does) and hands its whole samples to the jitter buffer. `done` resolves with a tts_receive status.
+    """
+
+    def __init__(self, jitter_buffer, buffer_size=tts_receive.STREAM_BUFFER_SIZE):
+        self.jitter_buffer = jitter_buffer
+        self.data = np.empty(buffer_size, dtype=np.uint8)
+        self.size = 0  # Bytes in data: a cut sample (or part of END) left over from the previous read
+        self.done = asyncio.get_running_loop().create_future()
+        self.end_timer = None
+        self.transport = None
+        self.paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def get_buffer(self, sizehint):
+        return self.data[self.size :]
+
+    def buffer_updated(self, nbytes):
+        if self.end_timer is not None:
+            self.end_timer.cancel()  # More data: the END-like bytes were the start of a sample
+            self.end_timer = None
+        self.size += nbytes
+        complete = self.size - self.size % tts_receive.FLOAT_SIZE
+        if complete:
+            self.jitter_buffer.write(self.data[:complete].view(np.float32))
+            self.size -= complete
+            self.data[: self.size] = self.data[complete : complete + self.size]
+        if tts_receive.may_end_with_marker(self.data, self.size):
+            # The server is quiet after END; a sample cut after bytes spelling END is followed by its last byte
+            self.end_timer = asyncio.get_running_loop().call_later(END_GRACE_SECONDS, self._finish, tts_receive.STATUS_END)
+        if self.jitter_buffer.depth_seconds > MAX_BUFFERED_SECONDS and not self.paused:
+            self.transport.pause_reading()
+            self.paused = True
+
+    def resume_if_drained(self):
+        """Called while playing: reads again once half of the unplayed audio has been played."""
+        if self.paused and self.jitter_buffer.depth_seconds < MAX_BUFFERED_SECONDS / 2:
+            self.transport.resume_reading()
+            self.paused = False
+
+    def _finish(self, status):
+        self.jitter_buffer.end()
+        if not self.done.done():
+            self.done.set_result(status)
+
+    def eof_received(self):
+        self._finish(tts_receive.STATUS_CLOSED)
+
+    def connection_lost(self, exc):
+        self._finish(tts_receive.STATUS_CLOSED)
+
+
+async def listen_to_F5TTS(text, server_ip="localhost", server_port=9998, jitter_buffer=None):
+    """
+    Sends `text` and plays the audio while it arrives, through a jitter buffer drained by PyAudio's
+    callback. Pass the same `jitter_buffer` to successive calls to keep the target depth it has
+    learned. Returns the buffer's stats (underruns, depth, target), or None if nothing was played.
+    """
+    loop = asyncio.get_running_loop()
+    jitter_buffer = jitter_buffer or JitterBuffer(SAMPLE_RATE)
+    jitter_buffer.reset()
     start_time = time.time()
-    first_chunk_time = None
-
-    async def play_audio_stream():
-        nonlocal first_chunk_time
-        p = pyaudio.PyAudio()
-        stream = p.open(format=pyaudio.paFloat32, channels=1, rate=24000, output=True, frames_per_buffer=2048)
-
-        try:
-            while True:
-                data = await asyncio.get_event_loop().run_in_executor(None, client_socket.recv, 8192)
-                if not data:
-                    break
-                if data == b"END":
-                    logger.info("End of audio received.")
-                    break
-
-                audio_array = np.frombuffer(data, dtype=np.float32)
-                stream.write(audio_array.tobytes())
 
-                if first_chunk_time is None:
-                    first_chunk_time = time.time()
-
-        finally:
-            stream.stop_stream()
-            stream.close()
-            p.terminate()
+    try:
+        transport, protocol = await loop.create_connection(
+            lambda: AudioStreamProtocol(jitter_buffer), server_ip, int(server_port))
+    except OSError as e:
+        logger.error(f"Error in listen_to_F5TTS: {e}")
+        return None
 
-        logger.info(f"Total time taken: {time.time() - start_time:.4f} seconds")
+    def play(in_data, frame_count, time_info, status):
+        # PortAudio's thread: never blocks, silence when the buffer has nothing ready
+        samples = jitter_buffer.read(frame_count)
+        return samples.tobytes(), pyaudio.paComplete if jitter_buffer.finished else pyaudio.paContinue
 
+    p = pyaudio.PyAudio()
+    stream = None
     try:
-        data_to_send = f"{text}".encode("utf-8")
-        await asyncio.get_event_loop().run_in_executor(None, client_socket.sendall, data_to_send)
-        await play_audio_stream()
+        stream = p.open(format=pyaudio.paFloat32, channels=1, rate=SAMPLE_RATE, output=True,
+                        frames_per_buffer=CALLBACK_FRAMES, stream_callback=play)
+        transport.write(f"{text}".encode("utf-8"))
+
+        while stream.is_active():
+            await asyncio.sleep(REPORT_INTERVAL)
+            protocol.resume_if_drained()
+            logger.debug(f"Jitter buffer: {jitter_buffer.depth_seconds:.2f}s buffered, "
+                         f"target {jitter_buffer.target_seconds:.2f}s, {jitter_buffer.stream_underruns} underrun(s)")
+
+        status = await protocol.done
+        if status == tts_receive.STATUS_END:
+            logger.info("End of audio received.")
+        else:
+            logger.warning(f"Audio stream ended without END ({status}).")
 
     except Exception as e:
         logger.error(f"Error in listen_to_F5TTS: {e}")
 
     finally:
-        client_socket.close()
+        if stream is not None:
+            stream.stop_stream()
+            stream.close()
+        p.terminate()
+        transport.close()
+
+    stats = jitter_buffer.stats()
+    first_audio = stats["time_to_first_audio"]
+    logger.info(f"Played {stats['played_seconds']:.2f}s with {stats['underruns']} underrun(s); "
+                f"buffer depth {stats['min_depth_seconds']:.2f}-{stats['max_depth_seconds']:.2f}s, "
+                f"target {stats['target_seconds']:.2f}s, first audio after "
+                f"{f'{first_audio:.3f}s' if first_audio is not None else 'none'}")
+    logger.info(f"Total time taken: {time.time() - start_time:.4f} seconds")
+    return stats if stats["played_seconds"] > 0 else None
 
 
 if __name__ == "__main__":
@@ -1,32 +1,69 @@
 import argparse
+import collections
 import gc
+import ipaddress
+import json
 import logging
 import numpy as np
+import os
 import queue
+import select
 import socket
-import struct
+import sys
+import tempfile
 import threading
+import time
 import traceback
 import wave
-from importlib.resources import files
-
-import torch
-import torchaudio
-from huggingface_hub import hf_hub_download
-from hydra.utils import get_class
-from omegaconf import OmegaConf
-
-from f5_tts.infer.utils_infer import (
-    chunk_text,
-    preprocess_ref_audio_text,
-    load_vocoder,
-    load_model,
-    infer_batch_process,
+
+from tts_engines import DEFAULT_NFE_STEP, CancelToken, add_engine_arguments, create_engine
+from tts_protocol import (
+    CANCEL_MESSAGE, END_MESSAGE, SHM_ATTACH_FAILED, SHM_ATTACH_OK, SHM_RECORD, SYNTHESIS_OPTIONS, ProtocolError,
+    SynthesisRequest, is_incomplete_json, parse_request, parse_shm_attach,
 )
+from tts_scheduler import SynthesisScheduler
+from tts_tracing import ProfileCapture, Trace, TraceLog, new_request_id
+import tts_memory
+import tts_quality
+import tts_workers
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastAPI"))
+import tts_capture  # noqa: E402
+import tts_metrics  # noqa: E402
+import tts_phrases  # noqa: E402
+from tts_shm_ring import ShmRing, is_ring_name  # noqa: E402
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+TIME_TO_FIRST_AUDIO = tts_metrics.REGISTRY.histogram(
+    "tts_time_to_first_audio_seconds", "Time from request receipt to the first audio chunk sent.")
+REAL_TIME_FACTOR = tts_metrics.REGISTRY.histogram(
+    "tts_real_time_factor", "Request wall time divided by the duration of the audio sent.", tts_metrics.RTF_BUCKETS)
+STAGE_SECONDS = tts_metrics.REGISTRY.histogram(
+    "tts_stage_seconds", "Time spent per pipeline stage (chunking, model, vocoder, send).", labelnames=("stage",))
+CHUNK_SAMPLES = tts_metrics.REGISTRY.histogram(
+    "tts_chunk_samples", "Size of the audio chunks sent to clients, in samples.", tts_metrics.CHUNK_SAMPLES_BUCKETS)
+QUEUE_DEPTH = tts_metrics.REGISTRY.gauge("tts_queue_depth", "Requests waiting for their turn on the engine.")
+IN_FLIGHT = tts_metrics.REGISTRY.gauge("tts_requests_in_flight", "Requests currently being streamed.")
+REQUESTS = tts_metrics.REGISTRY.counter(
+    "tts_requests_total", "Finished requests by outcome (completed, cancelled, disconnected, slow_client, shed).", ("outcome",))
+ERRORS = tts_metrics.REGISTRY.counter("tts_errors_total", "Errors while serving clients.", ("kind",))
+
+SEND_STALL_SECONDS = tts_metrics.REGISTRY.histogram(
+    "tts_send_stall_seconds", "Time generation waited for a slow client to make room in its send queue.")
+SEND_STALLS = tts_metrics.REGISTRY.counter(
+    "tts_send_stalls_total", "Audio chunks that found their send queue full, by action taken (paused, dropped, spilled).", ("action",))
+SEND_SPILLED_BYTES = tts_metrics.REGISTRY.counter(
+    "tts_send_spilled_bytes_total", "Audio bytes spilled to disk for slow clients.")
+SEND_QUEUE_BYTES = tts_metrics.REGISTRY.gauge(
+    "tts_send_queue_bytes", "Audio generated but not yet handed to the network, all connections (memory and spill).")
+
+CHUNK_SIZE = 2048  # Samples per audio chunk sent to the client
+MAX_REQUEST_BYTES = 64 * 1024  # Longest request message kept in memory, the rest waits in the socket
+WRITER_QUEUE_CHUNKS = 512  # ~45 s of audio waiting for output.wav, later chunks are left out of the file
+STARTED_AT = time.time()
+
 import subprocess
 
 def convert_to_unity_format(input_file, output_file):
@@ -46,9 +83,9 @@ class AudioFileWriterThread(threading.Thread):
         super().__init__()
         self.output_file = output_file
         self.sampling_rate = sampling_rate
-        self.queue = queue.Queue()
+        self.queue = queue.Queue(maxsize=WRITER_QUEUE_CHUNKS)
         self.stop_event = threading.Event()
-        self.audio_data = []
+        self.dropped_chunks = 0
 
     def run(self):
         """Process queued audio data and write it to a file."""
@@ -62,166 +99,906 @@ class AudioFileWriterThread(threading.Thread):
                 try:
                     chunk = self.queue.get(timeout=0.1)
                     if chunk is not None:
-                        chunk = np.int16(chunk * 32767)
-                        self.audio_data.append(chunk)
-                        wf.writeframes(chunk.tobytes())
+                        wf.writeframes(np.int16(chunk * 32767).tobytes())
                 except queue.Empty:
                     continue
 
     def add_chunk(self, chunk):
-        """Add a new chunk to the queue."""
-        self.queue.put(chunk)
+        """Add a new chunk to the queue. The stream never waits for the disk: chunks are dropped when it is full."""
+        try:
+            self.queue.put_nowait(chunk)
+        except queue.Full:
+            self.dropped_chunks += 1
 
     def stop(self):
         """Stop writing and ensure all queued data is written."""
         self.stop_event.set()
         self.join()
+        if self.dropped_chunks:
+            logger.warning(f"{self.output_file}: {self.dropped_chunks} chunks left out, the disk could not keep up.")
         logger.info("Audio writing completed.")
 
 
-class TTSStreamingProcessor:
-    def __init__(self, model, ckpt_file, vocab_file, ref_audio, ref_text, device=None, dtype=torch.float32):
-        self.device = device or (
-            "cuda"
-            if torch.cuda.is_available()
-            else "xpu"
-            if torch.xpu.is_available()
-            else "mps"
-            if torch.backends.mps.is_available()
-            else "cpu"
-        )
-        model_cfg = OmegaConf.load(str(files("f5_tts").joinpath(f"configs/{model}.yaml")))
-        self.model_cls = get_class(f"f5_tts.model.{model_cfg.model.backbone}")
-        self.model_arc = model_cfg.model.arch
-        self.mel_spec_type = model_cfg.model.mel_spec.mel_spec_type
-        self.sampling_rate = model_cfg.model.mel_spec.target_sample_rate
+class SocketAudioSink:
+    """Streams float32 samples on the connection itself, then END."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def send_audio(self, audio_chunk, cancel_token):
+        self.conn.sendall(np.ascontiguousarray(audio_chunk, dtype=np.float32).tobytes())
+
+    def discard_pending(self):
+        pass  # Nothing is buffered
+
+    def send_end(self, cancel_token=None):
+        self.conn.sendall(END_MESSAGE)
+
+    def close(self):
+        pass
+
+
+class QueuedSocketSink:
+    """
+    Like SocketAudioSink, but a sender thread does the sending: generation runs ahead of the
+    client by up to `max_buffered_seconds` of audio instead of waiting on every sendall.
+    When a slow client lets the queue fill up, `policy` applies:
+      pause  the request waits for room (its next batches are delayed, other requests keep the engine)
+      drop   waits at most `stall_timeout` seconds, then drops the client (outcome "slow_client")
+      spill  the overflow goes to a temporary file and generation continues; the sender catches up from it
+    """
+
+    def __init__(self, conn, sampling_rate, max_buffered_seconds=10.0, policy="pause", stall_timeout=5.0, trace=None):
+        self.conn = conn
+        self.sampling_rate = sampling_rate
+        self.max_bytes = max(1, int(max_buffered_seconds * sampling_rate)) * 4
+        self.policy = policy
+        self.stall_timeout = stall_timeout
+        self.trace = trace
+        self.condition = threading.Condition()
+        self.chunks = collections.deque()  # float32 payloads in memory, older than anything spilled
+        self.buffered = 0  # Bytes in self.chunks
+        self.spill = None  # Temporary file of the payloads queued after an overflow, in order
+        self.spill_read = 0
+        self.spill_write = 0
+        self.finished = False  # END queued
+        self.closed = False
+        self.error = None
+        self.sender = threading.Thread(target=self._send_loop, name="sender", daemon=True)
+        self.sender.start()
+
+    def _queued_seconds(self, num_bytes):
+        return num_bytes / 4 / self.sampling_rate
+
+    def _next_payload(self):
+        """Called with the condition held: the next bytes to send, None when there is nothing left."""
+        if self.chunks:
+            payload = self.chunks.popleft()
+            self.buffered -= len(payload)
+        elif self.spill_write > self.spill_read:
+            self.spill.seek(self.spill_read)
+            payload = self.spill.read(min(self.spill_write - self.spill_read, CHUNK_SIZE * 4 * 8))
+            self.spill_read += len(payload)
+            if self.spill_read == self.spill_write:
+                self.spill.seek(0)
+                self.spill.truncate()
+                self.spill_read = self.spill_write = 0
+        else:
+            return None
+        SEND_QUEUE_BYTES.dec(len(payload))
+        self.condition.notify_all()
+        return payload
+
+    def _send_loop(self):
+        try:
+            while True:
+                with self.condition:
+                    payload = self._next_payload()
+                    while payload is None and not (self.finished or self.closed):
+                        self.condition.wait()
+                        payload = self._next_payload()
+                    if payload is None and self.closed:
+                        return
+                try:
+                    self.conn.sendall(END_MESSAGE if payload is None else payload)
+                except OSError as e:
+                    with self.condition:
+                        self.error = e
+                        self.condition.notify_all()
+                    return
+                if payload is None:
+                    return  # END sent
+        finally:
+            self._close_spill()  # Nothing is read from it anymore
+
+    def _close_spill(self):
+        with self.condition:
+            if self.spill is not None:
+                self.spill.close()
+                self.spill = None
+
+    def _wait_for_room(self, size, cancel_token):
+        """Pause/drop policies: blocks until `size` more bytes fit. False if the client was dropped or the request cancelled."""
+        start = time.perf_counter()
+        deadline = start + self.stall_timeout if self.policy == "drop" else None
+        while self.chunks and self.buffered + size > self.max_bytes and self.error is None and not cancel_token.cancelled:
+            timeout = 0.1 if deadline is None else min(0.1, deadline - time.perf_counter())
+            if timeout <= 0:
+                break
+            self.condition.wait(timeout)
+        stalled = time.perf_counter() - start
+        SEND_STALL_SECONDS.observe(stalled)
+        if self.trace is not None:
+            self.trace.add_span("send_stall", start, stalled)
+        if self.chunks and self.buffered + size > self.max_bytes and self.error is None and not cancel_token.cancelled:
+            SEND_STALLS.inc(action="dropped")
+            logger.warning(f"Client stalled for {stalled:.1f}s with {self._queued_seconds(self.buffered):.1f}s of audio queued, dropping it.")
+            cancel_token.cancel("slow_client")
+            try:
+                self.conn.shutdown(socket.SHUT_RDWR)  # Unblocks the sender
+            except OSError:
+                pass
+            return False
+        SEND_STALLS.inc(action="paused")
+        return not cancel_token.cancelled
+
+    def send_audio(self, audio_chunk, cancel_token):
+        payload = np.ascontiguousarray(audio_chunk, dtype=np.float32).tobytes()
+        with self.condition:
+            if self.error is not None:
+                raise self.error
+            spilling = self.spill_write > self.spill_read
+            if spilling or (self.chunks and self.buffered + len(payload) > self.max_bytes):
+                if self.policy == "spill":
+                    if self.spill is None:
+                        self.spill = tempfile.TemporaryFile(prefix="tts_spill_")
+                    if not spilling:
+                        SEND_STALLS.inc(action="spilled")
+                    self.spill.seek(self.spill_write)
+                    self.spill.write(payload)
+                    self.spill_write += len(payload)
+                    SEND_SPILLED_BYTES.inc(len(payload))
+                    SEND_QUEUE_BYTES.inc(len(payload))
+                    self.condition.notify_all()
+                    return
+                if not self._wait_for_room(len(payload), cancel_token):
+                    return
+                if self.error is not None:
+                    raise self.error
+            self.chunks.append(payload)
+            self.buffered += len(payload)
+            SEND_QUEUE_BYTES.inc(len(payload))
+            self.condition.notify_all()
+
+    def _drop_queued(self):
+        SEND_QUEUE_BYTES.dec(self.buffered + self.spill_write - self.spill_read)
+        self.chunks.clear()
+        self.buffered = 0
+        if self.spill is not None:
+            self.spill.seek(0)
+            self.spill.truncate()
+        self.spill_read = self.spill_write = 0
+        self.condition.notify_all()
+
+    def discard_pending(self):
+        """Drops the audio not sent yet (the request was cancelled), so END follows right away."""
+        with self.condition:
+            self._drop_queued()
+
+    def send_end(self, cancel_token=None):
+        """
+        Queues END and waits until the sender has sent everything. If `cancel_token` is
+        cancelled meanwhile, the audio still queued is dropped and END follows right away.
+        """
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+        while self.sender.is_alive():
+            if cancel_token is not None and cancel_token.cancelled:
+                self.discard_pending()
+                cancel_token = None
+            self.sender.join(0.05)
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self._drop_queued()
+        if not self.sender.is_alive():
+            self._close_spill()  # Otherwise the sender closes it on its way out
+
+
+class ShmAudioSink:
+    """
+    Writes the samples into the client's shared-memory ring; only a (position, length)
+    record per chunk goes through the connection. A zero-length record ends the stream.
+    """
+
+    def __init__(self, conn, ring):
+        self.conn = conn
+        self.ring = ring
+
+    def send_audio(self, audio_chunk, cancel_token):
+        payload = np.ascontiguousarray(audio_chunk, dtype="<f4")
+        position = self.ring.write(payload, is_cancelled=lambda: cancel_token.cancelled)
+        if position is not None:
+            self.conn.sendall(SHM_RECORD.pack(position, payload.nbytes))
 
-        self.model = self.load_ema_model(ckpt_file, vocab_file, dtype)
-        self.vocoder = self.load_vocoder_model()
+    def discard_pending(self):
+        pass  # The ring already bounds what runs ahead of the client
+
+    def send_end(self, cancel_token=None):
+        self.conn.sendall(SHM_RECORD.pack(self.ring.write_position, 0))
+
+    def close(self):
+        pass
+
+
+def make_audio_sink(conn, ring=None, send_queue=None, trace=None):
+    """`send_queue`: options of QueuedSocketSink, or None to send inline."""
+    if ring is not None:
+        return ShmAudioSink(conn, ring)
+    if send_queue is not None:
+        return QueuedSocketSink(conn, trace=trace, **send_queue)
+    return SocketAudioSink(conn)
+
+
+class CancelWatcher(threading.Thread):
+    """
+    Watches a client connection while its audio is being generated.
+
+    Cancels the request when the client sends CANCEL_MESSAGE or hangs up. Any other
+    bytes received meanwhile (an early next request) are kept in `pending`, up to
+    MAX_REQUEST_BYTES: past that the watcher stops reading and the rest waits in the socket.
+    """
+
+    def __init__(self, conn, cancel_token, poll_interval=0.05):
+        super().__init__(daemon=True)
+        self.conn = conn
+        self.cancel_token = cancel_token
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.pending = b""
+
+    def run(self):
+        while not self.stop_event.is_set() and not self.cancel_token.cancelled:
+            if len(self.pending) >= MAX_REQUEST_BYTES:
+                self.stop_event.wait(self.poll_interval)
+                continue
+            try:
+                readable, _, _ = select.select([self.conn], [], [], self.poll_interval)
+                if not readable:
+                    continue
+                data = self.conn.recv(1024)
+            except (OSError, ValueError):
+                self.cancel_token.cancel("disconnected")
+                break
+            if not data:
+                self.cancel_token.cancel("disconnected")
+                break
+            self.pending += data
+            if CANCEL_MESSAGE in self.pending:
+                before, _, after = self.pending.partition(CANCEL_MESSAGE)
+                self.pending = before + after
+                self.cancel_token.cancel("cancel")
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+        return self.pending
+
+
+class TTSStreamingProcessor:
+    def __init__(self, engine, ref_audio, ref_text, trace_slow_ms=0, profile_dir="profiles", pipeline_depth=0,
+                 send_queue=None):
+        self.engine = engine
+        self.pipeline_depth = pipeline_depth  # 0 = model and vocoder of a batch back to back
+        self.send_queue = send_queue  # QueuedSocketSink options, None = send inline
+        self.sampling_rate = engine.sampling_rate
+        self.scheduler = SynthesisScheduler()
+        QUEUE_DEPTH.set_function(self.scheduler.queue_depth)
+        self.trace_log = TraceLog(slow_ms=trace_slow_ms)
+        self.phrase_index = None  # tts_phrases.PhraseIndex, see --phrase_manifest
+        self.memory_guard = None  # tts_memory.MemoryGuard, only with --memory_high_mb, --memory_limit_mb or --memory_trim_interval
+        self.quality_guard = None  # tts_quality.RealTimeGuard, see --rt_high
+        self.capture = None  # tts_capture.TrafficCapture, see --capture
+        self.option_limits = SYNTHESIS_OPTIONS  # Ranges of the per-request inference options, see --max_nfe_step
+        self.profile_capture = ProfileCapture(profile_dir)
 
         self.update_reference(ref_audio, ref_text)
-        self._warm_up()
-        self.file_writer_thread = None
-        self.first_package = True
-
-    def load_ema_model(self, ckpt_file, vocab_file, dtype):
-        return load_model(
-            self.model_cls,
-            self.model_arc,
-            ckpt_path=ckpt_file,
-            mel_spec_type=self.mel_spec_type,
-            vocab_file=vocab_file,
-            ode_method="euler",
-            use_ema=True,
-            device=self.device,
-        ).to(self.device, dtype=dtype)
-
-    def load_vocoder_model(self):
-        return load_vocoder(vocoder_name=self.mel_spec_type, is_local=False, local_path=None, device=self.device)
+        self.engine.warm_up()
+        # output.wav keeps the audio of one request at a time, the others are not recorded
+        self.file_writer_lock = threading.Lock()
 
     def update_reference(self, ref_audio, ref_text):
-        self.ref_audio, self.ref_text = preprocess_ref_audio_text(ref_audio, ref_text)
-        self.audio, self.sr = torchaudio.load(self.ref_audio)
+        self.engine.update_reference(ref_audio, ref_text)
+        self.ref_audio = ref_audio
+        self.ref_text = self.engine.ref_text
 
-        ref_audio_duration = self.audio.shape[-1] / self.sr
+        ref_audio_duration = self.engine.ref_duration
         ref_text_byte_len = len(self.ref_text.encode("utf-8"))
         self.max_chars = int(ref_text_byte_len / (ref_audio_duration) * (25 - ref_audio_duration))
         self.few_chars = int(ref_text_byte_len / (ref_audio_duration) * (25 - ref_audio_duration) / 2)
         self.min_chars = int(ref_text_byte_len / (ref_audio_duration) * (25 - ref_audio_duration) / 4)
 
-    def _warm_up(self):
-        logger.info("Warming up the model...")
-        gen_text = "Warm-up text for the model."
-        for _ in infer_batch_process(
-            (self.audio, self.sr),
-            self.ref_text,
-            [gen_text],
-            self.model,
-            self.vocoder,
-            progress=None,
-            device=self.device,
-            streaming=True,
-        ):
-            pass
-        logger.info("Warm-up completed.")
-
-    def generate_stream(self, text, conn):
+    def split_text(self, text, first_package=False, chunk_scale=1.0):
+        """
+        Cuts text into engine batches of at most max_chars, the longest text the model takes next to
+        the reference. The first request of a connection starts with short batches, `chunk_scale`
+        times longer under load (fewer model calls per second of audio), never past max_chars.
+        Later requests are cut at max_chars already: `chunk_scale` does not change them.
+        Text with nothing to say gives no batch.
+        """
+        chunk_text = self.engine.chunk_text
         text_batches = chunk_text(text, max_chars=self.max_chars)
-        if self.first_package:
-            text_batches = chunk_text(text_batches[0], max_chars=self.few_chars) + text_batches[1:]
-            text_batches = chunk_text(text_batches[0], max_chars=self.min_chars) + text_batches[1:]
-            self.first_package = False
-
-        audio_stream = infer_batch_process(
-            (self.audio, self.sr),
-            self.ref_text,
-            text_batches,
-            self.model,
-            self.vocoder,
-            progress=None,
-            device=self.device,
-            streaming=True,
-            chunk_size=2048,
-        )
+        if first_package and text_batches:
+            few_chars = min(self.max_chars, int(self.few_chars * chunk_scale))
+            min_chars = min(self.max_chars, int(self.min_chars * chunk_scale))
+            text_batches = chunk_text(text_batches[0], max_chars=few_chars) + text_batches[1:]
+            text_batches = chunk_text(text_batches[0], max_chars=min_chars) + text_batches[1:]
+        return text_batches
+
+    def batch_options(self, request, adaptive=True):
+        """Options of the request's next text batch: nfe_step is capped by the real-time guard under load."""
+        guard = self.quality_guard
+        if not adaptive or guard is None or "nfe_step" not in self.engine.supported_options:
+            return request.options
+        cap = guard.current().nfe_step
+        if guard.level == 0 or request.options.get("nfe_step", DEFAULT_NFE_STEP) <= cap:
+            return request.options
+        return dict(request.options, nfe_step=cap)
+
+    def render_text(self, text, priority="batch"):
+        """
+        The whole audio a client would receive for `text` (its batches back to back), generated
+        during ordinary scheduler turns. Used to fill the phrase index while the server runs.
+        """
+        request = SynthesisRequest(text, client_id="phrase-index", priority=priority)
+        request.cancel_token = CancelToken()
+        request.trace = Trace(client=request.client_id)
+        # Always full quality: the phrase is kept and replayed long after the load has gone
+        batches = self._sequential_waves(request, self.split_text(text), lambda *args: None, adaptive=False)
+        waves = [wave for _, wave in batches]
+        return np.concatenate(waves) if waves else None
+
+    def should_shed(self, request):
+        """True if memory pressure refuses `request`. Phrases answered from memory are always served."""
+        if self.memory_guard is None or self.memory_guard.level == tts_memory.NORMAL:
+            return False
+        if self.phrase_index is not None and not request.options and request.text in self.phrase_index:
+            return False
+        return self.memory_guard.should_shed(request.priority)
+
+    def generate_stream(self, request, conn, first_package=False, ring=None):
+        """
+        Streams the audio for `request` to `conn`, followed by END.
+        With a shared-memory `ring`, the samples go through the ring and `conn` only carries records.
+        The engine is shared through the scheduler, one text batch at a time.
+        Returns bytes received from the client during the stream that belong to its next request.
+        """
+        if isinstance(request, str):
+            request = SynthesisRequest(request)
+        trace = Trace(request.request_id, start=request.received_at, client=request.client_id,
+                      priority=request.priority, chars=len(request.text))
+        request.request_id = trace.request_id
+        request.trace = trace
+        unsupported = [name for name in request.options if name not in self.engine.supported_options]
+        if unsupported:
+            logger.info(f"The {self.engine.name} engine ignores {', '.join(unsupported)} [{request.request_id}]")
+            request.options = {name: value for name, value in request.options.items() if name not in unsupported}
+        trace.attributes.update(request.options)
+        with self.profile_capture.capture(trace):
+            try:
+                sink = make_audio_sink(conn, ring, self.send_queue, trace)
+                try:
+                    return self._generate_stream(request, conn, first_package, sink)
+                finally:
+                    sink.close()
+            finally:
+                self.trace_log.record(trace)
+
+    def _generate_stream(self, request, conn, first_package, sink):
+        trace = request.trace
+        start = time.perf_counter()
+        chunk_scale = 1.0
+        if self.quality_guard is not None:
+            chunk_scale = self.quality_guard.current().chunk_scale
+            if self.quality_guard.level:
+                trace.attributes["quality_level"] = self.quality_guard.level
+        text_batches = self.split_text(request.text, first_package, chunk_scale)
+        chunking_seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(chunking_seconds, stage="chunking")
+        trace.add_span("chunking", start, chunking_seconds, batches=len(text_batches))
+
+        cancel_token = CancelToken()
+        request.cancel_token = cancel_token
+        watcher = CancelWatcher(conn, cancel_token)
+        watcher.start()
+
+        file_writer_thread = None
+        if self.file_writer_lock.acquire(blocking=False):
+            file_writer_thread = AudioFileWriterThread("output.wav", self.sampling_rate)
+            file_writer_thread.start()
+
+        IN_FLIGHT.inc()
+        try:
+            try:
+                samples_sent = self._stream_batches(request, text_batches, sink, file_writer_thread)
+            finally:
+                IN_FLIGHT.dec()
+                if file_writer_thread is not None:
+                    # Ensure all audio data is written before exiting
+                    with trace.span("file_writer"):
+                        file_writer_thread.stop()
+            generated_at = time.perf_counter()  # The real-time factor leaves out the send queue drain
+
+            if cancel_token.reason not in ("disconnected", "slow_client"):
+                if cancel_token.cancelled:
+                    sink.discard_pending()
+                try:
+                    # The watcher still runs: a CANCEL while the send queue drains cuts it short
+                    sink.send_end(cancel_token)  # Send end signal
+                    print("✔️ Envoi terminé, END envoyé.")
+                except OSError:
+                    logger.info("Client disconnected before END.")
+            outcome = cancel_token.reason or "completed"  # Once END is out, a hang-up is the client leaving
+            watcher.stop()
+            if outcome in ("disconnected", "slow_client"):
+                logger.info(f"Client {outcome.replace('_', ' ')}, audio stream abandoned.")
+            elif outcome != "completed":
+                logger.info("Audio stream cancelled by the client.")
+            else:
+                logger.info("Finished sending audio stream.")
 
-        # Reset the file writer thread
-        if self.file_writer_thread is not None:
-            self.file_writer_thread.stop()
-        self.file_writer_thread = AudioFileWriterThread("output.wav", self.sampling_rate)
-        self.file_writer_thread.start()
+            REQUESTS.inc(outcome=outcome)
+            trace.attributes["outcome"] = outcome
+            if samples_sent > 0 and outcome == "completed":
+                REAL_TIME_FACTOR.observe((generated_at - request.received_at) * self.sampling_rate / samples_sent)
 
-        for audio_chunk, _ in audio_stream:
-            if len(audio_chunk) > 0:
-                logger.info(f"Generated audio chunk of size: {len(audio_chunk)}")
+            if file_writer_thread is not None and outcome == "completed":
+                with trace.span("ffmpeg"):
+                    convert_to_unity_format("output.wav", "output_unity.wav")
+        finally:
+            watcher.stop()  # Already stopped unless an error got here first
+            if file_writer_thread is not None:
+                self.file_writer_lock.release()
+        return watcher.pending
 
-                # Send audio chunk via socket
-                conn.sendall(struct.pack(f"{len(audio_chunk)}f", *audio_chunk))
+    def _stream_batches(self, request, text_batches, sink, file_writer_thread):
+        """Generates and sends the batches of one request. Returns the number of samples sent."""
+        cancel_token = request.cancel_token
+        trace = request.trace
+        samples_sent = 0
 
-                # Write to file asynchronously
-                self.file_writer_thread.add_chunk(audio_chunk)
-                print(f"🔊 Chunk envoyé ({len(audio_chunk)} samples), max={np.max(audio_chunk):.3f}")
+        def on_stage(stage, seconds, index):
+            STAGE_SECONDS.observe(seconds, stage=stage)
+            trace.add_span(stage, time.perf_counter() - seconds, seconds, batch=index, chars=len(text_batches[index]))
 
+        # Phrases were rendered with the default options
+        phrase = self.phrase_index.get(request.text) if self.phrase_index is not None and not request.options else None
+        if phrase is not None:
+            trace.attributes["phrase_index"] = True
+            batch_waves = [(0, phrase)]  # Preloaded phrase, no model call
+        elif self.pipeline_depth > 0:
+            batch_waves = self._pipelined_waves(request, text_batches, on_stage)
+        else:
+            batch_waves = self._sequential_waves(request, text_batches, on_stage)
+        production_start = time.perf_counter()
+        for index, wave in batch_waves:
+            if self.quality_guard is not None and phrase is None:
+                # How long the client waited for this batch (turn, model, vocoder), sending excluded
+                self.quality_guard.observe(time.perf_counter() - production_start, len(wave) / self.sampling_rate)
+            with trace.span("send", batch=index, samples=len(wave)):
+                for j in range(0, len(wave), CHUNK_SIZE):
+                    audio_chunk = wave[j : j + CHUNK_SIZE]
+                    if cancel_token.cancelled:
+                        return samples_sent
+                    logger.debug(f"Generated audio chunk of size: {len(audio_chunk)}")
 
-        logger.info("Finished sending audio stream.")
-        print("✔️ Envoi terminé, END envoyé.")
-        conn.sendall(b"END")  # Send end signal
+                    # Send audio chunk via socket (or the client's shared-memory ring)
+                    start = time.perf_counter()
+                    try:
+                        sink.send_audio(audio_chunk, cancel_token)
+                    except OSError:
+                        cancel_token.cancel("disconnected")
+                        return samples_sent
+                    if cancel_token.cancelled:
+                        return samples_sent  # Cancelled while waiting for room in the ring
+                    STAGE_SECONDS.observe(time.perf_counter() - start, stage="send")
+                    CHUNK_SAMPLES.observe(len(audio_chunk))
+                    if samples_sent == 0:
+                        TIME_TO_FIRST_AUDIO.observe(time.perf_counter() - request.received_at)
+                    samples_sent += len(audio_chunk)
 
-        # Ensure all audio data is written before exiting
-        self.file_writer_thread.stop()
-        convert_to_unity_format("output.wav", "output_unity.wav")
+                    # Write to file asynchronously
+                    if file_writer_thread is not None:
+                        file_writer_thread.add_chunk(audio_chunk)
+            if cancel_token.cancelled:
+                return samples_sent
+            production_start = time.perf_counter()
+        return samples_sent
 
-def handle_client(conn, processor):
+    def _sequential_waves(self, request, text_batches, on_stage, adaptive=True):
+        """
+        Yields (index, waveform) per text batch, model and vocoder run back to back during the turn.
+        `adaptive` lets the real-time guard lower the quality of the batches.
+        """
+        cancel_token = request.cancel_token
+        trace = request.trace
+        for index, text_batch in enumerate(text_batches):
+            with trace.span("queue_wait", batch=index):
+                turn = self.scheduler.acquire(request)
+            if not turn:
+                return  # Cancelled while waiting for its turn
+            try:
+                # The whole batch is generated during the turn, then sent without holding the engine
+                features = self.engine.run_model(
+                    text_batch, cancel_token, lambda stage, s: on_stage(stage, s, index),
+                    self.batch_options(request, adaptive))
+                if features is None or cancel_token.cancelled:
+                    return
+                wave = self.engine.run_vocoder(features, lambda stage, s: on_stage(stage, s, index))
+            finally:
+                self.scheduler.release(request)
+            del features
+            yield index, wave
+
+    def _pipelined_waves(self, request, text_batches, on_stage):
+        """
+        Yields (index, waveform) per text batch while a model thread already works on the next ones:
+        the model of batch k+1 runs (during its scheduler turns) while batch k is vocoded and sent.
+        At most pipeline_depth batches of features wait in the handoff queue.
+        """
+        cancel_token = request.cancel_token
+        trace = request.trace
+        handoff = queue.Queue(maxsize=self.pipeline_depth)
+        stopped = threading.Event()  # The consumer is gone, the model thread must not start more batches
+
+        def handoff_put(item):
+            while not (stopped.is_set() or cancel_token.cancelled):
+                try:
+                    handoff.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for index, text_batch in enumerate(text_batches):
+                    if stopped.is_set():
+                        return
+                    with trace.span("queue_wait", batch=index):
+                        turn = self.scheduler.acquire(request)
+                    if not turn:
+                        return
+                    try:
+                        features = self.engine.run_model(
+                            text_batch, cancel_token, lambda stage, s: on_stage(stage, s, index),
+                            self.batch_options(request))
+                    finally:
+                        self.scheduler.release(request)
+                    if features is None or not handoff_put((index, features, None)):
+                        return
+                    del features
+            except Exception as e:
+                handoff_put((None, None, e))
+            finally:
+                handoff_put(None)
+
+        threading.Thread(target=produce, name=f"model-{trace.request_id}", daemon=True).start()
+        try:
+            while True:
+                start = time.perf_counter()
+                item = None
+                while item is None and not cancel_token.cancelled:
+                    try:
+                        item = handoff.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if item is None:
+                        return  # The model thread is done
+                if item is None:
+                    return  # Cancelled
+                index, features, error = item
+                if error is not None:
+                    raise error
+                trace.add_span("model_wait", start, time.perf_counter() - start, batch=index)
+                wave = self.engine.run_vocoder(features, lambda stage, s: on_stage(stage, s, index))
+                del features
+                yield index, wave
+        finally:
+            stopped.set()
+
+def read_request_message(conn, pending=b""):
+    """Returns the next request message, or b"" once the client has hung up."""
+    data = pending or conn.recv(1024)
+    while data and len(data) < MAX_REQUEST_BYTES and is_incomplete_json(data):
+        more = conn.recv(4096)
+        if not more:
+            break
+        data += more
+    return data
+
+
+def is_local_peer(conn, addr):
+    """True for Unix socket clients and TCP clients on a loopback address, the only ones a ring is for."""
+    if conn.family == getattr(socket, "AF_UNIX", None):
+        return True
+    try:
+        address = ipaddress.ip_address(addr[0])
+    except (ValueError, TypeError, IndexError):
+        return False
+    mapped = getattr(address, "ipv4_mapped", None)  # ::ffff:127.0.0.1 on a dual-stack listener
+    return address.is_loopback or (mapped is not None and mapped.is_loopback)
+
+
+def attach_shm_ring(conn, addr, name):
+    """
+    Answers a shared-memory attach message. Returns the ring, or None if it cannot be opened.
+    Refused (SHM_FAILED) for remote clients and for names ShmRing.create would not make: the
+    server writes over the segment, so a client must not point it at another process's memory.
+    """
+    if not is_local_peer(conn, addr) or not is_ring_name(name):
+        logger.warning(f"Shared-memory attach of {name!r} refused for {addr}, audio stays on the socket")
+        conn.sendall(SHM_ATTACH_FAILED)
+        return None
+    try:
+        ring = ShmRing.attach(name)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not attach shared-memory ring {name}, audio stays on the socket: {e}")
+        conn.sendall(SHM_ATTACH_FAILED)
+        return None
+    logger.info(f"Client attached shared-memory ring {name} ({ring.capacity} bytes)")
+    conn.sendall(SHM_ATTACH_OK)
+    return ring
+
+
+def handle_client(conn, addr, processor):
+    ring = None
     try:
         with conn:
-            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if conn.family != getattr(socket, "AF_UNIX", None):
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client_id = addr[0] if isinstance(addr, tuple) else "local"  # Unix socket peers have no address
+            pending = b""
+            first_package = True
             while True:
-                data = conn.recv(1024)
+                data = read_request_message(conn, pending)
+                pending = b""
                 if not data:
-                    processor.first_package = True
                     break
                 data_str = data.decode("utf-8").strip()
-                logger.info(f"Received text: {data_str}")
+                if not data_str or data_str == CANCEL_MESSAGE.decode():
+                    continue  # Nothing is playing, a late CANCEL has nothing to stop
+                ring_name = parse_shm_attach(data)
+                if ring_name is not None:
+                    if ring is None:
+                        ring = attach_shm_ring(conn, addr, ring_name)
+                    else:
+                        conn.sendall(SHM_ATTACH_FAILED)  # One ring per connection
+                    continue
+                try:
+                    request = parse_request(data, client_id=client_id, option_limits=processor.option_limits)
+                except ProtocolError as e:
+                    ERRORS.inc(kind="protocol")
+                    logger.error(f"Invalid request from {addr}: {e}")
+                    make_audio_sink(conn, ring).send_end()
+                    continue
+                request.request_id = request.request_id or new_request_id()
+                if processor.capture is not None:
+                    processor.capture.record(request.text, request.priority, request.options, request.client_id)
+                if processor.should_shed(request):
+                    REQUESTS.inc(outcome="shed")
+                    logger.warning(f"Request [{request.request_id}] ({request.priority}) shed, memory over its watermark")
+                    make_audio_sink(conn, ring).send_end()  # No audio, the client may retry later
+                    continue
+                logger.info(f"Received text [{request.request_id}] ({request.priority}, client {request.client_id}): {request.text}")
 
                 try:
-                    processor.generate_stream(data_str, conn)
+                    pending = processor.generate_stream(request, conn, first_package, ring)
+                    first_package = False
                 except Exception as inner_e:
+                    ERRORS.inc(kind="processing")
                     logger.error(f"Error during processing: {inner_e}")
                     traceback.print_exc()
                     break
     except Exception as e:
+        ERRORS.inc(kind="connection")
         logger.error(f"Error handling client: {e}")
         traceback.print_exc()
+    finally:
+        if ring is not None:
+            ring.close()
+
+
+def debug_routes(processor):
+    """
+    Debug endpoints served next to /metrics:
+      /debug/traces                         spans of the last requests, Chrome trace JSON
+      /debug/profile?requests=N&torch=1     profile the next N requests into --profile_dir
+      /debug/phrases                        size and memory of the phrase index
+      /debug/memory?trim=1                  memory of the process (trimmed first with trim=1)
+      /debug/quality                        real-time guard level, its settings and last changes
+    """
+    def traces(params):
+        return "application/json", processor.trace_log.chrome_trace_json().encode("utf-8")
+
+    def profile(params):
+        armed = processor.profile_capture.arm(int(params.get("requests", 1)), params.get("torch") == "1")
+        return "application/json", json.dumps(armed).encode("utf-8")
+
+    def phrases(params):
+        stats = processor.phrase_index.stats() if processor.phrase_index is not None else {"entries": 0}
+        return "application/json", json.dumps(stats).encode("utf-8")
+
+    def memory(params):
+        guard = processor.memory_guard
+        if guard is None:
+            if params.get("trim") == "1":
+                tts_memory.trim_process_memory(processor.engine)
+            return "application/json", json.dumps({"resident_bytes": tts_memory.resident_bytes()}).encode("utf-8")
+        if params.get("trim") == "1":
+            guard.trim("requested")
+        return "application/json", json.dumps(guard.stats()).encode("utf-8")
+
+    def quality(params):
+        guard = processor.quality_guard
+        return "application/json", json.dumps(guard.stats() if guard is not None else {"level": 0}).encode("utf-8")
+
+    return {"/debug/traces": traces, "/debug/profile": profile, "/debug/phrases": phrases, "/debug/memory": memory,
+            "/debug/quality": quality}
+
+
+def health_routes(get_processor):
+    """
+    GET /health next to /metrics, for the gateway to poll instead of connecting to the synthesis port:
+    "warming" until get_processor() returns the processor (engine loaded and warmed up), then "busy"
+    while requests wait for the engine or memory is over its high watermark, else "ready".
+    """
+    def health(params):
+        processor = get_processor()
+        report = {"state": "warming", "pid": os.getpid(), "uptime_seconds": round(time.time() - STARTED_AT, 1)}
+        if processor is not None:
+            queue_depth = processor.scheduler.queue_depth()
+            memory_level = processor.memory_guard.level if processor.memory_guard is not None else tts_memory.NORMAL
+            report.update(
+                state="busy" if queue_depth or memory_level != tts_memory.NORMAL else "ready",
+                in_flight=int(IN_FLIGHT.value()),
+                queue_depth=queue_depth,
+                memory_level=memory_level,
+                quality_level=processor.quality_guard.level if processor.quality_guard is not None else 0,
+                engine=processor.engine.name,
+                sampling_rate=processor.sampling_rate,
+                voices=[{"ref_audio": os.path.basename(processor.ref_audio), "ref_text": processor.ref_text}],
+                phrases=len(processor.phrase_index) if processor.phrase_index is not None else 0,
+            )
+        return "application/json", json.dumps(report).encode("utf-8")
+
+    return {"/health": health}
+
+
+def thread_per_client(processor):
+    """Dispatch of the single-process mode: one thread per client, the scheduler decides who uses the engine."""
+    def dispatch(conn, addr):
+        threading.Thread(target=handle_client, args=(conn, addr, processor), daemon=True).start()
+    return dispatch
 
 
-def start_server(host, port, processor):
+def accept_clients(server_socket, dispatch):
+    while True:
+        conn, addr = server_socket.accept()
+        logger.info(f"Connected by {addr or 'unix socket'}")
+        dispatch(conn, addr)
+
+
+def start_unix_server(path, dispatch):
+    """Also accepts same-host clients on a Unix domain socket, which skips the TCP loopback stack."""
+    if not hasattr(socket, "AF_UNIX"):
+        logger.warning("Unix domain sockets are not available on this platform, --unix_socket ignored.")
+        return
+    if os.path.exists(path):
+        os.remove(path)  # Left over by a previous run
+    unix_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    unix_socket.bind(path)
+    unix_socket.listen()
+    logger.info(f"Server listening on unix socket {path}")
+    threading.Thread(target=accept_clients, args=(unix_socket, dispatch), daemon=True).start()
+
+
+def start_server(host, port, dispatch, unix_socket_path=None):
+    """Accepts clients on TCP (and the Unix socket) and passes each connection to `dispatch(conn, addr)`."""
+    if unix_socket_path:
+        start_unix_server(unix_socket_path, dispatch)
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.bind((host, port))
         s.listen()
         logger.info(f"Server started on {host}:{port}")
-        while True:
-            conn, addr = s.accept()
-            logger.info(f"Connected by {addr}")
-            handle_client(conn, processor)
+        accept_clients(s, dispatch)
+
+
+def build_processor(args, capture_path=""):
+    engine = create_engine(args)
+    processor = TTSStreamingProcessor(
+        engine=engine,
+        ref_audio=args.ref_audio,
+        ref_text=args.ref_text,
+        trace_slow_ms=args.trace_slow_ms,
+        profile_dir=args.profile_dir,
+        pipeline_depth=args.pipeline_depth,
+        send_queue=send_queue_options(args, engine.sampling_rate),
+    )
+    processor.option_limits = dict(SYNTHESIS_OPTIONS, nfe_step=(int, args.min_nfe_step, args.max_nfe_step))
+    if args.memory_high_mb or args.memory_limit_mb or args.memory_trim_interval:
+        processor.memory_guard = tts_memory.MemoryGuard(
+            engine, high_bytes=int(args.memory_high_mb * 1e6), limit_bytes=int(args.memory_limit_mb * 1e6),
+            trim_interval=args.memory_trim_interval,
+        )
+        processor.memory_guard.start()
+    if args.rt_high > 0:
+        levels = tts_quality.build_levels(
+            min(DEFAULT_NFE_STEP, args.max_nfe_step), max(args.rt_min_nfe_step, args.min_nfe_step), args.rt_max_chunk_scale)
+        processor.quality_guard = tts_quality.RealTimeGuard(
+            levels, high=args.rt_high, low=args.rt_low, max_queue_depth=args.rt_max_queue,
+            queue_depth=processor.scheduler.queue_depth, on_event=processor.trace_log.add_event,
+        )
+    if args.phrase_manifest:
+        # Filled in the background at batch priority, the server accepts clients meanwhile
+        processor.phrase_index = tts_phrases.PhraseIndex(args.phrase_manifest, processor.render_text)
+        processor.phrase_index.start()
+    if capture_path:
+        processor.capture = tts_capture.TrafficCapture(capture_path, "socket_server", voice=os.path.basename(args.ref_audio))
+        logger.info(f"Capturing traffic to {capture_path}")
+    return processor
+
+
+def send_queue_options(args, sampling_rate):
+    if args.send_buffer_seconds <= 0:
+        return None
+    return {
+        "sampling_rate": sampling_rate,
+        "max_buffered_seconds": args.send_buffer_seconds,
+        "policy": args.slow_client_policy,
+        "stall_timeout": args.slow_client_timeout,
+    }
+
+
+def start_worker(args, index):
+    """Builds the processor of pool worker `index`; its metrics are served on --metrics_port + 1 + index."""
+    processor = None
+    routes = health_routes(lambda: processor)  # Served while the engine loads, the debug routes join it after
+    if args.metrics_port:
+        tts_metrics.start_metrics_server(args.metrics_port + 1 + index, args.host, routes=routes)
+    processor = build_processor(args, tts_capture.worker_path(args.capture, index) if args.capture else "")
+    routes.update(debug_routes(processor))
+    return processor
+
+
+def start_worker_pool(args):
+    """Supervisor of --workers N: the engines live in the worker processes, this one only dispatches."""
+    if not tts_workers.is_supported():
+        raise SystemExit("--workers needs socket.send_fds (Python 3.9+ on Linux/macOS)")
+    devices = [device.strip() for device in args.worker_devices.split(",") if device.strip()]
+    pool = tts_workers.WorkerPool(
+        start_worker, handle_client, args, args.workers,
+        devices=devices, cpu_sets=tts_workers.parse_cpu_sets(args.worker_cpus, args.workers),
+    )
+    pool.start()
+    if args.metrics_port:
+        def health(params):
+            workers = pool.status()
+            state = "ready" if any(worker["ready"] for worker in workers) else "warming"
+            report = {"state": state, "pid": os.getpid(), "uptime_seconds": round(time.time() - STARTED_AT, 1),
+                      "workers": workers}  # Queue depth, voices...: /health of each worker
+            return "application/json", json.dumps(report).encode("utf-8")
+
+        routes = {"/debug/workers": lambda params: ("application/json", json.dumps(pool.status()).encode("utf-8")),
+                  "/health": health}
+        tts_metrics.start_metrics_server(args.metrics_port, args.host, routes=routes)
+        logger.info(f"Pool metrics served on {args.host}:{args.metrics_port}/metrics, "
+                    f"worker i on port {args.metrics_port} + 1 + i")
+    return pool
 
 
 if __name__ == "__main__":
@@ -229,52 +1006,79 @@ if __name__ == "__main__":
 
     parser.add_argument("--host", default="0.0.0.0")
     parser.add_argument("--port",type=int ,default=9998)
+    parser.add_argument("--unix_socket", default="", help="Also listen on this Unix domain socket path (same-host clients)")
 
-    parser.add_argument(
-        "--model",
-        default="F5TTS_v1_Base",
-        help="The model name, e.g. F5TTS_v1_Base",
-    )
-    parser.add_argument(
-        "--ckpt_file",
-        default=str(hf_hub_download(repo_id="SWivid/F5-TTS", filename="F5TTS_v1_Base/model_1250000.safetensors")),
-        help="Path to the model checkpoint file",
-    )
-    parser.add_argument(
-        "--vocab_file",
-        default="",
-        help="Path to the vocab file if customized",
-    )
+    parser.add_argument("--metrics_port", type=int, default=9101, help="Port of the Prometheus /metrics endpoint, /health and /debug/* (0 = off)")
+    parser.add_argument("--trace_slow_ms", type=float, default=3000, help="Log the span breakdown of requests slower than this (0 = off)")
+    parser.add_argument("--profile_dir", default="profiles", help="Where profiles armed with /debug/profile are written")
 
-    parser.add_argument(
-        "--ref_audio",
-        default=str(files("f5_tts").joinpath("infer/examples/basic/basic_ref_en.wav")),
-        help="Reference audio to provide model with speaker characteristics",
-    )
-    parser.add_argument(
-        "--ref_text",
-        default="",
-        help="Reference audio subtitle, leave empty to auto-transcribe",
-    )
+    parser.add_argument("--pipeline_depth", type=int, default=0,
+                        help="Text batches whose mel may be generated ahead of the vocoder and send (0 = no pipelining)")
+
+    parser.add_argument("--send_buffer_seconds", type=float, default=10.0,
+                        help="Audio generated ahead of a slow client, per connection (0 = send inline, no queue)")
+    parser.add_argument("--slow_client_policy", choices=["pause", "drop", "spill"], default="pause",
+                        help="When the send buffer is full: pause the request, drop the client, or spill to a temporary file")
+    parser.add_argument("--slow_client_timeout", type=float, default=5.0,
+                        help="Seconds a full buffer is tolerated before 'drop' disconnects the client")
+
+    parser.add_argument("--min_nfe_step", type=int, default=SYNTHESIS_OPTIONS["nfe_step"][1],
+                        help="Fewest ODE steps a request may ask for (quality floor)")
+    parser.add_argument("--max_nfe_step", type=int, default=SYNTHESIS_OPTIONS["nfe_step"][2],
+                        help="Most ODE steps a request may ask for (bounds the cost of one request)")
 
-    parser.add_argument("--device", default=None, help="Device to run the model on")
-    parser.add_argument("--dtype", default=torch.float16, help="Data type to use for model inference")
+    parser.add_argument("--rt_high", type=float, default=0,
+                        help="Real-time factor at which new batches lose quality (fewer ODE steps, longer opening batches), e.g. 0.8 (0 = off)")
+    parser.add_argument("--rt_low", type=float, default=0.5,
+                        help="Real-time factor the level above must stay under for quality to be restored")
+    parser.add_argument("--rt_max_queue", type=int, default=4,
+                        help="Requests waiting for the engine that also lower the quality")
+    parser.add_argument("--rt_min_nfe_step", type=int, default=16, help="Fewest ODE steps the real-time guard goes down to")
+    parser.add_argument("--rt_max_chunk_scale", type=float, default=2.0,
+                        help="Most the opening text batches of a connection are lengthened under load")
+
+    parser.add_argument("--phrase_manifest", default="",
+                        help="Phrases synthesized at startup and answered from memory (.txt, .json or .csv, reloaded on change)")
+
+    parser.add_argument("--memory_high_mb", type=float, default=0,
+                        help="Resident memory above which prefetch/batch requests are refused and memory is trimmed (0 = off)")
+    parser.add_argument("--memory_limit_mb", type=float, default=0,
+                        help="Resident memory above which every new request is refused (0 = off)")
+    parser.add_argument("--memory_trim_interval", type=float, default=0,
+                        help="Seconds between routine memory trims: gc, allocator caches, malloc_trim, e.g. 300 (0 = only over a watermark)")
+
+    parser.add_argument("--capture", default="",
+                        help="Log every request (text, priority, options, arrival time) to this file for load_test.py --replay; "
+                             "with --workers each worker writes its own file (.w0, .w1...)")
+
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes, each with its own engine (0 = single process)")
+    parser.add_argument("--worker_devices", default="", help="Devices given to the workers in turn, e.g. cuda:0,cuda:1")
+    parser.add_argument("--worker_cpus", default="", help="Cores per worker: 'auto' splits them evenly, or '0-3;4-7' (empty = no pinning)")
+
+    add_engine_arguments(parser)
     args = parser.parse_args()
 
     try:
-        # Initialize the processor with the model and vocoder
-        processor = TTSStreamingProcessor(
-            model=args.model,
-            ckpt_file=args.ckpt_file,
-            vocab_file=args.vocab_file,
-            ref_audio=args.ref_audio,
-            ref_text=args.ref_text,
-            device=args.device,
-            dtype=args.dtype,
-        )
+        if args.workers > 0:
+            pool = start_worker_pool(args)
+            try:
+                start_server(args.host, args.port, pool.dispatch, args.unix_socket)
+            finally:
+                pool.stop()
+        else:
+            # /health answers "warming" while the engine loads, the debug routes join it once the processor is built
+            processor = None
+            routes = health_routes(lambda: processor)
+            if args.metrics_port:
+                tts_metrics.start_metrics_server(args.metrics_port, args.host, routes=routes)
+                logger.info(f"Metrics served on {args.host}:{args.metrics_port}/metrics, health on /health")
+
+            # Initialize the processor with the selected engine
+            processor = build_processor(args, args.capture)
+            routes.update(debug_routes(processor))
 
-        # Start the server
-        start_server(args.host, args.port, processor)
+            # Start the server
+            start_server(args.host, args.port, thread_per_client(processor), args.unix_socket)
 
     except KeyboardInterrupt:
         gc.collect()
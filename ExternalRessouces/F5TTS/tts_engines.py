@@ -0,0 +1,502 @@
+# tts_engines.py
+# torch and f5_tts are imported by the engines that need them: --engine stub runs without them.
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from importlib.resources import files
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CKPT_REPO = "SWivid/F5-TTS"
+DEFAULT_CKPT_FILE = "F5TTS_v1_Base/model_1250000.safetensors"
+DEFAULT_NFE_STEP = 32  # ODE steps when a request does not choose
+
+
+class CancelToken:
+    """Set once a request must stop. Engines and the server check it at every stage boundary."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason="cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+def select_device(device=None):
+    """Returns the requested device, or the best one available on this machine."""
+    import torch
+
+    return device or (
+        "cuda"
+        if torch.cuda.is_available()
+        else "xpu"
+        if torch.xpu.is_available()
+        else "mps"
+        if torch.backends.mps.is_available()
+        else "cpu"
+    )
+
+
+class TTSEngine:
+    """
+    Interface between TTSStreamingProcessor and a synthesis backend.
+
+    An engine owns the model weights (if any) and the reference voice. It turns
+    a list of text batches into a stream of float32 audio chunks at `sampling_rate`.
+    """
+
+    name = "base"
+    sampling_rate = 24000
+    supported_options = ()  # tts_protocol.SYNTHESIS_OPTIONS this engine can change per request
+
+    def __init__(self):
+        self.ref_audio = None
+        self.ref_text = ""
+        self.ref_duration = 0.0
+
+    def update_reference(self, ref_audio, ref_text):
+        """Loads the reference voice. Must set ref_text and ref_duration (seconds)."""
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Runs one short synthesis so the first real request does not pay for it."""
+        logger.info(f"Warming up the {self.name} engine...")
+        for _ in self.generate(["Warm-up text for the model."]):
+            pass
+        logger.info("Warm-up completed.")
+
+    def chunk_text(self, text, max_chars):
+        """Cuts text into batches of whole sentences, at most max_chars bytes each (f5_tts's rule)."""
+        from f5_tts.infer.utils_infer import chunk_text
+
+        return chunk_text(text, max_chars=max_chars)
+
+    def release_memory(self):
+        """Returns memory cached by the backend's allocator (not in use) to the system. Nothing by default."""
+
+    def device_memory_bytes(self):
+        """Accelerator memory held by the engine, in use or cached. 0 when it runs on the CPU."""
+        return 0
+
+    def run_model(self, gen_text, cancel=None, on_stage=None, options=None):
+        """
+        First stage of one text batch (the acoustic model). Returns the features run_vocoder
+        needs, or None if `cancel` was set meanwhile. Reports the "model" stage.
+        `options` holds the request's inference options among supported_options, the others keep their defaults.
+        """
+        raise NotImplementedError
+
+    def run_vocoder(self, features, on_stage=None):
+        """Second stage: turns run_model's features into a float32 NumPy waveform. Reports the "vocoder" stage."""
+        raise NotImplementedError
+
+    def generate(self, text_batches, chunk_size=2048, cancel=None, on_stage=None, options=None):
+        """
+        Yields float32 NumPy audio chunks of at most chunk_size samples.
+        Stops early, between text batches or between the model and the vocoder,
+        once `cancel` (a CancelToken) is set.
+        `on_stage(stage, seconds)` is called after each "model" and "vocoder" step.
+        """
+        for gen_text in text_batches:
+            if cancel is not None and cancel.cancelled:
+                return
+            features = self.run_model(gen_text, cancel, on_stage, options)
+            if features is None or (cancel is not None and cancel.cancelled):
+                return
+            wave = self.run_vocoder(features, on_stage)
+            del features
+            for j in range(0, len(wave), chunk_size):
+                yield wave[j : j + chunk_size]
+
+    @staticmethod
+    def _report_stage(on_stage, stage, start):
+        if on_stage is not None:
+            on_stage(stage, time.perf_counter() - start)
+
+
+class F5TorchEngine(TTSEngine):
+    """
+    The original F5-TTS PyTorch model + vocoder.
+
+    The batch loop mirrors infer_batch_process(streaming=True), split into infer_mel and
+    vocode so that a request can be stopped, or the next batch's mel started, between the two.
+    On CUDA the vocoder runs on its own stream, so it can overlap with the next transformer pass.
+    """
+
+    name = "torch"
+    supported_options = ("nfe_step", "cfg_strength", "sway_sampling_coef", "speed")
+
+    def __init__(self, model, ckpt_file, vocab_file, device=None, dtype="float32"):
+        super().__init__()
+        import torch
+        from hydra.utils import get_class
+        from omegaconf import OmegaConf
+
+        self.device = select_device(device)
+        model_cfg = OmegaConf.load(str(files("f5_tts").joinpath(f"configs/{model}.yaml")))
+        self.model_cls = get_class(f"f5_tts.model.{model_cfg.model.backbone}")
+        self.model_arc = model_cfg.model.arch
+        self.mel_spec_type = model_cfg.model.mel_spec.mel_spec_type
+        self.sampling_rate = model_cfg.model.mel_spec.target_sample_rate
+
+        if not ckpt_file:
+            from huggingface_hub import hf_hub_download
+
+            ckpt_file = str(hf_hub_download(repo_id=DEFAULT_CKPT_REPO, filename=DEFAULT_CKPT_FILE))
+        if isinstance(dtype, str):
+            dtype = getattr(torch, dtype)
+
+        self.model = self.load_ema_model(ckpt_file, vocab_file, dtype)
+        self.vocoder = self.load_vocoder_model()
+        self.vocoder_stream = torch.cuda.Stream() if str(self.device).startswith("cuda") else None
+        self.audio, self.sr = None, None
+
+    def load_ema_model(self, ckpt_file, vocab_file, dtype):
+        from f5_tts.infer.utils_infer import load_model
+
+        return load_model(
+            self.model_cls,
+            self.model_arc,
+            ckpt_path=ckpt_file,
+            mel_spec_type=self.mel_spec_type,
+            vocab_file=vocab_file,
+            ode_method="euler",
+            use_ema=True,
+            device=self.device,
+        ).to(self.device, dtype=dtype)
+
+    def load_vocoder_model(self):
+        from f5_tts.infer.utils_infer import load_vocoder
+
+        return load_vocoder(vocoder_name=self.mel_spec_type, is_local=False, local_path=None, device=self.device)
+
+    def update_reference(self, ref_audio, ref_text):
+        import torch
+        import torchaudio
+        from f5_tts.infer.utils_infer import preprocess_ref_audio_text, target_rms, target_sample_rate
+
+        self.ref_audio, self.ref_text = preprocess_ref_audio_text(ref_audio, ref_text)
+        self.audio, self.sr = torchaudio.load(self.ref_audio)
+        self.ref_duration = self.audio.shape[-1] / self.sr
+
+        # Same reference preparation as infer_batch_process, done once per voice instead of per request
+        audio = self.audio
+        if audio.shape[0] > 1:
+            audio = torch.mean(audio, dim=0, keepdim=True)
+        self.ref_rms = torch.sqrt(torch.mean(torch.square(audio)))
+        if self.ref_rms < target_rms:
+            audio = audio * target_rms / self.ref_rms
+        if self.sr != target_sample_rate:
+            audio = torchaudio.transforms.Resample(self.sr, target_sample_rate)(audio)
+        self.cond_audio = audio.to(self.device)
+        if len(self.ref_text[-1].encode("utf-8")) == 1:
+            self.ref_text = self.ref_text + " "
+
+    def infer_mel(self, gen_text, nfe_step=DEFAULT_NFE_STEP, cfg_strength=2.0, sway_sampling_coef=-1, speed=1):
+        """Runs the transformer for one text batch and returns the generated mel (b, n_mels, frames)."""
+        import torch
+        from f5_tts.infer.utils_infer import hop_length
+        from f5_tts.model.utils import convert_char_to_pinyin
+
+        local_speed = speed
+        if len(gen_text.encode("utf-8")) < 10:
+            local_speed = 0.3
+
+        final_text_list = convert_char_to_pinyin([self.ref_text + gen_text])
+        ref_audio_len = self.cond_audio.shape[-1] // hop_length
+        ref_text_len = len(self.ref_text.encode("utf-8"))
+        gen_text_len = len(gen_text.encode("utf-8"))
+        duration = ref_audio_len + int(ref_audio_len / ref_text_len * gen_text_len / local_speed)
+
+        with torch.inference_mode():
+            generated, _ = self.model.sample(
+                cond=self.cond_audio,
+                text=final_text_list,
+                duration=duration,
+                steps=nfe_step,
+                cfg_strength=cfg_strength,
+                sway_sampling_coef=sway_sampling_coef,
+            )
+            del _
+            generated = generated.to(torch.float32)
+            return generated[:, ref_audio_len:, :].permute(0, 2, 1)
+
+    def vocode(self, mel):
+        """Turns a generated mel into a float32 NumPy waveform."""
+        import torch
+        from f5_tts.infer.utils_infer import target_rms
+
+        with torch.inference_mode():
+            if self.mel_spec_type == "vocos":
+                generated_wave = self.vocoder.decode(mel)
+            elif self.mel_spec_type == "bigvgan":
+                generated_wave = self.vocoder(mel)
+            if self.ref_rms < target_rms:
+                generated_wave = generated_wave * self.ref_rms / target_rms
+            return generated_wave.squeeze().cpu().numpy()
+
+    def release_memory(self):
+        import torch
+
+        if str(self.device).startswith("cuda"):
+            torch.cuda.empty_cache()  # Blocks freed by finished requests stay reserved by the caching allocator otherwise
+
+    def device_memory_bytes(self):
+        import torch
+
+        if str(self.device).startswith("cuda"):
+            return torch.cuda.memory_reserved(self.device)
+        return 0
+
+    def run_model(self, gen_text, cancel=None, on_stage=None, options=None):
+        import torch
+
+        start = time.perf_counter()
+        mel = self.infer_mel(gen_text, **(options or {}))
+        ready = None
+        if self.vocoder_stream is not None:
+            ready = torch.cuda.Event()
+            ready.record()  # The vocoder stream waits for this mel only, not for later model work
+        self._report_stage(on_stage, "model", start)
+        return mel, ready
+
+    def run_vocoder(self, features, on_stage=None):
+        import torch
+
+        mel, ready = features
+        start = time.perf_counter()
+        if ready is None:
+            generated_wave = self.vocode(mel)
+        else:
+            with torch.cuda.stream(self.vocoder_stream):
+                self.vocoder_stream.wait_event(ready)
+                mel.record_stream(self.vocoder_stream)
+                generated_wave = self.vocode(mel)
+        self._report_stage(on_stage, "vocoder", start)
+        return generated_wave
+
+
+class OnnxEngine(TTSEngine):
+    """
+    F5-TTS exported to ONNX and run with ONNX Runtime, mainly for faster CPU inference.
+
+    `onnx_dir` must contain the three graphs produced by the F5-TTS-ONNX export:
+    F5_Preprocess.onnx (reference audio + text ids -> initial noise and conditioning),
+    F5_Transformer.onnx (one ODE step, called nfe_step times) and
+    F5_Decode.onnx (mel -> int16 waveform, vocoder included).
+    """
+
+    name = "onnx"
+    supported_options = ("speed",)  # nfe_step, cfg_strength and the step schedule are fixed by the export
+
+    def __init__(self, onnx_dir, vocab_file="", nfe_step=32, speed=1.0, providers=None, num_threads=0):
+        super().__init__()
+        import onnxruntime as ort  # Optional dependency, only needed for this engine
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        providers = providers or ["CPUExecutionProvider"]
+
+        def open_session(name):
+            return ort.InferenceSession(os.path.join(onnx_dir, name), sess_options=options, providers=providers)
+
+        self.preprocess = open_session("F5_Preprocess.onnx")
+        self.transformer = open_session("F5_Transformer.onnx")
+        self.decode = open_session("F5_Decode.onnx")
+        self.preprocess_inputs = [i.name for i in self.preprocess.get_inputs()]
+        self.transformer_inputs = [i.name for i in self.transformer.get_inputs()]
+        self.decode_inputs = [i.name for i in self.decode.get_inputs()]
+
+        self.vocab = self._load_vocab(vocab_file or str(files("f5_tts").joinpath("infer/examples/vocab.txt")))
+        self.nfe_step = nfe_step
+        self.speed = speed
+        self.ref_int16 = None
+
+    @staticmethod
+    def _load_vocab(vocab_file):
+        with open(vocab_file, "r", encoding="utf-8") as f:
+            return {char[:-1]: i for i, char in enumerate(f)}
+
+    def _text_to_ids(self, text):
+        from f5_tts.model.utils import convert_char_to_pinyin
+
+        chars = convert_char_to_pinyin([text])[0]
+        return np.array([[self.vocab.get(c, 0) for c in chars]], dtype=np.int32)
+
+    def update_reference(self, ref_audio, ref_text):
+        import torch
+        import torchaudio
+        from f5_tts.infer.utils_infer import preprocess_ref_audio_text
+
+        self.ref_audio, self.ref_text = preprocess_ref_audio_text(ref_audio, ref_text)
+        audio, sr = torchaudio.load(self.ref_audio)
+        audio = torch.mean(audio, dim=0, keepdim=True)
+        if sr != self.sampling_rate:
+            audio = torchaudio.transforms.Resample(sr, self.sampling_rate)(audio)
+        self.ref_duration = audio.shape[-1] / self.sampling_rate
+        self.ref_int16 = (audio.clamp(-1.0, 1.0).numpy() * 32767).astype(np.int16).reshape(1, 1, -1)
+
+    def run_model(self, gen_text, cancel=None, on_stage=None, options=None):
+        from f5_tts.infer.utils_infer import hop_length
+
+        speed = (options or {}).get("speed", self.speed)
+        ref_audio_len = self.ref_int16.shape[-1] // hop_length + 1
+        ref_text_len = len(self.ref_text.encode("utf-8"))
+        gen_text_len = len(gen_text.encode("utf-8"))
+        max_duration = ref_audio_len + int(ref_audio_len / ref_text_len * gen_text_len / speed)
+
+        start = time.perf_counter()
+        pre_outputs = self.preprocess.run(None, dict(zip(
+            self.preprocess_inputs,
+            [self.ref_int16, self._text_to_ids(self.ref_text + gen_text), np.array([max_duration], dtype=np.int64)],
+        )))
+        noise, *conditioning, ref_signal_len = pre_outputs
+        for step in range(self.nfe_step):
+            if cancel is not None and cancel.cancelled:
+                return None
+            feeds = [noise, *conditioning, np.array([step], dtype=np.int32)]
+            noise = self.transformer.run(None, dict(zip(self.transformer_inputs, feeds)))[0]
+        self._report_stage(on_stage, "model", start)
+        return noise, ref_signal_len
+
+    def run_vocoder(self, features, on_stage=None):
+        start = time.perf_counter()
+        wave = self.decode.run(None, dict(zip(self.decode_inputs, features)))[0]
+        self._report_stage(on_stage, "vocoder", start)
+        return wave.reshape(-1).astype(np.float32) / 32768.0
+
+
+class StubEngine(TTSEngine):
+    """
+    Deterministic engine without model weights, for testing the server and its clients.
+
+    Each text batch becomes a tone whose pitch depends on the text and whose length is
+    proportional to the number of characters, so the same text always gives the same audio.
+    `rtf` paces generation like a real model (0 = as fast as possible), `vocoder_share` of it
+    being spent in the vocoder stage.
+    """
+
+    name = "stub"
+    supported_options = ("nfe_step", "speed")  # Fewer steps = less simulated model time, speed = shorter audio
+
+    def __init__(self, sampling_rate=24000, seconds_per_char=0.06, rtf=0.0, vocoder_share=0.2):
+        super().__init__()
+        self.sampling_rate = sampling_rate
+        self.seconds_per_char = seconds_per_char
+        self.rtf = rtf
+        self.vocoder_share = vocoder_share
+
+    def update_reference(self, ref_audio, ref_text):
+        self.ref_audio = ref_audio
+        self.ref_text = ref_text or "This is the stub reference voice."
+        self.ref_duration = 3.0
+
+    def chunk_text(self, text, max_chars):
+        """Same rule as f5_tts's chunk_text, which cannot be imported without torch."""
+        batches = []
+        for sentence in re.split(r"(?<=[;:,.!?])\s+", text.strip()):
+            if batches and len(f"{batches[-1]} {sentence}".encode("utf-8")) <= max_chars:
+                batches[-1] = f"{batches[-1]} {sentence}"
+            elif sentence:
+                batches.append(sentence)
+        return batches
+
+    def synthesize_batch(self, gen_text, speed=1.0):
+        num_samples = max(1, int(len(gen_text) * self.seconds_per_char * self.sampling_rate / speed))
+        frequency = 200.0 + zlib.crc32(gen_text.encode("utf-8")) % 400
+        t = np.arange(num_samples, dtype=np.float32) / self.sampling_rate
+        return (0.3 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+    def run_model(self, gen_text, cancel=None, on_stage=None, options=None):
+        options = options or {}
+        start = time.perf_counter()
+        wave = self.synthesize_batch(gen_text, options.get("speed", 1.0))
+        if self.rtf > 0:
+            step_seconds = self.rtf * (1 - self.vocoder_share) * len(wave) / self.sampling_rate / DEFAULT_NFE_STEP
+            for _ in range(options.get("nfe_step", DEFAULT_NFE_STEP)):  # Cancellable between steps, like the ODE loop
+                if cancel is not None and cancel.cancelled:
+                    return None
+                time.sleep(step_seconds)
+        self._report_stage(on_stage, "model", start)
+        return wave
+
+    def run_vocoder(self, features, on_stage=None):
+        start = time.perf_counter()
+        if self.rtf > 0:
+            time.sleep(self.rtf * self.vocoder_share * len(features) / self.sampling_rate)
+        self._report_stage(on_stage, "vocoder", start)
+        return features
+
+
+def default_ref_audio():
+    """The English example voice shipped with f5_tts, "" if f5_tts is not installed (stub engine)."""
+    try:
+        return str(files("f5_tts").joinpath("infer/examples/basic/basic_ref_en.wav"))
+    except ModuleNotFoundError:
+        return ""
+
+
+def add_engine_arguments(parser):
+    """Adds the model/engine options shared by socket_server.py and the offline tools."""
+    parser.add_argument(
+        "--model",
+        default="F5TTS_v1_Base",
+        help="The model name, e.g. F5TTS_v1_Base",
+    )
+    parser.add_argument(
+        "--ckpt_file",
+        default="",
+        help="Path to the model checkpoint file, leave empty to download the F5TTS_v1_Base checkpoint",
+    )
+    parser.add_argument(
+        "--vocab_file",
+        default="",
+        help="Path to the vocab file if customized",
+    )
+
+    parser.add_argument(
+        "--ref_audio",
+        default=default_ref_audio(),
+        help="Reference audio to provide model with speaker characteristics",
+    )
+    parser.add_argument(
+        "--ref_text",
+        default="",
+        help="Reference audio subtitle, leave empty to auto-transcribe",
+    )
+
+    parser.add_argument("--device", default=None, help="Device to run the model on")
+    parser.add_argument("--dtype", default="float16", help="Data type to use for model inference")
+
+    parser.add_argument(
+        "--engine",
+        choices=["torch", "onnx", "stub"],
+        default="torch",
+        help="Synthesis backend: F5 PyTorch model, exported ONNX graphs, or a deterministic stub without weights",
+    )
+    parser.add_argument("--onnx_dir", default="onnx", help="Directory holding the exported F5 ONNX graphs")
+    parser.add_argument("--onnx_threads", type=int, default=0, help="ONNX Runtime intra-op threads (0 = default)")
+    parser.add_argument("--stub_rtf", type=float, default=0.0, help="Real-time factor simulated by the stub engine")
+
+
+def create_engine(args):
+    """Builds the engine selected by the socket_server.py command line."""
+    if args.engine == "stub":
+        return StubEngine(rtf=args.stub_rtf)
+    if args.engine == "onnx":
+        return OnnxEngine(args.onnx_dir, vocab_file=args.vocab_file, num_threads=args.onnx_threads)
+    return F5TorchEngine(args.model, args.ckpt_file, args.vocab_file, device=args.device, dtype=args.dtype)
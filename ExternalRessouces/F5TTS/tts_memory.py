@@ -0,0 +1,170 @@
+# tts_memory.py
+# Memory accounting of socket_server.py for long-running use (a whole school day without restart).
+# A MemoryGuard samples the resident size of the process (and the engine's accelerator memory),
+# periodically hands freed memory back to the system (gc, the engine's allocator cache, glibc's
+# malloc_trim), and above a high watermark sheds new requests until memory comes back down:
+# background priorities first (--memory_high_mb), every request past the hard limit (--memory_limit_mb).
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastAPI"))
+import tts_metrics  # noqa: E402
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+RESIDENT_BYTES = tts_metrics.REGISTRY.gauge("tts_process_resident_bytes", "Resident memory of the server process.")
+DEVICE_BYTES = tts_metrics.REGISTRY.gauge("tts_device_memory_bytes", "Accelerator memory held by the engine (in use or cached).")
+PRESSURE = tts_metrics.REGISTRY.gauge(
+    "tts_memory_pressure", "0 = normal, 1 = over the high watermark (background requests shed), 2 = over the limit (all shed).")
+TRIMS = tts_metrics.REGISTRY.counter("tts_memory_trims_total", "Memory trims by reason (periodic, watermark, requested).", ("reason",))
+TRIMMED_BYTES = tts_metrics.REGISTRY.counter("tts_memory_trimmed_bytes_total", "Resident memory given back by trims.")
+SHED = tts_metrics.REGISTRY.counter("tts_requests_shed_total", "Requests refused because of memory pressure.", ("priority",))
+
+NORMAL, HIGH, LIMIT = 0, 1, 2
+HYSTERESIS = 0.9  # A level is left once memory is back under this fraction of its threshold
+WATERMARK_TRIM_GAP = 10.0  # Seconds between trims while over a threshold, a full gc pass is not free
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        path = ctypes.util.find_library("c") if sys.platform.startswith("linux") else None
+        try:
+            _libc = ctypes.CDLL(path) if path else False
+        except OSError:
+            _libc = False
+        if _libc and not hasattr(_libc, "malloc_trim"):
+            _libc = False  # musl
+    return _libc
+
+
+def resident_bytes():
+    """Current resident set size of this process, or 0 if it cannot be read."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def trim_process_memory(engine=None):
+    """Collects garbage, empties the engine's allocator cache and returns free heap pages to the system."""
+    gc.collect()
+    if engine is not None:
+        engine.release_memory()
+    libc = _load_libc()
+    if libc:
+        libc.malloc_trim(0)
+
+
+class MemoryGuard:
+    """
+    Samples memory every `sample_interval` seconds in a daemon thread. Trims every `trim_interval`
+    seconds, and when over a threshold (at most once per WATERMARK_TRIM_GAP seconds).
+    should_shed(priority) tells the server whether to refuse a new request. 0 disables a threshold.
+    """
+
+    def __init__(self, engine=None, high_bytes=0, limit_bytes=0, trim_interval=300.0, sample_interval=1.0):
+        self.engine = engine
+        self.high_bytes = high_bytes
+        self.limit_bytes = limit_bytes
+        self.trim_interval = trim_interval
+        self.sample_interval = sample_interval
+        self.level = NORMAL
+        self.resident = 0
+        self.peak = 0
+        self.last_trim = time.monotonic()
+        self.stop_event = threading.Event()
+        PRESSURE.set_function(lambda: self.level)
+
+    def sample(self):
+        self.resident = resident_bytes()
+        self.peak = max(self.peak, self.resident)
+        RESIDENT_BYTES.set(self.resident)
+        if self.engine is not None:
+            DEVICE_BYTES.set(self.engine.device_memory_bytes())
+        return self.resident
+
+    def trim(self, reason):
+        before = self.sample()
+        trim_process_memory(self.engine)
+        after = self.sample()
+        self.last_trim = time.monotonic()
+        TRIMS.inc(reason=reason)
+        TRIMMED_BYTES.inc(max(0, before - after))
+        logger.debug(f"Memory trim ({reason}): {before / 1e6:.0f} MB -> {after / 1e6:.0f} MB")
+        return after
+
+    def _level_for(self, resident):
+        """Level after a sample, with hysteresis so the server does not flap around a threshold."""
+        if self.limit_bytes and resident >= self.limit_bytes:
+            return LIMIT
+        if self.level == LIMIT and self.limit_bytes and resident >= self.limit_bytes * HYSTERESIS:
+            return LIMIT
+        if self.high_bytes and resident >= self.high_bytes:
+            return HIGH
+        if self.level >= HIGH and self.high_bytes and resident >= self.high_bytes * HYSTERESIS:
+            return HIGH
+        return NORMAL
+
+    def check(self):
+        """One sampling step, also called by tests."""
+        resident = self.sample()
+        since_trim = time.monotonic() - self.last_trim
+        if self.trim_interval and since_trim >= self.trim_interval:
+            resident = self.trim("periodic")
+        elif self._level_for(resident) > NORMAL and since_trim >= WATERMARK_TRIM_GAP:
+            resident = self.trim("watermark")
+        level = self._level_for(resident)
+        if level != self.level:
+            log = logger.warning if level > self.level else logger.info
+            log(f"Memory pressure {self.level} -> {level} at {resident / 1e6:.0f} MB "
+                f"(high {self.high_bytes / 1e6:.0f} MB, limit {self.limit_bytes / 1e6:.0f} MB)")
+            self.level = level
+
+    def should_shed(self, priority):
+        """True if a new request of `priority` must be refused at the current memory level."""
+        shed = self.level == LIMIT or (self.level == HIGH and priority != "interactive")
+        if shed:
+            SHED.inc(priority=priority)
+        return shed
+
+    def _run(self):
+        while not self.stop_event.wait(self.sample_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Memory guard check failed: {e}")
+
+    def start(self):
+        self.sample()
+        threading.Thread(target=self._run, name="memory-guard", daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        return {
+            "resident_bytes": self.resident,
+            "peak_resident_bytes": self.peak,
+            "device_bytes": self.engine.device_memory_bytes() if self.engine is not None else 0,
+            "level": self.level,
+            "high_bytes": self.high_bytes,
+            "limit_bytes": self.limit_bytes,
+            "seconds_since_trim": time.monotonic() - self.last_trim,
+        }
@@ -0,0 +1,148 @@
+# tts_protocol.py
+# Wire format of the synthesis socket (port 9998), shared by the server and its tools.
+#
+# Client -> server: either plain UTF-8 text (the original format, used by the Unity clients)
+# or a JSON object {"text": "...", "priority": "interactive", "client_id": "...", "request_id": "..."}.
+# request_id lets a caller (the gateway) follow its request through the server's traces.
+# The JSON form may also carry inference options (SYNTHESIS_OPTIONS): {"nfe_step": 16, "speed": 1.2, ...};
+# the ones left out keep the engine's defaults, out-of-range values make the request invalid.
+# A client may send CANCEL while audio is streaming to stop it.
+# Server -> client: raw float32 samples, then END.
+#
+# Same-host clients may instead receive the audio through a shared-memory ring (fastAPI/tts_shm_ring.py):
+# right after connecting they send {"shm_attach": "<ring name>"}, the server answers SHM_OK (or
+# SHM_FAILED and keeps streaming on the socket). From then on every response on the connection is a
+# sequence of SHM_RECORD (position, length) of audio written to the ring, length 0 marking the end.
+import json
+import struct
+import time
+
+END_MESSAGE = b"END"
+CANCEL_MESSAGE = b"CANCEL"  # Sent by a client to stop the stream it is receiving (barge-in)
+
+SHM_ATTACH_KEY = "shm_attach"
+SHM_ATTACH_OK = b"SHM_OK"
+SHM_ATTACH_FAILED = b"SHM_FAILED"
+SHM_RECORD = struct.Struct("<QI")
+
+PRIORITIES = ("interactive", "prefetch", "batch")  # Highest priority first
+DEFAULT_PRIORITY = "interactive"
+
+# Inference options a request may set: name -> (type, minimum, maximum). The server may narrow the
+# range (socket_server.py --min_nfe_step / --max_nfe_step).
+SYNTHESIS_OPTIONS = {
+    "nfe_step": (int, 4, 64),  # ODE steps of the flow-matching sampler, the main speed/quality trade-off
+    "cfg_strength": (float, 0.0, 5.0),  # Classifier-free guidance
+    "sway_sampling_coef": (float, -1.0, 1.0),  # Time step schedule, negative = more steps early
+    "speed": (float, 0.5, 2.0),  # Speaking rate
+}
+
+
+class ProtocolError(Exception):
+    """Raised when a request message cannot be understood."""
+    pass
+
+
+class SynthesisRequest:
+    """One text to synthesize, with the scheduling information that came with it."""
+
+    def __init__(self, text, client_id="", priority=DEFAULT_PRIORITY, request_id="", options=None):
+        if priority not in PRIORITIES:
+            raise ProtocolError(f"Unknown priority '{priority}', expected one of {PRIORITIES}")
+        self.text = text
+        self.client_id = client_id
+        self.priority = priority
+        self.request_id = request_id
+        self.options = options or {}  # Validated SYNTHESIS_OPTIONS, only those the client set
+        self.cancel_token = None  # Set by the server once the request starts streaming
+        self.trace = None  # Set by the server, spans of this request
+        self.received_at = time.perf_counter()
+
+    @property
+    def priority_rank(self):
+        return PRIORITIES.index(self.priority)
+
+    def __repr__(self):
+        return f"SynthesisRequest(client={self.client_id!r}, priority={self.priority}, text={self.text[:30]!r})"
+
+
+def is_incomplete_json(data: bytes) -> bool:
+    """True if `data` starts a JSON request whose end has not been received yet."""
+    stripped = data.lstrip()
+    if not stripped.startswith(b"{"):
+        return False
+    try:
+        json.loads(stripped.decode("utf-8"))
+        return False
+    except (ValueError, UnicodeDecodeError):
+        return True
+
+
+def parse_shm_attach(data: bytes):
+    """Returns the ring name if `data` is a shared-memory attach message, otherwise None."""
+    stripped = data.strip()
+    if not stripped.startswith(b"{") or SHM_ATTACH_KEY.encode() not in stripped:
+        return None
+    try:
+        message = json.loads(stripped.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    name = message.get(SHM_ATTACH_KEY) if isinstance(message, dict) else None
+    return name if isinstance(name, str) and "text" not in message else None
+
+
+def parse_options(message: dict, limits=None) -> dict:
+    """
+    The SYNTHESIS_OPTIONS set in `message`, checked against `limits` (same layout, defaults to
+    SYNTHESIS_OPTIONS). Raises ProtocolError for a wrong type or a value out of range.
+    """
+    limits = limits or SYNTHESIS_OPTIONS
+    options = {}
+    for name, (kind, minimum, maximum) in limits.items():
+        value = message.get(name)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or (kind is int and value != int(value)):
+            raise ProtocolError(f"'{name}' must be a{'n integer' if kind is int else ' number'}, got {value!r}")
+        value = kind(value)
+        if not minimum <= value <= maximum:
+            raise ProtocolError(f"'{name}' must be between {minimum} and {maximum}, got {value}")
+        options[name] = value
+    return options
+
+
+def parse_request(data: bytes, client_id="", option_limits=None) -> SynthesisRequest:
+    """Turns a received message (plain text or JSON) into a SynthesisRequest. Raises ProtocolError for no text."""
+    data_str = data.decode("utf-8").strip()
+    if not data_str:
+        raise ProtocolError("empty text")
+    if not data_str.startswith("{"):
+        return SynthesisRequest(data_str, client_id=client_id)
+    try:
+        message = json.loads(data_str)
+    except ValueError as e:
+        raise ProtocolError(f"Invalid JSON request: {e}")
+    if not isinstance(message, dict) or not isinstance(message.get("text"), str):
+        raise ProtocolError("JSON request must be an object with a 'text' string")
+    if not message["text"].strip():
+        raise ProtocolError("empty text")
+    return SynthesisRequest(
+        message["text"].strip(),
+        client_id=str(message.get("client_id") or client_id),
+        priority=message.get("priority", DEFAULT_PRIORITY),
+        request_id=str(message.get("request_id") or ""),
+        options=parse_options(message, option_limits),
+    )
+
+
+def encode_request(text, priority=DEFAULT_PRIORITY, client_id=None, request_id=None, options=None) -> bytes:
+    """Encodes a request for the server. Plain text is kept when no option is needed."""
+    if priority == DEFAULT_PRIORITY and client_id is None and request_id is None and not options:
+        return text.encode("utf-8")
+    message = {"text": text, "priority": priority}
+    if client_id is not None:
+        message["client_id"] = client_id
+    if request_id is not None:
+        message["request_id"] = request_id
+    message.update(options or {})
+    return json.dumps(message).encode("utf-8")
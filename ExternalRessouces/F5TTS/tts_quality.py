@@ -0,0 +1,136 @@
+# tts_quality.py
+# Real-time guard of socket_server.py: trades quality for speed when the engine stops keeping up.
+# Each streamed text batch reports how long its audio took to produce (turn wait + model + vocoder,
+# what the client waits for) against how long it plays. When that real-time factor nears 1.0, or
+# requests pile up in the scheduler, new batches get fewer ODE steps (nfe_step) and connections
+# open with longer text batches; both are restored one level at a time once the load has dropped.
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastAPI"))
+import tts_metrics  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+RECENT_RTF = tts_metrics.REGISTRY.gauge(
+    "tts_recent_real_time_factor", "Smoothed production time / audio duration of the last text batches.")
+QUALITY_LEVEL = tts_metrics.REGISTRY.gauge("tts_quality_level", "Real-time guard level, 0 = full quality.")
+QUALITY_NFE_STEP = tts_metrics.REGISTRY.gauge("tts_quality_nfe_step", "Most ODE steps new text batches may use.")
+QUALITY_CHUNK_SCALE = tts_metrics.REGISTRY.gauge(
+    "tts_quality_chunk_scale", "Factor applied to the short opening text batches of a connection.")
+QUALITY_CHANGES = tts_metrics.REGISTRY.counter(
+    "tts_quality_changes_total", "Real-time guard level changes (degrade, restore).", ("direction",))
+
+NFE_LADDER = (64, 48, 32, 24, 16, 12, 8, 6, 4)  # Steps tried in turn, cut to the configured bounds
+SMOOTHING = 0.3  # Weight of the newest batch in the smoothed real-time factor
+SETTLE_BATCHES = 3  # Batches measured at a level before it may change again
+IDLE_RESET = 10.0  # Seconds without batches after which full quality is restored
+
+
+class QualityLevel(collections.namedtuple("QualityLevel", "nfe_step chunk_scale")):
+    """Settings of one guard level: the ODE step cap and the factor on the opening batch sizes."""
+
+
+def build_levels(top_nfe_step, min_nfe_step, max_chunk_scale):
+    """Levels from full quality (top_nfe_step, scale 1) down to min_nfe_step and max_chunk_scale."""
+    steps = [top_nfe_step] + [step for step in NFE_LADDER if min_nfe_step <= step < top_nfe_step]
+    if len(steps) == 1:
+        steps.append(top_nfe_step)  # nfe_step is fixed, the chunk size still has a level to go to
+    last = len(steps) - 1
+    return [QualityLevel(step, 1.0 + (max_chunk_scale - 1.0) * index / last) for index, step in enumerate(steps)]
+
+
+class RealTimeGuard:
+    """
+    Steps one level down when the smoothed real-time factor reaches `high`, or when `max_queue_depth`
+    requests wait for the engine; steps one level up when the factor expected at the level above
+    stays under `low`. `queue_depth` is a callable (the scheduler's). Level changes are logged,
+    counted, kept in `events` and passed to `on_event(name, **args)`.
+    """
+
+    def __init__(self, levels, high=0.8, low=0.5, max_queue_depth=4, queue_depth=None, on_event=None):
+        self.levels = levels
+        self.high = high
+        self.low = low
+        self.max_queue_depth = max_queue_depth
+        self.queue_depth = queue_depth or (lambda: 0)
+        self.on_event = on_event
+        self.level = 0
+        self.rtf = None
+        self.batches_at_level = 0
+        self.last_batch = time.monotonic()
+        self.events = collections.deque(maxlen=100)
+        self.lock = threading.Lock()
+        QUALITY_LEVEL.set_function(lambda: self.level)
+        QUALITY_NFE_STEP.set_function(lambda: self.current().nfe_step)
+        QUALITY_CHUNK_SCALE.set_function(lambda: self.current().chunk_scale)
+
+    def current(self):
+        """Settings for new batches, full quality again if the engine has been idle."""
+        with self.lock:
+            if self.level and time.monotonic() - self.last_batch >= IDLE_RESET:
+                self._change(0, "idle")
+                self.rtf = None
+            return self.levels[self.level]
+
+    def _cost_ratio(self, above, below):
+        """Rough cost of level `above` relative to `below`, assuming the whole batch time scales with nfe_step."""
+        return self.levels[above].nfe_step / self.levels[below].nfe_step
+
+    def observe(self, seconds, audio_seconds):
+        """Records one text batch: `seconds` to produce `audio_seconds` of audio. May change the level."""
+        if audio_seconds <= 0:
+            return
+        with self.lock:
+            rtf = seconds / audio_seconds
+            self.rtf = rtf if self.rtf is None else SMOOTHING * rtf + (1 - SMOOTHING) * self.rtf
+            self.last_batch = time.monotonic()
+            self.batches_at_level += 1
+            RECENT_RTF.set(self.rtf)
+            if self.batches_at_level < SETTLE_BATCHES:
+                return
+            depth = self.queue_depth()
+            if self.level < len(self.levels) - 1 and (self.rtf >= self.high or depth >= self.max_queue_depth):
+                reason = "real_time_factor" if self.rtf >= self.high else "queue_depth"
+                self._change(self.level + 1, reason, depth)
+                self.rtf *= self._cost_ratio(self.level, self.level - 1)  # Expected at the new level
+            elif (self.level > 0 and depth < self.max_queue_depth
+                  and self.rtf * self._cost_ratio(self.level - 1, self.level) < self.low):
+                self._change(self.level - 1, "recovered", depth)
+                self.rtf *= self._cost_ratio(self.level, self.level + 1)
+
+    def _change(self, level, reason, depth=0):
+        previous, self.level = self.level, level
+        self.batches_at_level = 0
+        settings = self.levels[level]
+        direction = "degrade" if level > previous else "restore"
+        event = {
+            "time": time.time(), "direction": direction, "reason": reason, "from_level": previous, "level": level,
+            "nfe_step": settings.nfe_step, "chunk_scale": round(settings.chunk_scale, 2),
+            "real_time_factor": round(self.rtf, 3) if self.rtf is not None else None, "queue_depth": depth,
+        }
+        self.events.append(event)
+        QUALITY_CHANGES.inc(direction=direction)
+        log = logger.warning if direction == "degrade" else logger.info
+        log(f"Quality {direction} ({reason}): level {previous} -> {level}, nfe_step {settings.nfe_step}, "
+            f"chunk scale {settings.chunk_scale:.2f}, real-time factor {event['real_time_factor']}, queue {depth}")
+        if self.on_event is not None:
+            self.on_event(f"quality_{direction}", **event)
+
+    def stats(self):
+        settings = self.current()
+        return {
+            "level": self.level,
+            "levels": [level._asdict() for level in self.levels],
+            "nfe_step": settings.nfe_step,
+            "chunk_scale": settings.chunk_scale,
+            "real_time_factor": self.rtf,
+            "queue_depth": self.queue_depth(),
+            "high": self.high,
+            "low": self.low,
+            "events": list(self.events),
+        }
@@ -0,0 +1,96 @@
+# tts_scheduler.py
+import collections
+import logging
+import threading
+
+from tts_protocol import PRIORITIES
+
+logger = logging.getLogger(__name__)
+
+
+class SynthesisScheduler:
+    """
+    Shares one engine between concurrent requests, one text batch at a time.
+
+    Before each text batch a request calls acquire() and waits for its turn; after the
+    batch it calls release(). Turns go to the highest priority class with waiting work
+    (interactive > prefetch > batch). Within a class, clients are served round-robin, so
+    a long narration yields to a short reply from another client between its batches.
+    """
+
+    def __init__(self, poll_interval=0.1):
+        self.condition = threading.Condition()
+        self.poll_interval = poll_interval
+        # priority -> ring of client ids waiting, client id -> FIFO of that client's requests
+        self.rings = {priority: collections.deque() for priority in PRIORITIES}
+        self.waiting = {priority: {} for priority in PRIORITIES}
+        self.active = None
+
+    def queue_depth(self):
+        """Number of requests waiting for a turn."""
+        with self.condition:
+            return sum(len(q) for waiting in self.waiting.values() for q in waiting.values())
+
+    def _enqueue(self, request):
+        waiting = self.waiting[request.priority]
+        if request.client_id not in waiting:
+            waiting[request.client_id] = collections.deque()
+            self.rings[request.priority].append(request.client_id)
+        waiting[request.client_id].append(request)
+
+    def _remove(self, request):
+        waiting = self.waiting[request.priority]
+        requests = waiting.get(request.client_id)
+        if requests is None or request not in requests:
+            return
+        requests.remove(request)
+        if not requests:
+            del waiting[request.client_id]
+            self.rings[request.priority].remove(request.client_id)
+
+    def _next(self):
+        """The request whose turn it is, or None."""
+        for priority in PRIORITIES:
+            ring = self.rings[priority]
+            if ring:
+                return self.waiting[priority][ring[0]][0]
+        return None
+
+    def _pop_next(self):
+        for priority in PRIORITIES:
+            ring = self.rings[priority]
+            if ring:
+                client_id = ring.popleft()
+                requests = self.waiting[priority][client_id]
+                request = requests.popleft()
+                if requests:
+                    ring.append(client_id)  # Client keeps its place, behind the others of its class
+                else:
+                    del self.waiting[priority][client_id]
+                return request
+        return None
+
+    def acquire(self, request):
+        """
+        Blocks until it is `request`'s turn to use the engine.
+        Returns False, without taking the turn, if the request is cancelled while waiting.
+        """
+        cancel_token = request.cancel_token
+        with self.condition:
+            self._enqueue(request)
+            while self.active is not None or self._next() is not request:
+                if cancel_token is not None and cancel_token.cancelled:
+                    self._remove(request)
+                    self.condition.notify_all()
+                    return False
+                self.condition.wait(self.poll_interval)
+            self._pop_next()
+            self.active = request
+            return True
+
+    def release(self, request):
+        """Gives the engine back after a text batch."""
+        with self.condition:
+            if self.active is request:
+                self.active = None
+            self.condition.notify_all()
@@ -0,0 +1,196 @@
+# tts_tracing.py
+# Request-scoped trace spans for socket_server.py and on-demand profiling of the next N requests.
+# Spans and captures are exported in the Chrome trace event format (chrome://tracing, Perfetto).
+import collections
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+
+class Trace:
+    """
+    Timed spans of one request, each shown on the row of the thread that ran it (the connection
+    thread, or the model thread of a pipelined request).
+    Stages timed by someone else (the engine's on_stage callback) are added with add_span.
+    """
+
+    def __init__(self, request_id=None, start=None, **attributes):
+        self.request_id = request_id or new_request_id()
+        self.attributes = attributes
+        self.start = start if start is not None else time.perf_counter()
+        self.end = None
+        self.thread_id = threading.get_ident()
+        self.spans = []  # (name, start, duration, args, thread id)
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter() - start, **args)
+
+    def add_span(self, name, start, duration, **args):
+        with self.lock:
+            self.spans.append((name, start, duration, args, threading.get_ident()))
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    def totals(self):
+        """Seconds spent per span name."""
+        totals = collections.defaultdict(float)
+        with self.lock:
+            for name, _, duration, _, _ in self.spans:
+                totals[name] += duration
+        return dict(totals)
+
+    def summary(self):
+        parts = [f"{name}={seconds * 1000:.0f}ms" for name, seconds in sorted(self.totals().items(), key=lambda x: -x[1])]
+        return f"request {self.request_id} took {self.duration * 1000:.0f}ms: " + " ".join(parts)
+
+    def chrome_events(self, pid=1):
+        """Complete ("X") events, timestamps in microseconds since the process' perf_counter origin."""
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": self.thread_id,
+             "args": {"name": f"connection thread {self.thread_id}"}},
+            {"name": "request", "ph": "X", "pid": pid, "tid": self.thread_id,
+             "ts": self.start * 1e6, "dur": self.duration * 1e6,
+             "args": dict(self.attributes, request_id=self.request_id)},
+        ]
+        with self.lock:
+            spans = list(self.spans)
+        for thread_id in sorted({span[4] for span in spans} - {self.thread_id}):
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                           "args": {"name": f"model thread {thread_id}"}})
+        for name, start, duration, args, thread_id in spans:
+            events.append({
+                "name": name, "ph": "X", "pid": pid, "tid": thread_id,
+                "ts": start * 1e6, "dur": duration * 1e6,
+                "args": dict(args, request_id=self.request_id),
+            })
+        return events
+
+
+def write_chrome_trace(path, traces):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": [event for trace in traces for event in trace.chrome_events()]}, f)
+
+
+class TraceLog:
+    """Keeps the last finished traces (and server events) and logs the breakdown of slow ones."""
+
+    def __init__(self, maxlen=200, slow_ms=0):
+        self.traces = collections.deque(maxlen=maxlen)
+        self.events = collections.deque(maxlen=maxlen)  # Instant events, not tied to a request
+        self.slow_ms = slow_ms
+
+    def record(self, trace):
+        trace.finish()
+        self.traces.append(trace)
+        if self.slow_ms and trace.duration * 1000 >= self.slow_ms:
+            logger.warning(f"Slow {trace.summary()}")
+        else:
+            logger.debug(trace.summary())
+
+    def add_event(self, name, **args):
+        """A server-wide instant event (e.g. a quality change), drawn across the timeline."""
+        self.events.append({"name": name, "ph": "i", "s": "g", "pid": 1, "tid": 0,
+                            "ts": time.perf_counter() * 1e6, "args": args})
+
+    def chrome_trace_json(self):
+        events = [event for trace in list(self.traces) for event in trace.chrome_events()]
+        return json.dumps({"traceEvents": events + list(self.events)})
+
+
+class ProfileCapture:
+    """
+    On-demand profiling: once armed, the next N requests run under cProfile (and the torch
+    profiler if asked). Each captured request writes to `output_dir`:
+      <request_id>_<ms>.trace.json  its spans, Chrome trace format
+      <request_id>_<ms>.prof        cProfile stats (python -m pstats, snakeviz)
+      <request_id>_<ms>.torch.json  torch profiler Chrome trace, when enabled
+    Only one request is profiled at a time; requests arriving meanwhile run normally.
+    """
+
+    def __init__(self, output_dir="profiles"):
+        self.output_dir = output_dir
+        self.remaining = 0
+        self.use_torch = False
+        self.lock = threading.Lock()
+        self.active = False
+
+    def arm(self, requests, use_torch=False):
+        with self.lock:
+            self.remaining = max(0, int(requests))
+            self.use_torch = use_torch
+        logger.info(f"Profiling armed for the next {self.remaining} request(s), torch profiler: {use_torch}")
+        return {"remaining": self.remaining, "torch": use_torch, "output_dir": os.path.abspath(self.output_dir)}
+
+    def _claim(self):
+        with self.lock:
+            if self.remaining <= 0 or self.active:
+                return False
+            self.remaining -= 1
+            self.active = True
+            return True
+
+    @contextlib.contextmanager
+    def capture(self, trace):
+        """Profiles the enclosed block if a capture is armed, then writes its files."""
+        if not self._claim():
+            yield
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        # A gateway call sends one request per sentence, all with the same id
+        base = os.path.join(self.output_dir, f"{trace.request_id}_{int(time.time() * 1000)}")
+        torch_profiler = self._start_torch_profiler() if self.use_torch else None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            try:
+                profiler.dump_stats(base + ".prof")
+                if torch_profiler is not None:
+                    torch_profiler.stop()
+                    torch_profiler.export_chrome_trace(base + ".torch.json")
+                trace.finish()
+                write_chrome_trace(base + ".trace.json", [trace])
+                logger.info(f"Profile of request {trace.request_id} written to {base}.*")
+            except Exception as e:
+                logger.error(f"Could not write the profile of request {trace.request_id}: {e}")
+            finally:
+                with self.lock:
+                    self.active = False
+
+    @staticmethod
+    def _start_torch_profiler():
+        try:
+            import torch
+        except ImportError:
+            logger.warning("torch is not installed, only cProfile is captured.")
+            return None
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        profiler = torch.profiler.profile(activities=activities)
+        profiler.start()
+        return profiler
@@ -0,0 +1,283 @@
+# tts_workers.py
+# Multi-process mode of socket_server.py (--workers N). The supervisor only accepts connections:
+# each one is handed to the least-loaded of N worker processes, and every worker owns its own
+# engine and TTSStreamingProcessor, pinned to a device and/or a set of CPU cores.
+# Connections travel as file descriptors over a Unix socketpair (socket.send_fds), so the worker
+# talks to the client directly and no audio goes through the supervisor. Crashed workers are restarted.
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from multiprocessing.connection import wait
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastAPI"))
+import tts_metrics  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Worker -> supervisor messages
+READY_MESSAGE = b"R"  # Processor loaded, connections can be sent
+DONE_MESSAGE = b"D"  # One connection closed
+
+WORKERS_READY = tts_metrics.REGISTRY.gauge("tts_pool_workers_ready", "Worker processes ready to take connections.")
+WORKER_CONNECTIONS = tts_metrics.REGISTRY.gauge(
+    "tts_pool_worker_connections", "Connections currently served by each worker process.", ("worker",))
+WORKER_RESTARTS = tts_metrics.REGISTRY.counter(
+    "tts_pool_worker_restarts_total", "Worker processes restarted after exiting.", ("worker",))
+
+
+def is_supported():
+    return hasattr(socket, "send_fds") and hasattr(socket, "AF_UNIX")
+
+
+def parse_cpu_list(spec):
+    """'0-3,8' -> [0, 1, 2, 3, 8]"""
+    cpus = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def parse_cpu_sets(spec, num_workers):
+    """
+    CPU cores of each worker: "" = no pinning, "auto" = the cores this process may use, split evenly,
+    or one list per worker separated by ';' ("0-3;4-7").
+    """
+    if not spec:
+        return [None] * num_workers
+    if spec == "auto":
+        available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+        if len(available) < num_workers:
+            raise ValueError(f"{num_workers} workers cannot be pinned to {len(available)} cores")
+        size, extra = divmod(len(available), num_workers)
+        sets, start = [], 0
+        for index in range(num_workers):
+            end = start + size + (1 if index < extra else 0)
+            sets.append(available[start:end])
+            start = end
+        return sets
+    sets = [parse_cpu_list(part) for part in spec.split(";")]
+    if len(sets) != num_workers:
+        raise ValueError(f"--worker_cpus lists {len(sets)} core sets for {num_workers} workers")
+    return sets
+
+
+def run_worker(index, control, start_worker, handle_client, args, device=None, cpus=None):
+    """
+    Entry point of a worker process. `start_worker(args, index)` builds the processor,
+    `handle_client(conn, addr, processor)` serves one connection (both from socket_server.py).
+    """
+    if cpus:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)
+        try:
+            import torch
+            torch.set_num_threads(len(cpus))  # One intra-op thread per pinned core instead of per machine core
+        except ImportError:
+            pass
+        if getattr(args, "onnx_threads", 0) == 0:
+            args.onnx_threads = len(cpus)
+    if device:
+        args.device = device
+    processor = start_worker(args, index)
+    logger.info(f"Worker {index} (pid {os.getpid()}) ready, device {device or 'default'}, cores {cpus or 'all'}")
+    control.send(READY_MESSAGE)
+
+    send_lock = threading.Lock()
+
+    def serve(conn, addr):
+        try:
+            handle_client(conn, addr, processor)
+        finally:
+            with send_lock:
+                control.send(DONE_MESSAGE)
+
+    while True:
+        message, fds, _, _ = socket.recv_fds(control, 1024, 1)
+        if not message:
+            break  # The supervisor is gone
+        addr = json.loads(message)
+        conn = socket.socket(fileno=fds[0])
+        threading.Thread(target=serve, args=(conn, tuple(addr) if isinstance(addr, list) else addr), daemon=True).start()
+
+
+class WorkerHandle:
+    """Supervisor-side state of one worker process."""
+
+    def __init__(self, index, device=None, cpus=None):
+        self.index = index
+        self.device = device
+        self.cpus = cpus
+        self.process = None
+        self.control = None
+        self.control_open = False
+        self.ready = False
+        self.connections = 0
+        self.started_at = 0.0
+        self.crashes = 0  # Consecutive short-lived runs, sets the restart backoff
+        self.restart_at = None
+
+    def status(self):
+        return {
+            "worker": self.index,
+            "pid": self.process.pid if self.process is not None else None,
+            "ready": self.ready,
+            "connections": self.connections,
+            "device": self.device,
+            "cpus": self.cpus,
+        }
+
+
+class WorkerPool:
+    """
+    Starts `num_workers` processes running run_worker and dispatches connections to the ready
+    worker with the fewest open connections. A worker that exits is restarted after a backoff
+    that doubles while it keeps dying within `stable_seconds` of starting.
+    """
+
+    def __init__(self, start_worker, handle_client, args, num_workers, devices=(), cpu_sets=None,
+                 restart_backoff=1.0, max_backoff=30.0, stable_seconds=60.0):
+        self.start_worker = start_worker
+        self.handle_client = handle_client
+        self.args = args
+        self.restart_backoff = restart_backoff
+        self.max_backoff = max_backoff
+        self.stable_seconds = stable_seconds
+        self.context = multiprocessing.get_context("spawn")  # CUDA cannot be initialized again in a forked child
+        self.condition = threading.Condition()
+        cpu_sets = cpu_sets or [None] * num_workers
+        self.workers = [
+            WorkerHandle(index, devices[index % len(devices)] if devices else None, cpu_sets[index])
+            for index in range(num_workers)
+        ]
+        self.stopped = False
+        WORKERS_READY.set_function(lambda: sum(worker.ready for worker in self.workers))
+
+    def start(self):
+        for worker in self.workers:
+            self._spawn(worker)
+        threading.Thread(target=self._monitor, daemon=True).start()
+
+    def _spawn(self, worker):
+        parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        process = self.context.Process(
+            target=run_worker,
+            args=(worker.index, child, self.start_worker, self.handle_client, self.args, worker.device, worker.cpus),
+            name=f"tts-worker-{worker.index}",
+            daemon=True,
+        )
+        process.start()
+        child.close()
+        with self.condition:
+            worker.process = process
+            worker.control = parent
+            worker.control_open = True
+            worker.ready = False
+            worker.connections = 0
+            worker.started_at = time.monotonic()
+            worker.restart_at = None
+        WORKER_CONNECTIONS.set(0, worker=worker.index)
+        logger.info(f"Started worker {worker.index} (pid {process.pid})")
+
+    def _read_messages(self, worker):
+        while True:
+            try:
+                message = worker.control.recv(64, socket.MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                return True
+            except OSError:
+                return False
+            if not message:
+                return False  # Worker closed its end, its sentinel follows
+            with self.condition:
+                if message == READY_MESSAGE:
+                    worker.ready = True
+                elif message == DONE_MESSAGE:
+                    worker.connections = max(0, worker.connections - 1)
+                self.condition.notify_all()
+            WORKER_CONNECTIONS.set(worker.connections, worker=worker.index)
+
+    def _on_exit(self, worker):
+        process = worker.process
+        process.join()
+        lived = time.monotonic() - worker.started_at
+        worker.crashes = worker.crashes + 1 if lived < self.stable_seconds else 0
+        backoff = min(self.max_backoff, self.restart_backoff * 2 ** max(0, worker.crashes - 1))
+        with self.condition:
+            lost = worker.connections
+            worker.process = None
+            worker.ready = False
+            worker.connections = 0
+            worker.control.close()
+            worker.control = None
+            worker.restart_at = time.monotonic() + backoff
+        WORKER_CONNECTIONS.set(0, worker=worker.index)
+        if not self.stopped:
+            logger.error(f"Worker {worker.index} (pid {process.pid}) exited with code {process.exitcode} after {lived:.0f}s, "
+                         f"{lost} connection(s) dropped, restarting in {backoff:.0f}s")
+
+    def _monitor(self):
+        while not self.stopped:
+            handles = {}
+            for worker in self.workers:
+                if worker.process is not None:
+                    handles[worker.process.sentinel] = worker
+                    if worker.control_open:
+                        handles[worker.control] = worker
+            ready = wait(list(handles), timeout=1.0)
+            for handle in ready:
+                worker = handles[handle]
+                if handle is worker.control:
+                    worker.control_open = self._read_messages(worker)
+            for handle in ready:
+                worker = handles[handle]
+                if worker.process is not None and handle == worker.process.sentinel:
+                    self._on_exit(worker)
+            now = time.monotonic()
+            for worker in self.workers:
+                if worker.process is None and worker.restart_at is not None and now >= worker.restart_at and not self.stopped:
+                    WORKER_RESTARTS.inc(worker=worker.index)
+                    self._spawn(worker)
+
+    def dispatch(self, conn, addr):
+        """Hands `conn` to the least-loaded ready worker, waiting for one if none is ready yet."""
+        message = json.dumps(addr).encode("utf-8")
+        try:
+            while True:
+                with self.condition:
+                    candidates = [worker for worker in self.workers if worker.ready]
+                    while not candidates:
+                        self.condition.wait()
+                        candidates = [worker for worker in self.workers if worker.ready]
+                    worker = min(candidates, key=lambda w: (w.connections, w.index))
+                    worker.connections += 1
+                    control = worker.control
+                try:
+                    socket.send_fds(control, [message], [conn.fileno()])
+                    WORKER_CONNECTIONS.set(worker.connections, worker=worker.index)
+                    return
+                except OSError as e:
+                    # The worker died between the choice and the send, try another one
+                    logger.warning(f"Could not hand a connection to worker {worker.index}: {e}")
+                    with self.condition:
+                        worker.ready = False
+        finally:
+            conn.close()  # The worker holds its own descriptor now
+
+    def status(self):
+        with self.condition:
+            return [worker.status() for worker in self.workers]
+
+    def stop(self):
+        self.stopped = True
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.terminate()